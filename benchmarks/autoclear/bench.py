@@ -0,0 +1,211 @@
+"""
+AutoClear热点路径基准测试
+
+python benchmarks/autoclear/bench.py --moviepilot /path/to/MoviePilot --scales 1k,10k
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fakes import build_services
+from harness import default_config, load_plugin, make_plugin, quiet_logs, reset_run
+from tree import SyntheticTree, TreeSpec
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+
+class Env:
+    """
+    单次测量的环境：全新的替身服务、插件实例及数据目录
+    """
+
+    def __init__(self, module: Any, tree: SyntheticTree, data_dir: Path,
+                 config: Dict[str, Any]):
+        self.tree = tree
+        self.downloader_helper, self.mediaserver_helper = build_services(tree)
+        self.plugin = make_plugin(
+            module, data_dir, self.downloader_helper, self.mediaserver_helper, config
+        )
+        self.watched = tree.watched_files()
+        self.sources: List[str] = []
+
+
+def bench_find_hard_link(env: Env) -> int:
+    for path in env.watched:
+        env.plugin.find_hard_link(path)
+    return len(env.watched)
+
+
+def setup_get_torrent(env: Env):
+    env.sources = [
+        source for source in map(env.plugin.find_hard_link, env.watched) if source
+    ]
+    reset_run(env.plugin)
+
+
+def bench_get_torrent(env: Env) -> int:
+    for source in env.sources:
+        env.plugin.get_torrent(env.plugin.get_last_path(source), source)
+    return len(env.sources)
+
+
+def bench_get_remove_torrents(env: Env) -> int:
+    return sum(
+        len(env.plugin.get_remove_torrents(downloader))
+        for downloader in env.plugin._downloaders
+    )
+
+
+def bench_delete_torrents(env: Env) -> int:
+    env.plugin.delete_torrents()
+    return len(env.tree.torrents)
+
+
+def bench_all_clear(env: Env) -> int:
+    env.plugin.all_clear()
+    return len(env.watched)
+
+
+# 名称 -> (准备, 测量, 清理)
+SCENARIOS: Dict[str, Tuple[Optional[Callable], Callable, Optional[Callable]]] = {
+    "find_hard_link": (None, bench_find_hard_link, None),
+    "get_torrent": (setup_get_torrent, bench_get_torrent, None),
+    "get_remove_torrents": (None, bench_get_remove_torrents, None),
+    "delete_torrents": (None, bench_delete_torrents, None),
+    "all_clear": (None, bench_all_clear, lambda env: env.tree.restore_library()),
+}
+
+
+def parse_scale(value: str) -> int:
+    value = value.strip().lower()
+    if value.endswith("k"):
+        return int(float(value[:-1]) * 1000)
+    return int(value)
+
+
+def scale_label(scale: int) -> str:
+    return f"{scale // 1000}k" if scale % 1000 == 0 else str(scale)
+
+
+def run_scenario(module: Any, tree: SyntheticTree, workdir: Path, name: str,
+                 repeats: int) -> Dict[str, Any]:
+    setup, measure, teardown = SCENARIOS[name]
+    timings = []
+    items = 0
+    stages: Dict[str, float] = {}
+    for repeat in range(repeats):
+        data_dir = Path(tempfile.mkdtemp(prefix=f"{name}-{repeat}-", dir=workdir))
+        env = Env(module, tree, data_dir, default_config(tree.download_path))
+        if setup:
+            setup(env)
+        begin = time.perf_counter()
+        items = measure(env)
+        timings.append(time.perf_counter() - begin)
+        runs = env.plugin._AutoClear__get_metrics_runs()
+        if runs:
+            stages = runs[-1].get("stages") or {}
+        if teardown:
+            teardown(env)
+    return {
+        "items": items,
+        "repeats": [round(t, 6) for t in timings],
+        "min": round(min(timings), 6),
+        "median": round(statistics.median(timings), 6),
+        "stages": stages,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float) -> List[str]:
+    """
+    与基线比较中位数，超过阈值的记为性能退化
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base or not base.get("median"):
+            continue
+        ratio = result["median"] / base["median"]
+        result["baseline_median"] = base["median"]
+        result["ratio"] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{key}: {base['median']:.4f}s -> {result['median']:.4f}s ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="AutoClear基准测试")
+    parser.add_argument("--moviepilot", help="MoviePilot后端代码目录")
+    parser.add_argument("--scales", default="1k,10k,100k", help="下载目录文件数，逗号分隔")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="测试项，逗号分隔")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--hardlink-ratio", type=float, default=0.8)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--workdir", help="合成目录位置，默认系统临时目录")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的退化比例")
+    parser.add_argument("--update-baseline", action="store_true", help="将本次结果写为基线")
+    parser.add_argument("--verbose", action="store_true", help="输出插件日志")
+    args = parser.parse_args(argv)
+
+    module = load_plugin(args.moviepilot)
+    if not args.verbose:
+        quiet_logs()
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知测试项：{','.join(sorted(unknown))}")
+
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="autoclear-bench-", dir=args.workdir) as workdir:
+        workdir = Path(workdir)
+        for scale in map(parse_scale, args.scales.split(",")):
+            spec = TreeSpec(files=scale, hardlink_ratio=args.hardlink_ratio, depth=args.depth)
+            tree = SyntheticTree(workdir / f"tree-{scale}", spec).build()
+            for name in scenarios:
+                key = f"{name}@{scale_label(scale)}"
+                results[key] = run_scenario(module, tree, workdir, name, args.repeats)
+                print(f"{key:32} median {results[key]['median']:.4f}s "
+                      f"items {results[key]['items']}")
+            tree.cleanup()
+
+    baseline_path = Path(args.baseline)
+    regressions = []
+    if baseline_path.exists() and not args.update_baseline:
+        baseline = json.loads(baseline_path.read_text()).get("results") or {}
+        regressions = compare(results, baseline, args.threshold)
+
+    report = {
+        "meta": {
+            "time": int(time.time()),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeats": args.repeats,
+            "hardlink_ratio": args.hardlink_ratio,
+            "depth": args.depth,
+            "threshold": args.threshold,
+        },
+        "results": results,
+        "regressions": regressions,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"基线已更新：{baseline_path}")
+    for line in regressions:
+        print(f"性能退化 {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+AutoClear行为回归检查：在替身服务上运行，检查处理结果而非耗时
+
+python benchmarks/autoclear/check.py --moviepilot /path/to/MoviePilot
+"""
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from fakes import DELETE_TAG, build_services
+from harness import default_config, load_plugin, make_plugin, quiet_logs
+from tree import SyntheticTree, TreeSpec
+
+
+def count_tagged(downloader_helper: Any) -> Tuple[int, int]:
+    """
+    统计所有下载器中带待删除标签的种子数，及其中已暂停的种子数
+    """
+    services = downloader_helper.get_services()
+    tagged = paused = 0
+    for torrent in services["qb"].instance.qbc._torrents.values():
+        if DELETE_TAG in (torrent.get("tags") or "").split(","):
+            tagged += 1
+            paused += torrent.get("state") == "pausedUP"
+    for torrent in services["tr"].instance.trc._torrents.values():
+        if DELETE_TAG in torrent["labels"]:
+            tagged += 1
+            paused += torrent["status"] == 0
+    return tagged, paused
+
+
+def check_all_clear(module: Any, tree: SyntheticTree, data_dir: Path,
+                    asyncengine: bool, samedata: bool) -> List[str]:
+    """
+    all_clear添加待删除标签后，同一次运行的删种步骤应处理本次添加标签的种子
+    """
+    downloader_helper, mediaserver_helper = build_services(tree)
+    plugin = make_plugin(
+        module, data_dir, downloader_helper, mediaserver_helper,
+        default_config(tree.download_path, asyncengine=asyncengine, samedata=samedata),
+    )
+    before, _ = count_tagged(downloader_helper)
+    plugin.all_clear()
+    after, paused = count_tagged(downloader_helper)
+    tree.restore_library()
+    label = f"all_clear asyncengine={asyncengine} samedata={samedata}"
+    print(f"{label:44} tagged {after - before} paused {paused}/{after}")
+    errors = []
+    if after <= before:
+        errors.append(f"{label}: 没有添加待删除标签")
+    if paused != after:
+        errors.append(f"{label}: 带待删除标签的 {after} 个种子中只暂停了 {paused} 个")
+    return errors
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="AutoClear行为回归检查")
+    parser.add_argument("--moviepilot", help="MoviePilot后端代码目录")
+    parser.add_argument("--files", type=int, default=200, help="下载目录文件数")
+    parser.add_argument("--workdir", help="合成目录位置，默认系统临时目录")
+    parser.add_argument("--verbose", action="store_true", help="输出插件日志")
+    args = parser.parse_args(argv)
+
+    module = load_plugin(args.moviepilot)
+    if not args.verbose:
+        quiet_logs()
+    errors: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="autoclear-check-", dir=args.workdir) as workdir:
+        workdir = Path(workdir)
+        tree = SyntheticTree(workdir / "tree", TreeSpec(files=args.files)).build()
+        for asyncengine in (False, True):
+            for samedata in (False, True):
+                data_dir = Path(tempfile.mkdtemp(prefix="data-", dir=workdir))
+                errors += check_all_clear(module, tree, data_dir, asyncengine, samedata)
+    for error in errors:
+        print(f"检查失败 {error}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
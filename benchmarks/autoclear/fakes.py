@@ -0,0 +1,450 @@
+"""
+进程内的下载器及媒体服务器替身，模拟AutoClear用到的模块实例及客户端接口
+"""
+import hashlib
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from tree import SyntheticTorrent, SyntheticTree
+
+TRACKERS = [
+    "https://tracker.pt-alpha.example/announce",
+    "https://tracker.pt-beta.example/announce",
+    "https://tracker.pt-gamma.example/announce",
+]
+
+DELETE_TAG = "wait_to_delete"
+
+# 剧集ratingKey起始值，避免与电影及剧集条目冲突
+EPISODE_KEY_BASE = 10 ** 9
+
+
+def qb_torrent(torrent: SyntheticTorrent) -> dict:
+    """
+    qBittorrent torrents/info格式的种子信息
+    """
+    added_on = int(time.time()) - 86400 * (30 + torrent.index % 60)
+    return {
+        "hash": torrent.hash,
+        "name": torrent.name,
+        "size": torrent.size,
+        "save_path": torrent.save_path,
+        "content_path": torrent.content_path,
+        "ratio": round((torrent.index % 40) / 10, 2),
+        "added_on": added_on,
+        "completion_on": added_on + 3600,
+        "uploaded": torrent.size * (torrent.index % 4),
+        "tracker": TRACKERS[torrent.index % len(TRACKERS)],
+        "tags": DELETE_TAG if torrent.tagged else "",
+        "state": "stalledUP",
+        "category": "tv" if torrent.kind == "show" else "movie",
+    }
+
+
+def qb_files(torrent: SyntheticTorrent) -> List[dict]:
+    """
+    qBittorrent torrents/files格式的文件列表，路径相对保存目录
+    """
+    return [
+        {"name": os.path.join(torrent.name, file.name), "size": file.size}
+        for file in torrent.files
+    ]
+
+
+def tr_torrent(torrent: SyntheticTorrent, torrent_id: int) -> dict:
+    """
+    Transmission torrent-get格式的种子字段，辅种使用不同的hash
+    """
+    added_on = int(time.time()) - 86400 * (30 + torrent.index % 60)
+    return {
+        "id": torrent_id,
+        "hashString": hashlib.sha1(f"xseed{torrent.index}".encode()).hexdigest(),
+        "name": torrent.name,
+        "totalSize": torrent.size,
+        "downloadDir": torrent.save_path,
+        "uploadRatio": round((torrent.index % 30) / 10, 2),
+        "uploadedEver": torrent.size * (torrent.index % 3),
+        "addedDate": added_on,
+        "doneDate": added_on + 3600,
+        "labels": [],
+        "status": 6,
+        "trackers": [{"announce": TRACKERS[(torrent.index + 1) % len(TRACKERS)]}],
+        "errorString": "",
+        "files": [
+            {"name": os.path.join(torrent.name, file.name), "length": file.size}
+            for file in torrent.files
+        ],
+    }
+
+
+def _status_match(state: str, status_filter: Optional[str]) -> bool:
+    if not status_filter or status_filter == "all":
+        return True
+    if status_filter == "completed":
+        return state.endswith("UP") or state == "uploading"
+    if status_filter == "downloading":
+        return state.endswith("DL") or state == "downloading"
+    if status_filter == "errored":
+        return state in ("error", "missingFiles")
+    return True
+
+
+class FakeQbClient:
+    """
+    qbittorrentapi客户端替身：sync/maindata增量同步及文件列表
+    """
+
+    def __init__(self, torrents: Dict[str, dict], files: Dict[str, List[dict]]):
+        self.calls = Counter()
+        self._torrents = torrents
+        self._files = files
+        self._rid = 1
+        # hash -> 最后修改时的rid
+        self._changed: Dict[str, int] = {h: self._rid for h in torrents}
+        self._removed: Dict[str, int] = {}
+
+    def touch(self, torrent_hash: str, **delta):
+        self._rid += 1
+        self._torrents[torrent_hash].update(delta)
+        self._changed[torrent_hash] = self._rid
+
+    def remove(self, torrent_hash: str):
+        self._rid += 1
+        self._torrents.pop(torrent_hash, None)
+        self._changed.pop(torrent_hash, None)
+        self._removed[torrent_hash] = self._rid
+
+    def sync_maindata(self, rid: int = 0) -> dict:
+        self.calls["sync_maindata"] += 1
+        # 与qBittorrent一致，每次请求都会推进rid
+        self._rid += 1
+        if not rid:
+            return {
+                "rid": self._rid,
+                "full_update": True,
+                "torrents": {h: dict(t) for h, t in self._torrents.items()},
+            }
+        return {
+            "rid": self._rid,
+            "torrents": {
+                h: dict(self._torrents[h])
+                for h, changed in self._changed.items() if changed > rid
+            },
+            "torrents_removed": [
+                h for h, removed in self._removed.items() if removed > rid
+            ],
+        }
+
+    def torrents_info(self, torrent_hashes: Optional[list] = None, tag: Optional[str] = None,
+                      category: Optional[str] = None, status_filter: Optional[str] = None,
+                      **kwargs) -> List[dict]:
+        self.calls["torrents_info"] += 1
+        if isinstance(torrent_hashes, str):
+            torrent_hashes = torrent_hashes.split("|")
+        hashes = set(torrent_hashes or [])
+        return [
+            dict(t) for t in self._torrents.values()
+            if (not hashes or t["hash"] in hashes)
+            and (not tag or tag in [x.strip() for x in (t.get("tags") or "").split(",")])
+            and (category is None or t.get("category") == category)
+            and _status_match(t.get("state") or "", status_filter)
+        ]
+
+    def torrents_files(self, torrent_hash: str) -> List[dict]:
+        self.calls["torrents_files"] += 1
+        return [dict(file) for file in self._files.get(torrent_hash) or []]
+
+
+class FakeQbittorrent:
+    """
+    MoviePilot qBittorrent模块实例替身
+    """
+
+    def __init__(self, client: FakeQbClient):
+        self.qbc = client
+
+    @staticmethod
+    def is_inactive() -> bool:
+        return False
+
+    def set_torrents_tag(self, ids: list, tags: str) -> bool:
+        self.qbc.calls["set_torrents_tag"] += 1
+        for torrent_hash in ids:
+            torrent = self.qbc._torrents.get(torrent_hash)
+            if torrent is not None:
+                tag_list = [t for t in (torrent.get("tags") or "").split(",") if t]
+                if tags not in tag_list:
+                    self.qbc.touch(torrent_hash, tags=",".join(tag_list + [tags]))
+        return True
+
+    def stop_torrents(self, ids: list) -> bool:
+        self.qbc.calls["stop_torrents"] += 1
+        for torrent_hash in ids:
+            if torrent_hash in self.qbc._torrents:
+                self.qbc.touch(torrent_hash, state="pausedUP")
+        return True
+
+    def delete_torrents(self, delete_file: bool, ids: list) -> bool:
+        self.qbc.calls["delete_torrents"] += 1
+        for torrent_hash in ids:
+            self.qbc.remove(torrent_hash)
+        return True
+
+
+class FakeTrClient:
+    """
+    transmission_rpc客户端替身，按arguments只返回请求的字段
+    """
+
+    def __init__(self, torrents: List[dict]):
+        self.calls = Counter()
+        self._torrents = {torrent["hashString"]: torrent for torrent in torrents}
+
+    def find(self, ids: Optional[list] = None) -> List[dict]:
+        """
+        按hash或数字ID查找种子
+        """
+        if ids is None:
+            return list(self._torrents.values())
+        if not isinstance(ids, (list, tuple, set)):
+            ids = [ids]
+        wanted = set(ids)
+        return [
+            t for t in self._torrents.values()
+            if t["hashString"] in wanted or t["id"] in wanted
+        ]
+
+    def get_torrents(self, ids: Optional[list] = None,
+                     arguments: Optional[List[str]] = None) -> List[SimpleNamespace]:
+        self.calls["get_torrents"] += 1
+        torrents = self.find(ids)
+        if arguments:
+            return [
+                SimpleNamespace(fields={k: t[k] for k in arguments if k in t})
+                for t in torrents
+            ]
+        return [SimpleNamespace(fields=dict(t)) for t in torrents]
+
+
+class FakeTransmission:
+    """
+    MoviePilot Transmission模块实例替身
+    """
+
+    def __init__(self, client: FakeTrClient):
+        self.trc = client
+
+    @staticmethod
+    def is_inactive() -> bool:
+        return False
+
+    def set_torrents_tag(self, ids: list, tags: str) -> bool:
+        self.trc.calls["set_torrents_tag"] += 1
+        for torrent in self.trc.find(ids):
+            if tags not in torrent["labels"]:
+                torrent["labels"] = torrent["labels"] + [tags]
+        return True
+
+    def stop_torrents(self, ids: list) -> bool:
+        self.trc.calls["stop_torrents"] += 1
+        for torrent in self.trc.find(ids):
+            torrent["status"] = 0
+        return True
+
+    def delete_torrents(self, delete_file: bool, ids: list) -> bool:
+        self.trc.calls["delete_torrents"] += 1
+        for torrent in self.trc.find(ids):
+            self.trc._torrents.pop(torrent["hashString"], None)
+        return True
+
+
+class FakePart:
+    def __init__(self, file: str, size: int):
+        self.file = file
+        self.size = size
+
+
+class FakeEpisode:
+    def __init__(self, rating_key: int, season_episode: str, part: FakePart,
+                 viewed_at: datetime, show_key: int = 0, show_title: str = "",
+                 season: int = 1, index: int = 1):
+        self.ratingKey = rating_key
+        self.seasonEpisode = season_episode
+        self.lastViewedAt = viewed_at
+        self.viewCount = 1 if viewed_at else 0
+        self.grandparentRatingKey = show_key
+        self.grandparentTitle = show_title
+        self.parentIndex = season
+        self.index = index
+        self._part = part
+
+    def iterParts(self):
+        yield self._part
+
+
+class FakeShow:
+    def __init__(self, rating_key: int, title: str, episodes: List[FakeEpisode],
+                 viewed: bool):
+        self.ratingKey = rating_key
+        self.title = title
+        self.leafCount = len(episodes)
+        self.viewedLeafCount = len(episodes) if viewed else 0
+        self._episodes = episodes
+
+    def episodes(self) -> List[FakeEpisode]:
+        return self._episodes
+
+
+class FakeMovie:
+    def __init__(self, rating_key: int, title: str, part: FakePart, viewed_at: datetime):
+        self.ratingKey = rating_key
+        self.title = title
+        self.locations = [part.file]
+        self.media = [SimpleNamespace(parts=[part])]
+        self.lastViewedAt = viewed_at
+
+
+class FakeSection:
+    def __init__(self, title: str, section_type: str, items: list):
+        self.title = title
+        self.type = section_type
+        self.updatedAt = datetime.now()
+        self._items = items
+
+    def search(self, unwatched: Optional[bool] = None, libtype: Optional[str] = None,
+               **kwargs) -> list:
+        if libtype == "episode":
+            episodes = [episode for show in self._items for episode in show.episodes()]
+            if unwatched is False:
+                return [episode for episode in episodes if episode.viewCount]
+            return episodes
+        if unwatched is False and self.type == "movie":
+            return [item for item in self._items if item.lastViewedAt]
+        return list(self._items)
+
+
+class FakeLibrary:
+    def __init__(self, sections: List[FakeSection]):
+        self._sections = {section.title: section for section in sections}
+
+    def section(self, title: str) -> FakeSection:
+        return self._sections[title]
+
+    def sections(self) -> List[FakeSection]:
+        return list(self._sections.values())
+
+
+class FakePlex:
+    """
+    plexapi PlexServer替身
+    """
+
+    def __init__(self, tree: SyntheticTree):
+        now = datetime.now()
+        shows, movies = [], []
+        for torrent in tree.torrents:
+            files = [file for file in torrent.files if file.library_path]
+            if not files:
+                continue
+            viewed_at = now if torrent.watched else None
+            if torrent.kind == "movie":
+                movies.append(FakeMovie(
+                    rating_key=torrent.index,
+                    title=torrent.name,
+                    part=FakePart(files[0].library_path, files[0].size),
+                    viewed_at=viewed_at,
+                ))
+            else:
+                episodes = [
+                    FakeEpisode(
+                        rating_key=EPISODE_KEY_BASE + torrent.index * 100 + number,
+                        season_episode=f"s01e{number + 1:02d}",
+                        part=FakePart(file.library_path, file.size),
+                        viewed_at=viewed_at,
+                        show_key=torrent.index,
+                        show_title=torrent.name,
+                        index=number + 1,
+                    )
+                    for number, file in enumerate(files)
+                ]
+                shows.append(FakeShow(torrent.index, torrent.name, episodes, torrent.watched))
+        self.library = FakeLibrary([
+            FakeSection("电视节目", "show", shows),
+            FakeSection("电影", "movie", movies),
+        ])
+        self._viewed_at = now
+
+    def history(self, maxresults: int = None) -> list:
+        return [SimpleNamespace(viewedAt=self._viewed_at)]
+
+
+class FakePlexServer:
+    """
+    MoviePilot Plex模块实例替身
+    """
+
+    def __init__(self, plex):
+        self._plex = plex
+
+    @staticmethod
+    def is_inactive() -> bool:
+        return False
+
+    def get_plex(self):
+        return self._plex
+
+
+class FakeHelper:
+    """
+    DownloaderHelper/MediaServerHelper替身
+    """
+
+    def __init__(self, services: Dict[str, Tuple[object, str]]):
+        self._services = {
+            name: SimpleNamespace(
+                name=name,
+                instance=instance,
+                config=SimpleNamespace(name=name, type=service_type),
+            )
+            for name, (instance, service_type) in services.items()
+        }
+
+    def get_services(self, name_filters: Optional[List[str]] = None, **kwargs) -> dict:
+        return {
+            name: service for name, service in self._services.items()
+            if not name_filters or name in name_filters
+        }
+
+
+def build_state(tree: SyntheticTree) -> Tuple[FakeQbClient, FakeTrClient, FakePlex]:
+    """
+    所有种子在qBittorrent中，辅种同时在Transmission中
+    """
+    qb_client = FakeQbClient(
+        torrents={t.hash: qb_torrent(t) for t in tree.torrents},
+        files={t.hash: qb_files(t) for t in tree.torrents},
+    )
+    tr_client = FakeTrClient([
+        tr_torrent(t, number + 1)
+        for number, t in enumerate(t for t in tree.torrents if t.cross_seeded)
+    ])
+    return qb_client, tr_client, FakePlex(tree)
+
+
+def build_services(tree: SyntheticTree) -> Tuple[FakeHelper, FakeHelper]:
+    """
+    进程内替身服务
+    """
+    qb_client, tr_client, plex = build_state(tree)
+    downloader_helper = FakeHelper({
+        "qb": (FakeQbittorrent(qb_client), "qbittorrent"),
+        "tr": (FakeTransmission(tr_client), "transmission"),
+    })
+    mediaserver_helper = FakeHelper({
+        "plex": (FakePlexServer(plex), "plex"),
+    })
+    return downloader_helper, mediaserver_helper
@@ -0,0 +1,89 @@
+"""
+加载AutoClear插件并替换插件基类中依赖数据库的方法，需要MoviePilot后端代码
+"""
+import importlib.util
+import logging
+import os
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+PLUGIN_DIR = REPO_ROOT / "plugins.v2" / "autoclear"
+
+
+def load_plugin(moviepilot_path: Optional[str] = None,
+                plugin_dir: Path = PLUGIN_DIR) -> ModuleType:
+    """
+    以独立包名加载插件，插件依赖的app包来自MoviePilot后端
+    :param moviepilot_path: MoviePilot后端代码目录，默认读取环境变量MOVIEPILOT_PATH
+    """
+    moviepilot_path = moviepilot_path or os.environ.get("MOVIEPILOT_PATH")
+    if moviepilot_path and moviepilot_path not in sys.path:
+        sys.path.insert(0, moviepilot_path)
+    try:
+        import app  # noqa: F401
+    except ImportError:
+        raise SystemExit("未找到MoviePilot后端代码，请通过--moviepilot或MOVIEPILOT_PATH指定")
+    name = "autoclear_bench"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(
+        name, plugin_dir / "__init__.py", submodule_search_locations=[str(plugin_dir)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def quiet_logs():
+    """
+    关闭INFO及以下日志，避免日志输出影响计时
+    """
+    logging.disable(logging.INFO)
+
+
+def make_plugin(module: ModuleType, data_dir: Path, downloader_helper: Any,
+                mediaserver_helper: Any, config: Dict[str, Any]) -> Any:
+    """
+    创建插件实例，插件数据保存在内存中，数据目录使用data_dir
+    """
+    module.DownloaderHelper = lambda: downloader_helper
+    module.MediaServerHelper = lambda: mediaserver_helper
+    # 跳过_PluginBase.__init__，其依赖数据库
+    plugin = module.AutoClear.__new__(module.AutoClear)
+    data: Dict[str, Any] = {}
+    data_dir.mkdir(parents=True, exist_ok=True)
+    plugin.get_data = lambda key=None, *args, **kwargs: data.get(key)
+    plugin.save_data = lambda key, value, *args, **kwargs: data.__setitem__(key, value)
+    plugin.get_data_path = lambda *args, **kwargs: data_dir
+    plugin.update_config = lambda *args, **kwargs: True
+    plugin.post_message = lambda *args, **kwargs: None
+    plugin.init_plugin(config)
+    return plugin
+
+
+def default_config(download_path: str, **overrides) -> Dict[str, Any]:
+    config = {
+        "enabled": False,
+        "onlyonce": False,
+        "notify": False,
+        "downloaders": ["qb", "tr"],
+        "mediaservers": ["plex"],
+        "action": "pause",
+        "samedata": True,
+        "labels": "wait_to_delete",
+        "download_path": download_path,
+        "skipunchanged": False,
+    }
+    config.update(overrides)
+    return config
+
+
+def reset_run(plugin: Any):
+    """
+    清除插件本次运行的快照及索引
+    """
+    plugin._AutoClear__reset_run()
@@ -0,0 +1,186 @@
+"""
+AutoClear负载测试：插件通过真实客户端库访问本地HTTP替身服务，测量往返开销
+
+python benchmarks/autoclear/loadtest.py --moviepilot /path/to/MoviePilot --scales 1k,10k --latency 20 --jitter 5
+"""
+import argparse
+import json
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from bench import parse_scale, scale_label
+from fakes import FakeHelper, build_state
+from harness import default_config, load_plugin, make_plugin, quiet_logs
+from standins import Behavior, start_standins
+from tree import SyntheticTree, TreeSpec
+
+
+class LiveQbittorrent:
+    """
+    使用qbittorrentapi连接替身服务，提供插件用到的模块实例方法
+    """
+
+    def __init__(self, url: str, timeout: float):
+        import qbittorrentapi
+        self.qbc = qbittorrentapi.Client(
+            host=url, username="admin", password="adminadmin",
+            REQUESTS_ARGS={"timeout": timeout},
+        )
+        self.qbc.auth_log_in()
+
+    @staticmethod
+    def is_inactive() -> bool:
+        return False
+
+    def set_torrents_tag(self, ids: list, tags: str) -> bool:
+        self.qbc.torrents_add_tags(tags=tags, torrent_hashes=ids)
+        return True
+
+    def stop_torrents(self, ids: list) -> bool:
+        self.qbc.torrents_pause(torrent_hashes=ids)
+        return True
+
+    def delete_torrents(self, delete_file: bool, ids: list) -> bool:
+        self.qbc.torrents_delete(delete_files=delete_file, torrent_hashes=ids)
+        return True
+
+
+class LiveTransmission:
+    """
+    使用transmission_rpc连接替身服务
+    """
+
+    def __init__(self, port: int, timeout: float):
+        import transmission_rpc
+        self.trc = transmission_rpc.Client(
+            host="127.0.0.1", port=port, path="/transmission/rpc", timeout=timeout
+        )
+
+    @staticmethod
+    def is_inactive() -> bool:
+        return False
+
+    def set_torrents_tag(self, ids: list, tags: str) -> bool:
+        for torrent in self.trc.get_torrents(ids=ids, arguments=["id", "labels"]):
+            labels = list(torrent.fields.get("labels") or [])
+            if tags not in labels:
+                self.trc.change_torrent(ids=torrent.fields["id"], labels=labels + [tags])
+        return True
+
+    def stop_torrents(self, ids: list) -> bool:
+        self.trc.stop_torrent(ids=ids)
+        return True
+
+    def delete_torrents(self, delete_file: bool, ids: list) -> bool:
+        self.trc.remove_torrent(ids=ids, delete_data=delete_file)
+        return True
+
+
+class LivePlexServer:
+    """
+    使用plexapi连接替身服务
+    """
+
+    def __init__(self, url: str, timeout: float):
+        from plexapi.server import PlexServer
+        self._plex = PlexServer(baseurl=url, token="standin", timeout=timeout)
+
+    @staticmethod
+    def is_inactive() -> bool:
+        return False
+
+    def get_plex(self):
+        return self._plex
+
+
+def run_scenario(module: Any, tree: SyntheticTree, workdir: Path, name: str,
+                 behavior: Behavior, timeout: float) -> Dict[str, Any]:
+    qb_client, tr_client, plex = build_state(tree)
+    standins = start_standins(qb_client, tr_client, plex, behavior)
+    try:
+        downloader_helper = FakeHelper({
+            "qb": (LiveQbittorrent(standins["qb"].url, timeout), "qbittorrent"),
+            "tr": (LiveTransmission(standins["tr"].port, timeout), "transmission"),
+        })
+        mediaserver_helper = FakeHelper({
+            "plex": (LivePlexServer(standins["plex"].url, timeout), "plex"),
+        })
+        data_dir = Path(tempfile.mkdtemp(prefix=f"{name}-", dir=workdir))
+        plugin = make_plugin(module, data_dir, downloader_helper, mediaserver_helper,
+                             default_config(tree.download_path))
+        # 初始化连接的请求不计入本次运行
+        before = {key: standin.stats()["total_requests"] for key, standin in standins.items()}
+        tracemalloc.start()
+        begin = time.perf_counter()
+        getattr(plugin, name)()
+        elapsed = time.perf_counter() - begin
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        runs = plugin._AutoClear__get_metrics_runs()
+        return {
+            "duration": round(elapsed, 4),
+            "peak_traced_memory": peak,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "servers": {
+                key: dict(stats, run_requests=stats["total_requests"] - before[key])
+                for key, stats in ((key, s.stats()) for key, s in standins.items())
+            },
+            "run": runs[-1] if runs else None,
+        }
+    finally:
+        for standin in standins.values():
+            standin.stop()
+        if name == "all_clear":
+            tree.restore_library()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="AutoClear负载测试")
+    parser.add_argument("--moviepilot", help="MoviePilot后端代码目录")
+    parser.add_argument("--scales", default="1k,10k", help="下载目录文件数，逗号分隔")
+    parser.add_argument("--scenarios", default="delete_torrents,all_clear")
+    parser.add_argument("--latency", type=float, default=20, help="每次请求延迟，毫秒")
+    parser.add_argument("--jitter", type=float, default=5, help="延迟抖动，毫秒")
+    parser.add_argument("--payload", type=int, default=0, help="每个条目附加字节数")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回500的请求比例")
+    parser.add_argument("--timeout", type=float, default=30, help="客户端超时，秒")
+    parser.add_argument("--workdir", help="合成目录位置，默认系统临时目录")
+    parser.add_argument("--output", default="loadtest-results.json")
+    parser.add_argument("--verbose", action="store_true", help="输出插件日志")
+    args = parser.parse_args(argv)
+
+    module = load_plugin(args.moviepilot)
+    if not args.verbose:
+        quiet_logs()
+    behavior = Behavior(
+        latency=args.latency, jitter=args.jitter,
+        payload=args.payload, error_rate=args.error_rate,
+    )
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="autoclear-load-", dir=args.workdir) as workdir:
+        workdir = Path(workdir)
+        for scale in map(parse_scale, args.scales.split(",")):
+            tree = SyntheticTree(workdir / f"tree-{scale}", TreeSpec(files=scale)).build()
+            for name in scenarios:
+                key = f"{name}@{scale_label(scale)}"
+                result = results[key] = run_scenario(
+                    module, tree, workdir, name, behavior, args.timeout
+                )
+                requests = sum(s["run_requests"] for s in result["servers"].values())
+                print(f"{key:28} {result['duration']:.3f}s requests {requests} "
+                      f"peak {result['peak_traced_memory'] / 1024 / 1024:.1f}MiB")
+            tree.cleanup()
+
+    report = {"behavior": behavior.__dict__, "results": results}
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
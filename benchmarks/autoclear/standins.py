@@ -0,0 +1,453 @@
+"""
+本地HTTP替身服务：qBittorrent Web API、Transmission RPC及Plex API中AutoClear用到的部分
+支持配置每次请求的延迟、抖动、附加数据大小及错误注入
+"""
+import json
+import random
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from fakes import (
+    FakePlex,
+    FakeQbClient,
+    FakeQbittorrent,
+    FakeShow,
+    FakeTrClient,
+    FakeTransmission,
+)
+
+# (状态码, 响应头, 响应体)
+Reply = Tuple[int, Dict[str, str], bytes]
+
+
+@dataclass
+class Behavior:
+    # 每次请求的延迟，单位：毫秒
+    latency: float = 0
+    # 延迟抖动，单位：毫秒，在[-jitter, jitter]内均匀分布
+    jitter: float = 0
+    # 每个种子或媒体条目附加的数据大小，单位：字节
+    payload: int = 0
+    # 返回500的请求比例
+    error_rate: float = 0
+    seed: int = 0
+
+
+class StandIn:
+    """
+    替身服务基类，在后台线程中运行ThreadingHTTPServer
+    """
+
+    def __init__(self, behavior: Behavior):
+        self.behavior = behavior
+        self.requests = Counter()
+        self.errors = Counter()
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(behavior.seed)
+        self._padding = "x" * behavior.payload
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        # 替身服务的状态由处理线程共享
+        self.state_lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "StandIn":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self.__handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "total_requests": sum(self.requests.values()),
+                "errors": sum(self.errors.values()),
+                "bytes_sent": self.bytes_sent,
+            }
+
+    def handle(self, method: str, path: str, params: Dict[str, str],
+               body: bytes, headers: Any) -> Reply:
+        raise NotImplementedError
+
+    def _delay(self) -> Tuple[float, bool]:
+        with self._lock:
+            jitter = self._rng.uniform(-self.behavior.jitter, self.behavior.jitter)
+            failed = self._rng.random() < self.behavior.error_rate
+        return max(self.behavior.latency + jitter, 0) / 1000, failed
+
+    def _record(self, path: str, size: int, failed: bool):
+        with self._lock:
+            self.requests[path] += 1
+            self.bytes_sent += size
+            if failed:
+                self.errors[path] += 1
+
+    def __handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.__serve("GET")
+
+            def do_POST(self):
+                self.__serve("POST")
+
+            def __serve(self, method: str):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                content_type = self.headers.get("Content-Type") or ""
+                if body and "application/x-www-form-urlencoded" in content_type:
+                    params.update({k: v[-1] for k, v in parse_qs(body.decode()).items()})
+                delay, failed = standin._delay()
+                if delay:
+                    time.sleep(delay)
+                if failed:
+                    status, headers, data = 500, {"Content-Type": "text/plain"}, b"injected error"
+                else:
+                    try:
+                        status, headers, data = standin.handle(
+                            method, url.path, params, body, self.headers
+                        )
+                    except Exception as e:
+                        status, headers, data = 500, {"Content-Type": "text/plain"}, str(e).encode()
+                standin._record(url.path, len(data), failed)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def _json(data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Reply:
+    return status, {"Content-Type": "application/json", **(headers or {})}, json.dumps(data).encode()
+
+
+def _text(text: str, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Reply:
+    return status, {"Content-Type": "text/plain; charset=UTF-8", **(headers or {})}, text.encode()
+
+
+class QbStandIn(StandIn):
+    """
+    qBittorrent Web API v2
+    """
+
+    def __init__(self, client: FakeQbClient, behavior: Behavior):
+        super().__init__(behavior)
+        self.client = client
+        self.instance = FakeQbittorrent(client)
+
+    def __pad(self, torrent: dict) -> dict:
+        if self._padding:
+            torrent["comment"] = self._padding
+        return torrent
+
+    @staticmethod
+    def __hashes(params: Dict[str, str]) -> List[str]:
+        return [h for h in (params.get("hashes") or params.get("hash") or "").split("|") if h]
+
+    def handle(self, method, path, params, body, headers) -> Reply:
+        if path == "/api/v2/auth/login":
+            return _text("Ok.", headers={"Set-Cookie": "SID=standin; HttpOnly; path=/"})
+        if path == "/api/v2/auth/logout":
+            return _text("")
+        if path == "/api/v2/app/version":
+            return _text("v4.6.7")
+        if path == "/api/v2/app/webapiVersion":
+            return _text("2.9.3")
+        if path == "/api/v2/app/buildInfo":
+            return _json({"qt": "6.4.2", "libtorrent": "2.0.10.0", "bitness": 64})
+        if path == "/api/v2/app/preferences":
+            return _json({})
+        with self.state_lock:
+            if path == "/api/v2/sync/maindata":
+                data = self.client.sync_maindata(rid=int(params.get("rid") or 0))
+                for torrent in data.get("torrents", {}).values():
+                    self.__pad(torrent)
+                return _json(data)
+            if path == "/api/v2/torrents/info":
+                torrents = self.client.torrents_info(
+                    torrent_hashes=self.__hashes(params) or None,
+                    tag=params.get("tag"),
+                    category=params.get("category"),
+                    status_filter=params.get("filter"),
+                )
+                return _json([self.__pad(t) for t in torrents])
+            if path == "/api/v2/torrents/files":
+                files = self.client.torrents_files(torrent_hash=params.get("hash"))
+                return _json([
+                    {"index": i, "progress": 1, "priority": 1, **file}
+                    for i, file in enumerate(files)
+                ])
+            if path == "/api/v2/torrents/addTags":
+                self.instance.set_torrents_tag(ids=self.__hashes(params), tags=params.get("tags"))
+                return _text("")
+            if path in ("/api/v2/torrents/pause", "/api/v2/torrents/stop"):
+                self.instance.stop_torrents(ids=self.__hashes(params))
+                return _text("")
+            if path == "/api/v2/torrents/delete":
+                self.instance.delete_torrents(
+                    delete_file=params.get("deleteFiles") == "true", ids=self.__hashes(params)
+                )
+                return _text("")
+        return _text("Not Found", status=404)
+
+
+class TrStandIn(StandIn):
+    """
+    Transmission RPC，包含X-Transmission-Session-Id握手
+    """
+    SESSION_ID = "standin-session"
+
+    def __init__(self, client: FakeTrClient, behavior: Behavior):
+        super().__init__(behavior)
+        self.client = client
+        self.instance = FakeTransmission(client)
+
+    def handle(self, method, path, params, body, headers) -> Reply:
+        if path != "/transmission/rpc":
+            return _text("Not Found", status=404)
+        if headers.get("X-Transmission-Session-Id") != self.SESSION_ID:
+            return _text("", status=409, headers={"X-Transmission-Session-Id": self.SESSION_ID})
+        request = json.loads(body or b"{}")
+        arguments = request.get("arguments") or {}
+        tag = request.get("tag")
+        with self.state_lock:
+            result = self.__call(request.get("method"), arguments)
+        if result is None:
+            return _json({"result": "method name not recognized", "arguments": {}, "tag": tag})
+        return _json({"result": "success", "arguments": result, "tag": tag},
+                     headers={"X-Transmission-Session-Id": self.SESSION_ID})
+
+    def __call(self, method: str, arguments: dict) -> Optional[dict]:
+        ids = arguments.get("ids")
+        if method == "session-get":
+            return {
+                "rpc-version": 17,
+                "rpc-version-minimum": 14,
+                "rpc-version-semver": "5.3.0",
+                "version": "4.0.5 (a6fe2a64aa)",
+                "download-dir": "/downloads",
+            }
+        if method == "session-stats":
+            return {"torrentCount": len(self.client._torrents)}
+        if method == "torrent-get":
+            fields = arguments.get("fields") or []
+            torrents = []
+            for torrent in self.client.find(ids):
+                torrent = dict(torrent)
+                if self._padding:
+                    torrent["comment"] = self._padding
+                if fields:
+                    torrent = {k: torrent[k] for k in fields if k in torrent}
+                torrents.append(torrent)
+            self.client.calls["get_torrents"] += 1
+            return {"torrents": torrents}
+        if method == "torrent-set":
+            for torrent in self.client.find(ids):
+                if "labels" in arguments:
+                    torrent["labels"] = list(arguments["labels"])
+            return {}
+        if method == "torrent-stop":
+            self.instance.stop_torrents(ids=ids)
+            return {}
+        if method == "torrent-remove":
+            self.instance.delete_torrents(
+                delete_file=bool(arguments.get("delete-local-data")), ids=ids
+            )
+            return {}
+        return None
+
+
+class PlexStandIn(StandIn):
+    """
+    Plex Media Server，XML格式，支持X-Plex-Container-Start/Size分页
+    """
+
+    def __init__(self, plex: FakePlex, behavior: Behavior):
+        super().__init__(behavior)
+        self.plex = plex
+        self.sections = plex.library.sections()
+        self.items: Dict[str, Any] = {}
+        for section in self.sections:
+            for item in section.search():
+                self.items[str(item.ratingKey)] = item
+
+    @staticmethod
+    def __ts(value) -> str:
+        return str(int(value.timestamp())) if value else ""
+
+    @staticmethod
+    def __xml(container: ET.Element) -> Reply:
+        data = b'<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(container)
+        return 200, {"Content-Type": "text/xml;charset=utf-8"}, data
+
+    def __container(self, **attrs) -> ET.Element:
+        return ET.Element("MediaContainer", {k: str(v) for k, v in attrs.items()})
+
+    def __media(self, video: ET.Element, part, rating_key) -> None:
+        media = ET.SubElement(video, "Media", {"id": str(rating_key)})
+        ET.SubElement(media, "Part", {
+            "id": str(rating_key), "file": part.file, "size": str(part.size),
+        })
+
+    def __video(self, parent: ET.Element, item, section_id: int) -> None:
+        if isinstance(item, FakeShow):
+            element = ET.SubElement(parent, "Directory", {
+                "ratingKey": str(item.ratingKey),
+                "key": f"/library/metadata/{item.ratingKey}/children",
+                "type": "show",
+                "title": item.title,
+                "librarySectionID": str(section_id),
+                "leafCount": str(item.leafCount),
+                "viewedLeafCount": str(item.viewedLeafCount),
+                "childCount": "1",
+            })
+        else:
+            viewed = self.__ts(item.lastViewedAt)
+            element = ET.SubElement(parent, "Video", {
+                "ratingKey": str(item.ratingKey),
+                "key": f"/library/metadata/{item.ratingKey}",
+                "type": "movie",
+                "title": item.title,
+                "librarySectionID": str(section_id),
+                "viewCount": "1" if viewed else "0",
+            })
+            if viewed:
+                element.set("lastViewedAt", viewed)
+            self.__media(element, item.media[0].parts[0], item.ratingKey)
+        if self._padding:
+            element.set("summary", self._padding)
+
+    def __episodes(self, parent: ET.Element, show: FakeShow) -> None:
+        for episode in show.episodes():
+            season, number = re.match(r"s(\d+)e(\d+)", episode.seasonEpisode).groups()
+            viewed = self.__ts(episode.lastViewedAt)
+            element = ET.SubElement(parent, "Video", {
+                "ratingKey": str(episode.ratingKey),
+                "key": f"/library/metadata/{episode.ratingKey}",
+                "type": "episode",
+                "title": f"Episode {int(number)}",
+                "grandparentTitle": show.title,
+                "grandparentRatingKey": str(show.ratingKey),
+                "parentIndex": str(int(season)),
+                "index": str(int(number)),
+                "viewCount": "1" if viewed else "0",
+            })
+            if viewed:
+                element.set("lastViewedAt", viewed)
+            self.__media(element, next(episode.iterParts()), episode.ratingKey)
+            if self._padding:
+                element.set("summary", self._padding)
+
+    def handle(self, method, path, params, body, headers) -> Reply:
+        path = path.rstrip("/") or "/"
+        if path in ("/", "/identity"):
+            return self.__xml(self.__container(
+                size=0, friendlyName="standin", machineIdentifier="standin",
+                version="1.40.0.7998", platform="Linux", myPlex=0,
+            ))
+        if path == "/library":
+            container = self.__container(size=1, title1="Plex Library")
+            ET.SubElement(container, "Directory", {"key": "sections", "title": "Library Sections"})
+            return self.__xml(container)
+        if path == "/library/sections":
+            container = self.__container(size=len(self.sections))
+            for section_id, section in enumerate(self.sections, start=1):
+                ET.SubElement(container, "Directory", {
+                    "key": str(section_id),
+                    "type": section.type,
+                    "title": section.title,
+                    "agent": "tv.plex.agents.movie",
+                    "scanner": "Plex Movie",
+                    "language": "zh-CN",
+                    "uuid": f"standin-{section_id}",
+                    "updatedAt": self.__ts(section.updatedAt),
+                })
+            return self.__xml(container)
+        match = re.fullmatch(r"/library/sections/(\d+)/all", path)
+        if match:
+            section_id = int(match.group(1))
+            section = self.sections[section_id - 1]
+            unwatched = params.get("unwatched")
+            items = section.search(unwatched=False if unwatched == "0" else None)
+            start = int(params.get("X-Plex-Container-Start")
+                        or headers.get("X-Plex-Container-Start") or 0)
+            size = int(params.get("X-Plex-Container-Size")
+                       or headers.get("X-Plex-Container-Size") or len(items))
+            page = items[start:start + size]
+            container = self.__container(
+                size=len(page), totalSize=len(items), offset=start,
+                librarySectionID=section_id,
+            )
+            for item in page:
+                self.__video(container, item, section_id)
+            return self.__xml(container)
+        match = re.fullmatch(r"/library/metadata/(\d+)/allLeaves", path)
+        if match:
+            show = self.items.get(match.group(1))
+            if not isinstance(show, FakeShow):
+                return _text("Not Found", status=404)
+            container = self.__container(size=show.leafCount)
+            self.__episodes(container, show)
+            return self.__xml(container)
+        match = re.fullmatch(r"/library/metadata/(\d+)", path)
+        if match and match.group(1) in self.items:
+            container = self.__container(size=1)
+            self.__video(container, self.items[match.group(1)], 0)
+            return self.__xml(container)
+        if path == "/status/sessions/history/all":
+            container = self.__container(size=1)
+            viewed = self.plex.history(maxresults=1)[0].viewedAt
+            ET.SubElement(container, "Video", {
+                "historyKey": "/status/sessions/history/1",
+                "type": "movie",
+                "title": "standin",
+                "viewedAt": self.__ts(viewed),
+            })
+            return self.__xml(container)
+        return _text("Not Found", status=404)
+
+
+def start_standins(qb_client: FakeQbClient, tr_client: FakeTrClient, plex: FakePlex,
+                   behavior: Behavior) -> Dict[str, StandIn]:
+    """
+    启动三个替身服务
+    """
+    return {
+        "qb": QbStandIn(qb_client, behavior).start(),
+        "tr": TrStandIn(tr_client, behavior).start(),
+        "plex": PlexStandIn(plex, behavior).start(),
+    }
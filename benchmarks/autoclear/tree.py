@@ -0,0 +1,154 @@
+"""
+合成下载目录及媒体库：按文件数量、硬链接比例及目录深度生成
+"""
+import hashlib
+import os
+import random
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+# 文件大小基数，实际文件为稀疏文件，不占用磁盘空间
+BASE_SIZE = 64 * 1024 * 1024
+
+
+@dataclass
+class SyntheticFile:
+    name: str
+    size: int
+    # 媒体库中的硬链接，未链接时为None
+    library_path: Optional[str] = None
+
+
+@dataclass
+class SyntheticTorrent:
+    index: int
+    hash: str
+    name: str
+    save_path: str
+    kind: str
+    files: List[SyntheticFile] = field(default_factory=list)
+    # 已在媒体服务器中看完
+    watched: bool = False
+    # 已带待删除标签
+    tagged: bool = False
+    # 同时在第二个下载器中辅种
+    cross_seeded: bool = False
+
+    @property
+    def content_path(self) -> str:
+        return os.path.join(self.save_path, self.name)
+
+    @property
+    def size(self) -> int:
+        return sum(file.size for file in self.files)
+
+    def file_path(self, file: SyntheticFile) -> str:
+        return os.path.join(self.content_path, file.name)
+
+
+@dataclass
+class TreeSpec:
+    # 下载目录文件总数
+    files: int = 1000
+    # 链接到媒体库的文件比例
+    hardlink_ratio: float = 0.8
+    # 下载目录嵌套深度
+    depth: int = 3
+    # 剧集种子的文件数
+    files_per_show: int = 4
+    # 已看完比例
+    watched_ratio: float = 0.5
+    # 已带待删除标签比例
+    tagged_ratio: float = 0.3
+    # 辅种比例
+    cross_seed_ratio: float = 0.2
+    seed: int = 0
+
+
+class SyntheticTree:
+    """
+    在临时目录中生成下载目录及媒体库，偶数种子为电影（单文件），奇数种子为剧集
+    """
+
+    def __init__(self, root: Path, spec: TreeSpec):
+        self.root = root
+        self.spec = spec
+        self.download_path = str(root / "downloads")
+        self.library_path = str(root / "library")
+        self.torrents: List[SyntheticTorrent] = []
+
+    def build(self) -> "SyntheticTree":
+        rng = random.Random(self.spec.seed)
+        if self.root.exists():
+            shutil.rmtree(self.root)
+        os.makedirs(self.download_path)
+        os.makedirs(self.library_path)
+        count = 0
+        index = 0
+        while count < self.spec.files:
+            kind = "movie" if index % 2 == 0 else "show"
+            file_count = 1 if kind == "movie" else min(
+                self.spec.files_per_show, self.spec.files - count
+            )
+            torrent = self.__make_torrent(index, kind, file_count, rng)
+            self.torrents.append(torrent)
+            count += file_count
+            index += 1
+        return self
+
+    def __make_torrent(self, index: int, kind: str, file_count: int,
+                       rng: random.Random) -> SyntheticTorrent:
+        # 按序号分散到多级目录
+        parts = [f"d{(index >> (4 * level)) % 16:x}" for level in range(self.spec.depth)]
+        save_path = os.path.join(self.download_path, *parts)
+        name = f"{kind.title()}.{index:07d}"
+        torrent = SyntheticTorrent(
+            index=index,
+            hash=hashlib.sha1(f"torrent{index}".encode()).hexdigest(),
+            name=name,
+            save_path=save_path,
+            kind=kind,
+            watched=rng.random() < self.spec.watched_ratio,
+            tagged=rng.random() < self.spec.tagged_ratio,
+            cross_seeded=rng.random() < self.spec.cross_seed_ratio,
+        )
+        os.makedirs(torrent.content_path, exist_ok=True)
+        linked = rng.random() < self.spec.hardlink_ratio
+        for number in range(file_count):
+            suffix = f"S01E{number + 1:02d}" if kind == "show" else "2160p"
+            file = SyntheticFile(
+                name=f"{name}.{suffix}.mkv",
+                # 大小有一定重复，覆盖按大小分组后的inode比较
+                size=BASE_SIZE + rng.randrange(self.spec.files) * 4096,
+            )
+            source = torrent.file_path(file)
+            with open(source, "wb") as f:
+                f.truncate(file.size)
+            if linked:
+                library_dir = os.path.join(self.library_path, f"{kind}s", name)
+                os.makedirs(library_dir, exist_ok=True)
+                file.library_path = os.path.join(library_dir, file.name)
+                os.link(source, file.library_path)
+            torrent.files.append(file)
+        return torrent
+
+    def watched_files(self) -> List[str]:
+        return [
+            file.library_path
+            for torrent in self.torrents if torrent.watched
+            for file in torrent.files if file.library_path
+        ]
+
+    def restore_library(self):
+        """
+        恢复被all_clear删除的媒体库硬链接
+        """
+        for torrent in self.torrents:
+            for file in torrent.files:
+                if file.library_path and not os.path.exists(file.library_path):
+                    os.link(torrent.file_path(file), file.library_path)
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
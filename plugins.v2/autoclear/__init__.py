@@ -1,36 +1,74 @@
+import functools
+import heapq
 import os
 from pathlib import Path
 
 import re
 import threading
 import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
 from datetime import datetime, timedelta
-from typing import List, Tuple, Dict, Any, Optional
-
-import pytz
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+from typing import List, Tuple, Dict, Any, Optional, Set
 
 from app.core.config import settings
 from app.helper.downloader import DownloaderHelper
 from app.helper.mediaserver import MediaServerHelper
 from app.log import logger
 from app.plugins import _PluginBase
-from app.schemas import NotificationType, ServiceInfo
+from app.schemas import NotificationType, Response, ServiceInfo
+from fastapi.responses import FileResponse
 from app.utils.string import StringUtils
 
+from . import transmission
+from .changes import path_token, qb_token, tr_token
+from .digest import NotificationDigest
+from .engine import AsyncEngine
+from .fingerprint import FingerprintCache, HashPool, SourceIndex, cached_partial_hash
+from .gateway import ServiceGateway, configure_session
+from .grouping import TorrentGroups, is_shared_content, listed_file_keys
+from .jellyfin import JellyfinClient
+from .jellyfin import to_timestamp as jellyfin_timestamp
+from .media import MediaItem, to_timestamp
+from .metrics import (
+    MetricsHistory,
+    RunMetrics,
+    current_metrics,
+    incr,
+    install_session_hook,
+    stage,
+    staged,
+)
+from .profiling import RunProfiler, get_profile, list_profiles
+from .qbsync import QbTorrentMirror
+from .rules import RULE_KEYS, TorrentRules
+from .query import TorrentQuery, qb_query, split_values
+from .selection import (
+    GB,
+    ClearCandidate,
+    ClearQueue,
+    disk_deficits,
+    reclaimable_bytes,
+    select_by_reclaim,
+)
+from .store import AutoClearStore
+from .torrent import TorrentAdapter, TorrentRecord
+from .walker import ParallelWalker
+
 lock = threading.Lock()
+# 整个运行期间持有，避免重叠的运行互相清除快照及索引
+run_lock = threading.Lock()
 
 
 class AutoClear(_PluginBase):
     # 插件名称
     plugin_name = "自动删除已看资源"
     # 插件描述
-    plugin_desc = "自动删除plex中已看媒体库文件，源文件及种子文件"
+    plugin_desc = "自动删除Plex、Jellyfin、Emby中已看媒体库文件，源文件及种子文件"
     # 插件图标
     plugin_icon = "delete.jpg"
     # 插件版本
-    plugin_version = "0.0.1"
+    plugin_version = "2.1"
     # 插件作者
     plugin_author = "kkatex"
     # 作者主页
@@ -43,7 +81,10 @@ class AutoClear(_PluginBase):
     auth_level = 2
 
     # 私有属性
-    downloader_helper = None
+    _downloader_helper = None
+    _mediaserver_helper = None
+    # 后台恢复插件状态的线程
+    _warm_thread: Optional[threading.Thread] = None
     _event = threading.Event()
     _scheduler = None
     _enabled = False
@@ -67,10 +108,113 @@ class AutoClear(_PluginBase):
     _torrentstates = None
     _torrentcategorys = None
     _download_path = None
+    # 遍历下载目录时排除的路径通配符
+    _exclude = ""
+    # 遍历下载目录的线程数
+    _walkworkers = 8
+    # 按内容指纹匹配复制的源文件
+    _copymatch = False
+    # 指纹匹配后再校验完整哈希
+    _fullhash = False
+    # 磁盘空间模式：剩余空间低于低水位时清理，达到高水位即停止
+    _pressure = False
+    # 低水位，单位：GB
+    _lowwater = None
+    # 高水位，单位：GB
+    _highwater = None
+    # 媒体库目录，磁盘空间模式下检查其所在文件系统
+    _library_path = None
+    # 自上次运行以来没有变化时跳过
+    _skipunchanged = True
+    # 没有变化时最长跳过时间，单位：小时，避免做种时间等条件长期不被检查
+    _force_run_hours = 24
+    # 最近运行统计
+    _metrics_history: Optional[MetricsHistory] = None
+    # 保留的运行统计次数
+    _metrics_size = 20
+    # 下次运行时进行性能分析，运行后自动关闭
+    _profile = False
+    # 本次运行正在进行性能分析
+    _profiling = False
+    # 下载目录文件索引，每次运行重建
+    _source_index: Optional[SourceIndex] = None
+    # 插件状态库
+    _store: Optional[AutoClearStore] = None
+    # 状态库记录保留天数
+    _store_retention_days = 30
+    # 上次清除过期记录的时间
+    _store_pruned_at = 0.0
+    # 计算完整哈希的进程池
+    _hash_pool: Optional[HashPool] = None
+    _hash_pool_lock = threading.Lock()
+    # 状态库不可用时使用的内存指纹缓存
+    _fingerprints: Optional[FingerprintCache] = None
+    # 本次运行开始时的变化标识
+    _run_tokens: Optional[dict] = None
+    # 本次运行是否修改了下载器中的种子
+    _run_modified = False
+    # 本次运行的种子快照
+    _snapshot: Optional[Dict[str, List[TorrentRecord]]] = None
+    # 所有下载器的辅种分组，每次运行按种子快照计算一次
+    _torrent_groups: Optional[TorrentGroups] = None
+    # qBittorrent种子镜像
+    _qbmirrors: Dict[str, QbTorrentMirror] = {}
+    # 镜像同步间隔，单位：秒，本插件修改种子后立即失效
+    _mirror_max_age = 30
+    # 幂等调用失败后的重试次数
+    _retries = 3
+    # 每个服务同时进行的请求数
+    _concurrency = 2
+    # 使用异步引擎，服务请求及文件操作互相重叠
+    _asyncengine = True
+    # 服务调用网关
+    _gateways: Dict[str, ServiceGateway] = {}
+    # 已连接的服务：类型 -> (获取时间, 服务信息)
+    _services: Dict[str, Tuple[float, Dict[str, ServiceInfo]]] = {}
+    # 服务信息缓存时间，单位：秒
+    _service_ttl = 60
+    # 剧集清理粒度：show 整部剧集看完，season 整季看完，episode 单集，keeplast 保留最近已看的若干集
+    _granularity = "show"
+    # keeplast模式下，第一个未看剧集之前保留的已看集数
+    _keepepisodes = 2
+    # 规则预览使用的种子快照超过该时间视为过期，单位：小时
+    _previewmaxage = 24
+    # 规则预览的种子快照缓存：(快照版本, 种子记录, 快照时间)
+    _preview_cache: Optional[Tuple[Tuple[Tuple[int, int], Tuple[str, ...]],
+                                   List[TorrentRecord], int]] = None
+    # 通知中列出的种子数，按大小从大到小
+    _digesttop = 20
+    # 清理顺序：viewed 最早观看优先，size 最大文件优先
+    _priority = "viewed"
+    # 单次运行最多清理的媒体文件数，0为不限
+    _maxitems = 0
+    # 单次运行最多清理的大小，单位：GB，0为不限
+    _maxgb = 0
+    # 单次运行最多的接口调用次数，0为不限，按批检查，超出后剩余媒体留待下次运行
+    _maxcalls = 0
+    # 限制接口调用次数时每批处理的媒体文件数
+    _clear_batch = 50
+    # Plex Home成员，所有成员均已看完才清理
+    _homeusers = ""
+    # 切换到Plex Home成员的服务器连接：成员 -> PlexServer
+    _home_servers: Dict[str, Any] = {}
+    # 每次按ratingKey查询成员观看状态的条目数
+    _home_batch = 100
+    # Jellyfin/Emby客户端：媒体服务器 -> 客户端
+    _jellyfin_clients: Dict[str, JellyfinClient] = {}
 
     def init_plugin(self, config: dict = None):
-        self.downloader_helper = DownloaderHelper()
-        self.mediaserver_helper = MediaServerHelper()
+        # 服务帮助类及运行统计在首次使用时创建，插件未启用时不加载
+        self._downloader_helper = None
+        self._mediaserver_helper = None
+        self._qbmirrors = {}
+        self._gateways = {}
+        self._home_servers = {}
+        self._jellyfin_clients = {}
+        # 配置变化后重新获取服务
+        self._services = {}
+        self._metrics_history = None
+        self.__reset_run()
         if config:
             self._enabled = config.get("enabled")
             self._onlyonce = config.get("onlyonce")
@@ -92,11 +236,37 @@ class AutoClear(_PluginBase):
             self._torrentstates = config.get("torrentstates") or ""
             self._torrentcategorys = config.get("torrentcategorys") or ""
             self._download_path = config.get("download_path") or "/media"
+            self._exclude = config.get("exclude") or ""
+            self._walkworkers = config.get("walkworkers") or 8
+            self._copymatch = config.get("copymatch")
+            self._fullhash = config.get("fullhash")
+            self._pressure = config.get("pressure")
+            self._lowwater = config.get("lowwater")
+            self._highwater = config.get("highwater")
+            self._library_path = config.get("library_path") or ""
+            self._skipunchanged = config.get("skipunchanged", True)
+            self._profile = config.get("profile")
+            self._retries = config.get("retries", 3)
+            self._concurrency = config.get("concurrency", 2)
+            self._asyncengine = config.get("asyncengine", True)
+            self._homeusers = config.get("homeusers") or ""
+            self._priority = config.get("priority") or "viewed"
+            self._digesttop = config.get("digesttop", 20)
+            self._previewmaxage = config.get("previewmaxage") or 24
+            self._maxitems = config.get("maxitems") or 0
+            self._maxgb = config.get("maxgb") or 0
+            self._maxcalls = config.get("maxcalls") or 0
+            self._granularity = config.get("granularity") or "show"
+            self._keepepisodes = config.get("keepepisodes", 2)
 
         self.stop_service()
 
         if self.get_state() or self._onlyonce:
+            self.__start_warm_up()
             if self._onlyonce:
+                import pytz
+                from apscheduler.schedulers.background import BackgroundScheduler
+
                 self._scheduler = BackgroundScheduler(timezone=settings.TZ)
                 logger.info(f"自动删种服务启动，立即运行一次")
                 self._scheduler.add_job(
@@ -108,33 +278,123 @@ class AutoClear(_PluginBase):
                 # 关闭一次性开关
                 self._onlyonce = False
                 # 保存设置
-                self.update_config(
-                    {
-                        "enabled": self._enabled,
-                        "notify": self._notify,
-                        "onlyonce": self._onlyonce,
-                        "action": self._action,
-                        "cron": self._cron,
-                        "downloaders": self._downloaders,
-                        "samedata": self._samedata,
-                        "mponly": self._mponly,
-                        "size": self._size,
-                        "ratio": self._ratio,
-                        "time": self._time,
-                        "upspeed": self._upspeed,
-                        "labels": self._labels,
-                        "pathkeywords": self._pathkeywords,
-                        "trackerkeywords": self._trackerkeywords,
-                        "errorkeywords": self._errorkeywords,
-                        "torrentstates": self._torrentstates,
-                        "torrentcategorys": self._torrentcategorys,
-                    }
-                )
+                self.__update_config()
                 if self._scheduler.get_jobs():
                     # 启动服务
                     self._scheduler.print_jobs()
                     self._scheduler.start()
 
+    @property
+    def downloader_helper(self) -> DownloaderHelper:
+        if self._downloader_helper is None:
+            self._downloader_helper = DownloaderHelper()
+        return self._downloader_helper
+
+    @property
+    def mediaserver_helper(self) -> MediaServerHelper:
+        if self._mediaserver_helper is None:
+            self._mediaserver_helper = MediaServerHelper()
+        return self._mediaserver_helper
+
+    def __start_warm_up(self):
+        """
+        在后台恢复上次保存的状态，首次运行时无需再加载
+        """
+        self._warm_thread = threading.Thread(
+            target=self.__warm_up, name="autoclear-warm-up", daemon=True
+        )
+        self._warm_thread.start()
+
+    def __warm_up(self):
+        """
+        恢复运行统计、状态库（文件指纹、媒体及处理记录）及qBittorrent种子镜像
+        """
+        begin = time.perf_counter()
+        try:
+            self.__get_metrics_history()
+            self.__get_store()
+            restored = 0
+            for downloader in self._downloaders:
+                if self._event.is_set():
+                    return
+                # 只恢复已保存镜像的下载器，下载器类型在首次运行时才获取
+                if self.__get_qb_mirror_file(downloader).exists():
+                    self.__get_qb_mirror(downloader)
+                    restored += 1
+        except Exception as e:
+            logger.warning(f"自动删种插件状态恢复失败：{str(e)}")
+            return
+        logger.info(
+            f"自动删种插件状态恢复完成，{restored} 个种子镜像，"
+            f"耗时 {time.perf_counter() - begin:.2f}s"
+        )
+
+    def __wait_warm_up(self):
+        """
+        等待后台恢复完成，避免与运行同时创建镜像
+        """
+        warm_thread = self._warm_thread
+        if warm_thread and warm_thread.is_alive() and warm_thread is not threading.current_thread():
+            warm_thread.join()
+
+    def __get_metrics_history(self) -> MetricsHistory:
+        if self._metrics_history is None:
+            self._metrics_history = MetricsHistory(
+                self.get_data("metrics") or [], size=self._metrics_size
+            )
+        return self._metrics_history
+
+    def __update_config(self):
+        """
+        保存设置
+        """
+        self.update_config(
+            {
+                "enabled": self._enabled,
+                "notify": self._notify,
+                "onlyonce": self._onlyonce,
+                "action": self._action,
+                "cron": self._cron,
+                "downloaders": self._downloaders,
+                "samedata": self._samedata,
+                "mponly": self._mponly,
+                "size": self._size,
+                "ratio": self._ratio,
+                "time": self._time,
+                "upspeed": self._upspeed,
+                "labels": self._labels,
+                "pathkeywords": self._pathkeywords,
+                "trackerkeywords": self._trackerkeywords,
+                "errorkeywords": self._errorkeywords,
+                "torrentstates": self._torrentstates,
+                "torrentcategorys": self._torrentcategorys,
+                "mediaservers": self._mediaservers,
+                "download_path": self._download_path,
+                "exclude": self._exclude,
+                "walkworkers": self._walkworkers,
+                "copymatch": self._copymatch,
+                "fullhash": self._fullhash,
+                "pressure": self._pressure,
+                "lowwater": self._lowwater,
+                "highwater": self._highwater,
+                "library_path": self._library_path,
+                "skipunchanged": self._skipunchanged,
+                "profile": self._profile,
+                "retries": self._retries,
+                "concurrency": self._concurrency,
+                "asyncengine": self._asyncengine,
+                "homeusers": self._homeusers,
+                "priority": self._priority,
+                "digesttop": self._digesttop,
+                "previewmaxage": self._previewmaxage,
+                "maxitems": self._maxitems,
+                "maxgb": self._maxgb,
+                "maxcalls": self._maxcalls,
+                "granularity": self._granularity,
+                "keepepisodes": self._keepepisodes,
+            }
+        )
+
     def get_state(self) -> bool:
         return True if self._enabled and self._cron and self._downloaders else False
 
@@ -143,7 +403,157 @@ class AutoClear(_PluginBase):
         pass
 
     def get_api(self) -> List[Dict[str, Any]]:
-        pass
+        return [
+            {
+                "path": "/metrics",
+                "endpoint": self.get_metrics,
+                "methods": ["GET"],
+                "summary": "运行统计",
+                "description": "最近运行的各阶段耗时、接口调用次数、传输字节数及处理数量",
+            },
+            {
+                "path": "/profiles",
+                "endpoint": self.get_profiles,
+                "methods": ["GET"],
+                "summary": "性能分析结果",
+                "description": "已保存的cProfile及tracemalloc分析结果列表",
+            },
+            {
+                "path": "/profile",
+                "endpoint": self.download_profile,
+                "methods": ["GET"],
+                "summary": "下载性能分析结果",
+                "description": ".prof为pstats文件，.txt为耗时及内存分配Top报告",
+            },
+            {
+                "path": "/preview",
+                "endpoint": self.preview_rules,
+                "methods": ["GET"],
+                "summary": "预览删种规则",
+                "description": "按最近一次种子快照计算规则匹配的种子数、大小及示例，不请求下载器，未传的规则使用当前配置",
+            },
+        ]
+
+    def get_metrics(self, apikey: str) -> Response:
+        """
+        API接口：最近运行统计
+        """
+        if apikey != settings.API_TOKEN:
+            return Response(success=False, message="API密钥错误")
+        return Response(success=True, data=self.__get_metrics_runs())
+
+    def get_profiles(self, apikey: str) -> Response:
+        """
+        API接口：性能分析结果列表
+        """
+        if apikey != settings.API_TOKEN:
+            return Response(success=False, message="API密钥错误")
+        return Response(success=True, data=list_profiles(self.__get_profile_dir()))
+
+    def download_profile(self, apikey: str, name: str) -> Any:
+        """
+        API接口：下载性能分析结果
+        """
+        if apikey != settings.API_TOKEN:
+            return Response(success=False, message="API密钥错误")
+        path = get_profile(self.__get_profile_dir(), name)
+        if not path:
+            return Response(success=False, message="分析结果不存在")
+        return FileResponse(path, filename=path.name)
+
+    def preview_rules(self, apikey: str, size: Optional[str] = None, ratio: Optional[str] = None,
+                      seedtime: Optional[str] = None, upspeed: Optional[str] = None,
+                      pathkeywords: Optional[str] = None, trackerkeywords: Optional[str] = None,
+                      errorkeywords: Optional[str] = None, torrentstates: Optional[str] = None,
+                      torrentcategorys: Optional[str] = None, downloader: Optional[str] = None,
+                      sample: int = 20) -> Response:
+        """
+        API接口：按种子快照预览删种规则，传入空字符串表示不限制该项
+        :param seedtime: 做种时间，单位：小时，对应配置项time
+        """
+        if apikey != settings.API_TOKEN:
+            return Response(success=False, message="API密钥错误")
+        overrides = {
+            key: value for key, value in {
+                "size": size,
+                "ratio": ratio,
+                "time": seedtime,
+                "upspeed": upspeed,
+                "pathkeywords": pathkeywords,
+                "trackerkeywords": trackerkeywords,
+                "errorkeywords": errorkeywords,
+                "torrentstates": torrentstates,
+                "torrentcategorys": torrentcategorys,
+            }.items() if value is not None
+        }
+        return self.__preview(overrides, downloader=downloader, sample=sample)
+
+    def __preview(self, overrides: Dict[str, Any], downloader: Optional[str],
+                  sample: int) -> Response:
+        begin = time.perf_counter()
+        try:
+            rules = self.__get_rules(overrides)
+        except ValueError as e:
+            return Response(success=False, message=f"规则有误：{str(e)}")
+        store = self.__get_store()
+        if store is None:
+            return Response(success=False, message="插件状态库不可用")
+        torrents, snapshot_at = self.__get_preview_snapshot(store)
+        if not torrents:
+            return Response(success=False, message="暂无种子快照，请先运行一次")
+        if downloader:
+            torrents = [torrent for torrent in torrents if torrent.downloader == downloader]
+        # 与实际运行相同：先按标签、分类及状态查询，再检查规则
+        candidates = self.__get_remove_query(overrides).filter(torrents)
+        now = int(time.time())
+        matched = [torrent for torrent in candidates if rules.match(torrent, now)]
+        age = now - snapshot_at if snapshot_at else None
+        return Response(success=True, data={
+            "total": len(torrents),
+            "candidates": len(candidates),
+            "matched": len(matched),
+            "bytes": sum(torrent.size or 0 for torrent in matched),
+            "sites": dict(Counter(torrent.site for torrent in matched).most_common()),
+            "sample": [
+                {
+                    "downloader": torrent.downloader,
+                    "hash": torrent.id,
+                    "name": torrent.name,
+                    "site": torrent.site,
+                    "size": torrent.size,
+                    "ratio": torrent.ratio,
+                    "seeding_hours": round(torrent.seeding_time(now) / 3600, 1),
+                    "state": torrent.state,
+                    "category": torrent.category,
+                }
+                for torrent in heapq.nlargest(
+                    max(int(sample or 0), 0), matched, key=lambda t: t.size or 0
+                )
+            ],
+            "snapshot_at": snapshot_at,
+            "age": age,
+            "stale": age is None or age > float(self._previewmaxage or 24) * 3600,
+            "elapsed_ms": round((time.perf_counter() - begin) * 1000, 2),
+        })
+
+    def __get_preview_snapshot(self, store: AutoClearStore) -> Tuple[List[TorrentRecord], int]:
+        """
+        读取状态库中当前配置的下载器的种子快照，快照未更新时使用内存缓存
+        """
+        downloaders = tuple(self._downloaders or ())
+        version = (store.torrents_version(), downloaders)
+        cache = self._preview_cache
+        if cache and cache[0] == version:
+            return cache[1], cache[2]
+        torrents, snapshot_at = store.get_torrents(downloaders)
+        self._preview_cache = (version, torrents, snapshot_at)
+        return torrents, snapshot_at
+
+    def __get_profile_dir(self) -> Path:
+        return self.get_data_path() / "profiles"
+
+    def __get_metrics_runs(self) -> List[dict]:
+        return self.__get_metrics_history().to_list()
 
     def get_service(self) -> List[Dict[str, Any]]:
         """
@@ -157,6 +567,8 @@ class AutoClear(_PluginBase):
         }]
         """
         if self.get_state():
+            from apscheduler.triggers.cron import CronTrigger
+
             return [
                 {
                     "id": "TorrentRemover",
@@ -169,7 +581,84 @@ class AutoClear(_PluginBase):
         return []
 
     def get_page(self) -> List[dict]:
-        pass
+        """
+        拼装插件详情页面，展示最近运行统计
+        """
+        return [
+            {
+                "component": "VRow",
+                "content": [
+                    {
+                        "component": "VCol",
+                        "props": {"cols": 12},
+                        "content": [self.__metrics_table()],
+                    }
+                ],
+            }
+        ]
+
+    def get_dashboard_meta(self) -> Optional[List[Dict[str, str]]]:
+        """
+        仪表板元信息
+        """
+        return [{"key": "metrics", "name": "自动删除运行统计"}]
+
+    def get_dashboard(self, key: str = None, **kwargs) -> Optional[
+        Tuple[Dict[str, Any], Dict[str, Any], List[dict]]]:
+        """
+        仪表板：最近运行统计
+        """
+        cols = {"cols": 12, "md": 6}
+        attrs = {"refresh": 60, "border": True, "title": "自动删除运行统计"}
+        return cols, attrs, [self.__metrics_table(limit=5)]
+
+    def __metrics_table(self, limit: int = 0) -> dict:
+        """
+        运行统计表格
+        """
+        runs = list(reversed(self.__get_metrics_runs()))
+        if limit:
+            runs = runs[:limit]
+        headers = ["时间", "任务", "状态", "耗时", "各阶段耗时", "接口调用", "传输", "处理数量"]
+        rows = []
+        for run in runs:
+            counters = run.get("counters") or {}
+            api_calls = sum(v for k, v in counters.items() if k.startswith("api_calls."))
+            bytes_total = sum(v for k, v in counters.items() if k.startswith("bytes."))
+            items = "，".join(
+                f"{k[len('items.'):]} {v}" for k, v in counters.items() if k.startswith("items.")
+            )
+            stages = "，".join(f"{k} {v}s" for k, v in (run.get("stages") or {}).items())
+            cells = [
+                datetime.fromtimestamp(run.get("started_at") or 0).strftime("%Y-%m-%d %H:%M:%S"),
+                run.get("name"),
+                run.get("status"),
+                f"{run.get('duration')}s",
+                stages,
+                api_calls,
+                StringUtils.str_filesize(bytes_total),
+                items,
+            ]
+            rows.append({
+                "component": "tr",
+                "content": [{"component": "td", "text": cell} for cell in cells],
+            })
+        return {
+            "component": "VTable",
+            "props": {"hover": True, "density": "compact"},
+            "content": [
+                {
+                    "component": "thead",
+                    "content": [
+                        {"component": "tr", "content": [
+                            {"component": "th", "props": {"class": "text-start ps-4"}, "text": header}
+                            for header in headers
+                        ]}
+                    ],
+                },
+                {"component": "tbody", "content": rows},
+            ],
+        }
 
     def stop_service(self):
         """
@@ -183,6 +672,13 @@ class AutoClear(_PluginBase):
                     self._scheduler.shutdown()
                     self._event.clear()
                 self._scheduler = None
+            if self._store:
+                self._store.close()
+                self._store = None
+            with self._hash_pool_lock:
+                if self._hash_pool:
+                    self._hash_pool.shutdown()
+                    self._hash_pool = None
         except Exception as e:
             print(str(e))
 
@@ -194,57 +690,167 @@ class AutoClear(_PluginBase):
         if not self._downloaders:
             logger.warning("尚未配置下载器，请检查配置")
             return None
-
-        services = self.downloader_helper.get_services(name_filters=self._downloaders)
-        if not services:
-            logger.warning("获取下载器实例失败，请检查配置")
-            return None
-
-        active_services = {}
-        for service_name, service_info in services.items():
-            if service_info.instance.is_inactive():
-                logger.warning(f"下载器 {service_name} 未连接，请检查配置")
-            else:
-                active_services[service_name] = service_info
-
-        if not active_services:
-            logger.warning("没有已连接的下载器，请检查配置")
-            return None
-
-        return active_services
+        return self.__resolve_services("downloader")
 
     @property
     def service_info_mediaserver(self) -> Optional[Dict[str, ServiceInfo]]:
         """
         服务信息
         """
-        if not self._mediaserver:
+        if not self._mediaservers:
             logger.warning("尚未配置媒体服务器，请检查配置")
             return None
+        return self.__resolve_services("mediaserver")
+
+    def __resolve_services(self, kind: str) -> Optional[Dict[str, ServiceInfo]]:
+        """
+        获取已连接的服务，结果缓存一段时间，避免在循环中重复查询服务及连接状态
+        :param kind: downloader/mediaserver
+        """
+        cached = self._services.get(kind)
+        if cached and time.time() - cached[0] < self._service_ttl:
+            return cached[1]
+        if kind == "downloader":
+            title, helper, names = "下载器", self.downloader_helper, self._downloaders
+        else:
+            title, helper, names = "媒体服务器", self.mediaserver_helper, self._mediaservers
 
-        services = self.mediaserver_helper.get_services(name_filters=self._mediaserver)
+        services = helper.get_services(name_filters=names)
         if not services:
-            logger.warning("获取媒体服务器实例失败，请检查配置")
+            logger.warning(f"获取{title}实例失败，请检查配置")
             return None
 
         active_services = {}
         for service_name, service_info in services.items():
             if service_info.instance.is_inactive():
-                logger.warning(f"媒体服务器 {service_name} 未连接，请检查配置")
+                logger.warning(f"{title} {service_name} 未连接，请检查配置")
             else:
                 active_services[service_name] = service_info
 
         if not active_services:
-            logger.warning("没有已连接的媒体服务器，请检查配置")
+            logger.warning(f"没有已连接的{title}，请检查配置")
             return None
 
+        self._services[kind] = (time.time(), active_services)
         return active_services
 
+    def __reconnect(self, name: str):
+        """
+        服务调用失败时重连，并重新获取服务信息
+        """
+        for kind in list(self._services):
+            service = self._services[kind][1].get(name)
+            if not service:
+                continue
+            self._services.pop(kind, None)
+            if kind == "mediaserver":
+                self._home_servers = {}
+                self._jellyfin_clients = {}
+            reconnect = getattr(service.instance, "reconnect", None)
+            if callable(reconnect):
+                logger.info(f"{name} 调用失败，重新连接")
+                try:
+                    reconnect()
+                except Exception as e:
+                    logger.error(f"{name} 重新连接失败：{str(e)}")
+
     def __get_downloader(self, name: str):
         """
         根据类型返回下载器实例
         """
-        return self.service_info_downloader.get(name).instance
+        instance = self.service_info_downloader.get(name).instance
+        client = getattr(instance, "qbc", None) or getattr(instance, "trc", None)
+        self.__prepare_session(client, name)
+        return instance
+
+    def __get_client(self, name: str) -> Any:
+        """
+        返回经由网关的下载器客户端，qBittorrent为qbc，Transmission为trc
+        """
+        instance = self.__get_downloader(name)
+        client = getattr(instance, "qbc", None) or getattr(instance, "trc", None)
+        return self.__get_gateway(name).wrap(client)
+
+    def __get_gateway(self, name: str) -> ServiceGateway:
+        """
+        获取服务调用网关，同一服务共用并发限制
+        """
+        gateway = self._gateways.get(name)
+        if not gateway:
+            gateway = ServiceGateway(
+                name=name,
+                concurrency=int(self._concurrency or 1),
+                attempts=int(self._retries or 0) + 1,
+                cancel_event=self._event,
+                on_failure=lambda: self.__reconnect(name),
+            )
+            self._gateways[name] = gateway
+        return gateway
+
+    def __call(self, name: str, func, *args, **kwargs) -> Any:
+        """
+        经由网关调用服务
+        """
+        return self.__get_gateway(name).call(func, *args, **kwargs)
+
+    def __prepare_session(self, client: Any, service: str):
+        """
+        给服务客户端的requests会话挂载连接池并安装统计钩子
+        """
+        if not client:
+            return
+        for attr in ("_http_session", "_session"):
+            session = getattr(client, attr, None)
+            if session is not None:
+                configure_session(session, pool_size=int(self._concurrency or 1))
+                install_session_hook(session, service)
+                return
+
+    @contextmanager
+    def __run(self, name: str):
+        """
+        记录一次运行的统计，重叠的运行（如定时运行与立即运行）依次进行
+        """
+        with run_lock:
+            self.__wait_warm_up()
+            metrics = RunMetrics(name)
+            token = current_metrics.set(metrics)
+            # 每次运行开始时重新获取服务，运行中使用缓存
+            self._services = {}
+            self._run_tokens = None
+            self._run_modified = False
+            try:
+                with ExitStack() as stack:
+                    if self._profile:
+                        stack.enter_context(self.__profile(name))
+                        self._profiling = True
+                    yield metrics
+            except Exception:
+                metrics.finish("error")
+                raise
+            finally:
+                self._profiling = False
+                current_metrics.reset(token)
+                if metrics.status == "running":
+                    metrics.finish("success")
+                self.__prune_store()
+                metrics_history = self.__get_metrics_history()
+                metrics_history.append(metrics)
+                self.save_data("metrics", metrics_history.to_list())
+                logger.info(
+                    f"{name} 运行结束，耗时 {metrics.duration:.2f}s，"
+                    f"各阶段：{metrics.to_dict().get('stages')}"
+                )
+
+    def __profile(self, name: str) -> RunProfiler:
+        """
+        对本次运行进行性能分析，并关闭开关
+        cProfile只统计当前线程，分析时不使用异步引擎，以免遗漏线程池中的调用
+        """
+        self._profile = False
+        self.__update_config()
+        logger.info(f"{name} 本次运行开启性能分析")
+        return RunProfiler(self.__get_profile_dir(), name)
 
     def __get_downloader_config(self, name: str):
         """
@@ -264,310 +870,657 @@ class AutoClear(_PluginBase):
         """
         return self.service_info_mediaserver.get(name).config
 
+    def __reset_run(self):
+        """
+        清除上次运行的种子快照及辅种分组
+        """
+        self._snapshot = None
+        self._torrent_groups = None
+        self._source_index = None
+
+    def __prune_store(self):
+        """
+        每天清除一次状态库中的过期记录
+        """
+        store = self.__get_store()
+        if not store or time.time() - self._store_pruned_at < 86400:
+            return
+        try:
+            store.prune(self._store_retention_days)
+            self._store_pruned_at = time.time()
+        except Exception as e:
+            logger.warning(f"清除状态库过期记录失败：{str(e)}")
+
+    def __get_store(self) -> Optional[AutoClearStore]:
+        """
+        获取插件状态库，保存在插件数据目录
+        """
+        if self._store is None:
+            try:
+                self._store = AutoClearStore(self.get_data_path() / "autoclear.db")
+            except Exception as e:
+                logger.error(f"插件状态库打开失败：{str(e)}")
+                return None
+        return self._store
+
     # 根据get_remove_torrents返回的种子列表删除种子
     def delete_torrents(self):
         """
         定时删除下载器中的下载任务
         """
+        with self.__run("delete_torrents") as metrics:
+            # 本次运行重新获取种子快照及辅种分组
+            self.__reset_run()
+            if not self.__has_dynamic_rules() and self.__is_unchanged("delete_torrents"):
+                logger.info("自动删种任务 自上次运行以来下载器没有变化，跳过")
+                metrics.finish("skipped")
+                return
+            if self.__use_async():
+                completed = self.__run_async(self.__delete_torrents_async)
+            else:
+                completed = self.__delete_torrents()
+            if not completed:
+                metrics.finish("cancelled")
+                return
+            self.__save_change_tokens("delete_torrents")
+
+    def __use_async(self) -> bool:
+        """
+        是否使用异步引擎，性能分析时使用同步流程
+        """
+        return bool(self._asyncengine) and not self._profiling
+
+    def __run_async(self, main) -> Any:
+        """
+        在异步引擎中运行，插件停止时取消并返回None
+        """
+        engine = AsyncEngine(
+            cancel_event=self._event,
+            concurrency=int(self._concurrency or 1),
+            fs_workers=min(8, (os.cpu_count() or 1) * 2),
+        )
+        return engine.run(main)
+
+    def __get_change_tokens(self) -> Optional[dict]:
+        """
+        收集变化标识：下载器种子及下载目录，只查询少量字段，任一获取失败返回None
+        """
+        tokens = {"downloaders": {}, "paths": path_token(self.__get_download_roots())}
         for downloader in self._downloaders:
+            client = self.__get_client(downloader)
+            if self.__get_downloader_config(downloader).type == "qbittorrent":
+                token = qb_token(self.__get_qb_mirror(downloader), client)
+            else:
+                token = tr_token(client)
+            if token is None:
+                return None
+            tokens["downloaders"][downloader] = token
+        return tokens
+
+    def __is_unchanged(self, key: str) -> bool:
+        """
+        与上次运行结束时的变化标识比较，没有变化时可直接跳过
+        """
+        if not self._skipunchanged:
+            return False
+        try:
+            tokens = self.__get_change_tokens()
+        except Exception as e:
+            logger.warning(f"获取变化标识失败：{str(e)}")
+            return False
+        # 本次运行没有修改下载器时，结束时直接保存
+        self._run_tokens = tokens
+        last = self.get_data(f"tokens_{key}") or {}
+        if time.time() - (last.get("time") or 0) > self._force_run_hours * 3600:
+            return False
+        return bool(tokens) and tokens == last.get("tokens")
+
+    def __save_change_tokens(self, key: str):
+        """
+        记录本次运行结束时的变化标识，包含本插件自身的修改
+        """
+        if not self._skipunchanged:
+            return
+        tokens = None if self._run_modified else self._run_tokens
+        if tokens is None:
+            # 本次运行修改了下载器，重新计算
             try:
-                with lock:
-                    # 获取需删除种子列表
-                    torrents = self.get_remove_torrents(downloader)
-                    logger.info(f"自动删种任务 获取符合处理条件种子数 {len(torrents)}")
-                    # 下载器
-                    downlader_obj = self.__get_downloader(downloader)
-                    if self._action == "pause":
-                        message_text = (
-                            f"{downloader.title()} 共暂停{len(torrents)}个种子"
-                        )
-                        for torrent in torrents:
-                            if self._event.is_set():
-                                logger.info(f"自动删种服务停止")
-                                return
-                            text_item = (
-                                f"{torrent.get('name')} "
-                                f"来自站点：{torrent.get('site')} "
-                                f"大小：{StringUtils.str_filesize(torrent.get('size'))}"
-                            )
-                            # 暂停种子
-                            downlader_obj.stop_torrents(ids=[torrent.get("id")])
-                            logger.info(f"自动删种任务 暂停种子：{text_item}")
-                            message_text = f"{message_text}\n{text_item}"
-                    elif self._action == "delete":
-                        message_text = (
-                            f"{downloader.title()} 共删除{len(torrents)}个种子"
-                        )
-                        for torrent in torrents:
-                            if self._event.is_set():
-                                logger.info(f"自动删种服务停止")
-                                return
-                            text_item = (
-                                f"{torrent.get('name')} "
-                                f"来自站点：{torrent.get('site')} "
-                                f"大小：{StringUtils.str_filesize(torrent.get('size'))}"
-                            )
-                            # 删除种子
-                            downlader_obj.delete_torrents(
-                                delete_file=False, ids=[torrent.get("id")]
-                            )
-                            logger.info(f"自动删种任务 删除种子：{text_item}")
-                            message_text = f"{message_text}\n{text_item}"
-                    elif self._action == "deletefile":
-                        message_text = (
-                            f"{downloader.title()} 共删除{len(torrents)}个种子及文件"
-                        )
-                        for torrent in torrents:
-                            if self._event.is_set():
-                                logger.info(f"自动删种服务停止")
-                                return
-                            text_item = (
-                                f"{torrent.get('name')} "
-                                f"来自站点：{torrent.get('site')} "
-                                f"大小：{StringUtils.str_filesize(torrent.get('size'))}"
-                            )
-                            # 删除种子
-                            downlader_obj.delete_torrents(
-                                delete_file=True, ids=[torrent.get("id")]
-                            )
-                            logger.info(f"自动删种任务 删除种子及文件：{text_item}")
-                            message_text = f"{message_text}\n{text_item}"
-                    else:
-                        continue
-                    if torrents and message_text and self._notify:
-                        self.post_message(
-                            mtype=NotificationType.SiteMessage,
-                            title=f"【自动删种任务完成】",
-                            text=message_text,
-                        )
+                tokens = self.__get_change_tokens()
             except Exception as e:
-                logger.error(f"自动删种任务异常：{str(e)}")
+                logger.warning(f"获取变化标识失败：{str(e)}")
+                return
+        if tokens:
+            self.save_data(f"tokens_{key}", {"time": int(time.time()), "tokens": tokens})
 
-    def __get_qb_torrent(self, torrent: Any) -> Optional[dict]:
+    def __delete_torrents(self) -> bool:
         """
-        检查QB下载任务是否符合条件
+        删除下载器中的下载任务，复用本次运行已计算的辅种分组
+        :return: 是否处理完成，插件停止时返回False
         """
-        # 完成时间
-        date_done = (
-            torrent.completion_on if torrent.completion_on > 0 else torrent.added_on
-        )
-        # 现在时间
-        date_now = int(time.mktime(datetime.now().timetuple()))
-        # 做种时间
-        torrent_seeding_time = date_now - date_done if date_done else 0
-        # 平均上传速度
-        torrent_upload_avs = (
-            torrent.uploaded / torrent_seeding_time if torrent_seeding_time else 0
-        )
-        # 大小 单位：GB
-        sizes = self._size.split("-") if self._size else []
-        minsize = float(sizes[0]) * 1024 * 1024 * 1024 if sizes else 0
-        maxsize = float(sizes[-1]) * 1024 * 1024 * 1024 if sizes else 0
-        # 分享率
-        if self._ratio and torrent.ratio <= float(self._ratio):
-            return None
-        # 做种时间 单位：小时
-        if self._time and torrent_seeding_time <= float(self._time) * 3600:
-            return None
-        # 文件大小
-        if self._size and (
-            torrent.size >= int(maxsize) or torrent.size <= int(minsize)
-        ):
-            return None
-        if self._upspeed and torrent_upload_avs >= float(self._upspeed) * 1024:
-            return None
-        if self._pathkeywords and not re.findall(
-            self._pathkeywords, torrent.save_path, re.I
-        ):
-            return None
-        if self._trackerkeywords and not re.findall(
-            self._trackerkeywords, torrent.tracker, re.I
-        ):
-            return None
-        if self._torrentstates and torrent.state not in self._torrentstates:
-            return None
-        if self._torrentcategorys and (
-            not torrent.category or torrent.category not in self._torrentcategorys
-        ):
-            return None
-        return {
-            "id": torrent.hash,
-            "name": torrent.name,
-            "site": StringUtils.get_url_sld(torrent.tracker),
-            "size": torrent.size,
-        }
+        digest = NotificationDigest(top=int(self._digesttop or 0))
+        with lock:
+            remove_torrents = self.__merge_remove_torrents(
+                self.__fetch_remove_torrents(downloader) for downloader in self._downloaders
+            )
+            try:
+                # 每个下载器批量处理一次
+                for downloader, torrents in remove_torrents.items():
+                    if self._event.is_set():
+                        logger.info(f"自动删种服务停止")
+                        return False
+                    self.__apply_action(downloader, torrents, digest)
+            finally:
+                self.__send_digest(digest)
+        return True
+
+    async def __delete_torrents_async(self, engine: AsyncEngine) -> bool:
+        """
+        异步删除下载任务，各下载器的查询及处理并发进行
+        """
+        with lock:
+            # 未开启辅种处理时各下载器按条件查询，不需要全量快照
+            await self.__prefetch_async(engine, snapshot=self._samedata)
+            remove_lists = await engine.map(
+                lambda downloader: engine.io(
+                    downloader, self.__fetch_remove_torrents, downloader
+                ),
+                self._downloaders,
+            )
+            remove_torrents = self.__merge_remove_torrents(remove_lists)
+            digest = NotificationDigest(top=int(self._digesttop or 0))
+            try:
+                await engine.map(
+                    lambda item: engine.io(item[0], self.__apply_action, *item, digest),
+                    list(remove_torrents.items()),
+                )
+            finally:
+                self.__send_digest(digest)
+        return True
 
-    def __get_tr_torrent(self, torrent: Any) -> Optional[dict]:
+    async def __prefetch_async(self, engine: AsyncEngine, snapshot: bool = True):
         """
-        检查TR下载任务是否符合条件
+        并发获取各下载器的种子快照及辅种分组，之后的并发处理只读取
+        :param snapshot: 是否获取全量快照，之后只按条件查询种子时不获取
         """
-        # 完成时间
-        date_done = torrent.date_done or torrent.date_added
-        # 现在时间
-        date_now = int(time.mktime(datetime.now().timetuple()))
-        # 做种时间
-        torrent_seeding_time = (
-            date_now - int(time.mktime(date_done.timetuple())) if date_done else 0
+        # 服务信息、网关及状态库在并发前创建
+        self.service_info_downloader
+        self.__get_store()
+        for downloader in self._downloaders:
+            self.__get_gateway(downloader)
+        if self._snapshot is None:
+            self._snapshot = {}
+        if not snapshot:
+            return
+        await engine.map(
+            lambda downloader: engine.io(downloader, self.__get_snapshot, downloader),
+            self._downloaders,
         )
-        # 上传量
-        torrent_uploaded = torrent.ratio * torrent.total_size
-        # 平均上传速茺
-        torrent_upload_avs = (
-            torrent_uploaded / torrent_seeding_time if torrent_seeding_time else 0
+        if self._samedata:
+            await engine.fs(self.__get_torrent_groups)
+
+    def __fetch_remove_torrents(self, downloader: str) -> List[TorrentRecord]:
+        """
+        获取下载器中需处理的种子，出错时返回空列表
+        """
+        try:
+            return self.get_remove_torrents(downloader)
+        except Exception as e:
+            logger.error(f"自动删种任务异常：{str(e)}")
+            return []
+
+    @staticmethod
+    def __merge_remove_torrents(remove_lists) -> Dict[str, List[TorrentRecord]]:
+        """
+        汇总所有下载器需删除种子并去重，辅种可能位于其它下载器
+        """
+        remove_torrents: Dict[str, List[TorrentRecord]] = {}
+        seen = set()
+        for torrents in remove_lists:
+            for torrent in torrents:
+                if (torrent.downloader, torrent.id) in seen:
+                    continue
+                seen.add((torrent.downloader, torrent.id))
+                remove_torrents.setdefault(torrent.downloader, []).append(torrent)
+        logger.info(f"自动删种任务 获取符合处理条件种子数 {len(seen)}")
+        for downloader, torrents in remove_torrents.items():
+            logger.info(f"自动删种任务 {downloader} 处理 {len(torrents)} 个种子")
+        return remove_torrents
+
+    def __apply_action(self, downloader: str, torrents: List[TorrentRecord],
+                       digest: NotificationDigest):
+        """
+        对一个下载器中的种子批量执行暂停或删除，结果汇总到本次运行的通知
+        """
+        try:
+            # 下载器
+            downlader_obj = self.__get_downloader(downloader)
+            ids = [torrent.id for torrent in torrents]
+            if self._action == "pause":
+                action_text = "暂停种子"
+            elif self._action == "delete":
+                action_text = "删除种子"
+            elif self._action == "deletefile":
+                action_text = "删除种子及文件"
+            else:
+                return
+            with stage("action"):
+                if self._action == "pause":
+                    # 暂停种子
+                    self.__call(downloader, downlader_obj.stop_torrents,
+                                false_is_error=True, ids=ids)
+                else:
+                    # 删除种子，超时后可能已执行，不重试
+                    self.__call(downloader, downlader_obj.delete_torrents,
+                                idempotent=False,
+                                delete_file=self._action == "deletefile", ids=ids)
+            incr("items.actioned", len(ids))
+            self.__invalidate_mirror(downloader)
+            store = self.__get_store()
+            if store:
+                store.add_actions(self._action, torrents)
+            for torrent in torrents:
+                logger.debug(
+                    f"自动删种任务 {action_text}：{downloader} {torrent.name} "
+                    f"来自站点：{torrent.site} "
+                    f"大小：{StringUtils.str_filesize(torrent.size)}"
+                )
+            digest.add(action_text, torrents)
+        except Exception as e:
+            logger.error(f"自动删种任务异常：{str(e)}")
+
+    def __send_digest(self, digest: NotificationDigest):
+        """
+        每次运行发送一条汇总通知
+        """
+        text = digest.render()
+        if text and self._notify:
+            self.post_message(
+                mtype=NotificationType.SiteMessage,
+                title=f"【自动删种任务完成】",
+                text=text,
+            )
+
+    def __has_dynamic_rules(self) -> bool:
+        """
+        是否配置了随时间变化的删种规则，此时下载器没有变化也需要运行
+        """
+        try:
+            return self.__get_rules().is_dynamic
+        except ValueError:
+            return True
+
+    def __get_rules(self, overrides: Optional[Dict[str, Any]] = None) -> TorrentRules:
+        """
+        按当前配置创建筛选规则，overrides中的项替换对应配置
+        """
+        config = {key: getattr(self, f"_{key}") for key in RULE_KEYS}
+        config.update(overrides or {})
+        return TorrentRules(config)
+
+    @staged("torrent_fetch")
+    def __get_torrents(
+        self,
+        downloader: str,
+        query: Optional[TorrentQuery] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[List[TorrentRecord]]:
+        """
+        查询下载器种子并转换为统一记录，查询失败返回None
+        :param query: 查询条件，尽量在下载器端过滤
+        :param fields: Transmission需要返回的字段，默认为种子记录全部字段
+        """
+        client = self.__get_client(downloader)
+        downloader_config = self.__get_downloader_config(downloader)
+        adapter = TorrentAdapter(downloader=downloader,
+                                 downloader_type=downloader_config.type)
+        if downloader_config.type == "qbittorrent":
+            mirror = self.__get_qb_mirror(downloader)
+            if query and query.qb_pushable() and not mirror.is_fresh(self._mirror_max_age):
+                # 镜像需同步时只拉取可能符合条件的种子
+                torrents = qb_query(client, query)
+                if torrents is None:
+                    return None
+                incr("items.torrents", len(torrents))
+                return query.filter(adapter.convert_all(torrents))
+            # 读取增量同步的本地镜像
+            if not mirror.sync(client, max_age=self._mirror_max_age):
+                return None
+            torrents = mirror.records(adapter)
+            incr("items.torrents", len(torrents))
+            return query.filter(torrents) if query else torrents
+        torrents, error_flag = transmission.get_torrents(
+            client,
+            fields=fields or transmission.RECORD_FIELDS,
+            tags=query.tags if query else None,
         )
-        # 大小 单位：GB
-        sizes = self._size.split("-") if self._size else []
-        minsize = float(sizes[0]) * 1024 * 1024 * 1024 if sizes else 0
-        maxsize = float(sizes[-1]) * 1024 * 1024 * 1024 if sizes else 0
-        # 分享率
-        if self._ratio and torrent.ratio <= float(self._ratio):
-            return None
-        if self._time and torrent_seeding_time <= float(self._time) * 3600:
-            return None
-        if self._size and (
-            torrent.total_size >= int(maxsize) or torrent.total_size <= int(minsize)
-        ):
-            return None
-        if self._upspeed and torrent_upload_avs >= float(self._upspeed) * 1024:
-            return None
-        if self._pathkeywords and not re.findall(
-            self._pathkeywords, torrent.download_dir, re.I
-        ):
+        if error_flag:
             return None
-        if self._trackerkeywords:
-            if not torrent.trackers:
+        incr("items.torrents", len(torrents))
+        torrents = adapter.convert_all(torrents)
+        return query.filter(torrents) if query else torrents
+
+    def __get_snapshot(self, downloader: str) -> Optional[List[TorrentRecord]]:
+        """
+        获取本次运行的下载器种子快照，同时写入状态库
+        """
+        if self._snapshot is None:
+            self._snapshot = {}
+        if downloader not in self._snapshot:
+            torrents = self.__get_torrents(downloader)
+            if torrents is None:
                 return None
-            else:
-                tacker_key_flag = False
-                for tracker in torrent.trackers:
-                    if re.findall(
-                        self._trackerkeywords, tracker.get("announce", ""), re.I
-                    ):
-                        tacker_key_flag = True
-                        break
-                if not tacker_key_flag:
-                    return None
-        if self._errorkeywords and not re.findall(
-            self._errorkeywords, torrent.error_string, re.I
-        ):
+            self._snapshot[downloader] = torrents
+            store = self.__get_store()
+            if store:
+                store.replace_torrents(downloader, torrents)
+        return self._snapshot[downloader]
+
+    @staged("torrent_fetch")
+    def __get_torrent_files(
+        self, downloader: str, torrents: List[TorrentRecord]
+    ) -> Optional[Dict[str, List[str]]]:
+        """
+        按需查询种子文件列表，返回 hash -> 文件相对路径列表，查询失败返回None
+        """
+        client = self.__get_client(downloader)
+        downloader_config = self.__get_downloader_config(downloader)
+        torrent_files = {}
+        if downloader_config.type == "qbittorrent":
+            try:
+                for torrent in torrents:
+                    torrent_files[torrent.id] = [
+                        file.get("name")
+                        for file in client.torrents_files(
+                            torrent_hash=torrent.id
+                        )
+                    ]
+            except Exception as e:
+                logger.error(f"获取种子文件列表出错：{str(e)}")
+                return None
+            return torrent_files
+        files = transmission.get_torrent_files(
+            client, ids=[torrent.id for torrent in torrents]
+        )
+        if files is None:
             return None
-        return {
-            "id": torrent.hashString,
-            "name": torrent.name,
-            "site": torrent.trackers[0].get("sitename") if torrent.trackers else "",
-            "size": torrent.total_size,
-        }
+        save_paths = {torrent.id: torrent.save_path for torrent in torrents}
+        for torrent_hash, paths in files.items():
+            save_path = save_paths.get(torrent_hash) or ""
+            torrent_files[torrent_hash] = [
+                os.path.relpath(path, save_path) if save_path else path
+                for path, _ in paths
+            ]
+        return torrent_files
+
+    def __get_qb_mirror(self, downloader: str) -> QbTorrentMirror:
+        """
+        获取qBittorrent种子镜像，rid及种子表保存在插件数据目录
+        """
+        mirror = self._qbmirrors.get(downloader)
+        if not mirror:
+            mirror = QbTorrentMirror(
+                downloader=downloader, state_file=self.__get_qb_mirror_file(downloader)
+            )
+            self._qbmirrors[downloader] = mirror
+        return mirror
+
+    def __get_qb_mirror_file(self, downloader: str) -> Path:
+        file_name = re.sub(r"\W", "_", downloader)
+        return self.get_data_path() / f"qbmirror_{file_name}.json"
+
+    def __invalidate_mirror(self, downloader: str):
+        """
+        本插件修改了下载器中的种子，镜像需重新同步，本次运行的快照及辅种分组也随之失效
+        """
+        self._run_modified = True
+        mirror = self._qbmirrors.get(downloader)
+        if mirror:
+            mirror.invalidate()
+        # 添加标签后的删种步骤需读取新的标签
+        if self._snapshot:
+            self._snapshot.pop(downloader, None)
+        self._torrent_groups = None
 
     # 返回带"wait_to_delete"标签的种子列表
-    def get_remove_torrents(self, downloader: str):
+    def get_remove_torrents(self, downloader: str) -> List[TorrentRecord]:
         """
         获取自动删种任务种子
         """
-        remove_torrents = []
-        # 下载器对象
-        downloader_obj = self.__get_downloader(downloader)
-        downloader_config = self.__get_downloader_config(downloader)
-        # 标题
-        if self._labels:
-            tags = self._labels.split(",")
+        # 查询种子，辅种分组需要全量快照，已获取快照时直接过滤，不再次查询下载器
+        query = self.__get_remove_query()
+        if self._samedata:
+            snapshot = self.__get_snapshot(downloader)
         else:
-            tags = []
-        if self._mponly:
-            tags.append(settings.TORRENT_TAG)
-        # 查询种子
-        torrents, error_flag = downloader_obj.get_torrents(tags=tags or None)
-        if error_flag:
+            snapshot = (self._snapshot or {}).get(downloader)
+        if snapshot is not None:
+            torrents = query.filter(snapshot)
+        else:
+            torrents = self.__get_torrents(downloader, query=query)
+        if torrents is None:
             return []
-        # 处理种子
-        for torrent in torrents:
-            if downloader_config.type == "qbittorrent":
-                item = {
-                    "id": torrent.hash,
-                    "name": torrent.name,
-                    "site": StringUtils.get_url_sld(torrent.tracker),
-                    "size": torrent.size,
-                }
-            if not item:
-                continue
-            remove_torrents.append(item)
+        # 检查删种规则
+        rules = self.__get_rules()
+        now = int(time.time())
+        with stage("filter"):
+            remove_torrents = [torrent for torrent in torrents if rules.match(torrent, now)]
         # 处理辅种
         if self._samedata and remove_torrents:
-            remove_ids = [t.get("id") for t in remove_torrents]
-            remove_torrents_plus = []
-            for remove_torrent in remove_torrents:
-                name = remove_torrent.get("name")
-                size = remove_torrent.get("size")
-                for torrent in torrents:
-                    if downloader_config.type == "qbittorrent":
-                        plus_id = torrent.hash
-                        plus_name = torrent.name
-                        plus_size = torrent.size
-                        plus_site = StringUtils.get_url_sld(torrent.tracker)
-                    else:
-                        plus_id = torrent.hashString
-                        plus_name = torrent.name
-                        plus_size = torrent.total_size
-                        plus_site = (
-                            torrent.trackers[0].get("sitename")
-                            if torrent.trackers
-                            else ""
-                        )
-                    # 比对名称和大小
-                    if (
-                        plus_name == name
-                        and plus_size == size
-                        and plus_id not in remove_ids
-                    ):
-                        remove_torrents_plus.append(
-                            {
-                                "id": plus_id,
-                                "name": plus_name,
-                                "site": plus_site,
-                                "size": plus_size,
-                            }
-                        )
-            if remove_torrents_plus:
-                remove_torrents.extend(remove_torrents_plus)
+            torrent_groups = self.__get_torrent_groups()
+            if torrent_groups:
+                with stage("filter"):
+                    remove_torrents = torrent_groups.expand(remove_torrents)
         return remove_torrents
 
+    def __get_remove_query(self, overrides: Optional[Dict[str, Any]] = None) -> TorrentQuery:
+        """
+        待处理种子的查询条件：标签需全部包含，分类及状态满足其一
+        :param overrides: 规则预览时替换的分类及状态配置
+        """
+        overrides = overrides or {}
+        tags = split_values(self._labels)
+        if self._mponly:
+            tags.append(settings.TORRENT_TAG)
+        return TorrentQuery(
+            tags=tags,
+            categories=overrides.get("torrentcategorys", self._torrentcategorys),
+            states=overrides.get("torrentstates", self._torrentstates),
+        )
+
+    def __get_torrent_groups(self) -> Optional[TorrentGroups]:
+        """
+        按内容位置及共享文件对所有下载器中的种子分组，同一次运行中标记和删除共用
+        """
+        if self._torrent_groups is None:
+            all_torrents = []
+            for downloader in self._downloaders:
+                torrents = self.__get_snapshot(downloader)
+                if torrents is None:
+                    # 部分下载器不可用时仍按可用的下载器分组
+                    logger.warning(f"下载器 {downloader} 种子获取失败，不参与辅种分组")
+                    continue
+                all_torrents.extend(torrents)
+            with stage("grouping"):
+                # 一次并行遍历所有种子的内容目录，避免逐个种子串行遍历
+                # 内容位置为保存目录或下载根目录时，目录内还有其它种子的文件，不遍历
+                shared_roots = {os.path.normpath(root) for root in self.__get_download_roots()}
+                content_dirs = {
+                    os.path.normpath(torrent.content_path)
+                    for torrent in all_torrents
+                    if torrent.content_path
+                    and not is_shared_content(torrent, shared_roots)
+                    and os.path.isdir(torrent.content_path)
+                }
+                listing = {content_dir: [] for content_dir in content_dirs}
+                listing.update(self.__get_walker().walk_by_root(content_dirs))
+                self._torrent_groups = TorrentGroups(
+                    all_torrents, file_keys=listed_file_keys(listing, shared_roots)
+                )
+            logger.info(
+                f"{len(self._downloaders)} 个下载器共 {len(all_torrents)} 个种子，"
+                f"按共享文件分为 {len(self._torrent_groups)} 组"
+            )
+        return self._torrent_groups
+
     # 返回下载目录中源文件
+    @staged("inode_resolution")
     def find_hard_link(self, file_path):
-        dir = self._download_path
         # 确保提供的路径是一个文件
         if not os.path.isfile(file_path):
             logger.error("Provided path is not a file")
             raise ValueError("Provided path is not a file")
 
-        # 获取文件的inode
-        inode = os.stat(file_path).st_ino
-        logger.info(f"media file inode: {inode}")
+        media_stat = os.stat(file_path)
+        logger.debug(f"media file inode: {media_stat.st_ino}")
 
-        # 遍历文件系统，寻找具有相同inode的文件
-        for root, dirs, files in os.walk(top=dir):
-            for name in files:
-                try:
-                    if os.stat(os.path.join(root, name)).st_ino == inode:
-                        logger.info(
-                            f"find hard link file path: {os.path.join(root, name)}"
-                        )
-                        return os.path.join(root, name)
-                except OSError:
-                    # 如果文件在遍历过程中被删除或无法访问，忽略它
-                    continue
+        # 媒体文件未变化时沿用上次解析结果
+        store = self.__get_store()
+        if store:
+            source_file = store.get_source_file(
+                file_path, media_stat.st_dev, media_stat.st_ino
+            )
+            if source_file and self.__is_source_of(source_file, file_path, media_stat):
+                logger.debug(f"find hard link file path: {source_file}")
+                return source_file
+            # 媒体文件改名或重新整理后，按inode查找已记录的硬链接源文件
+            source_file = store.find_source_by_inode(
+                media_stat.st_dev, media_stat.st_ino, exclude=file_path
+            )
+            if source_file and self.__is_source_of(source_file, file_path, media_stat):
+                logger.debug(f"find hard link file path: {source_file}")
+                self.__remember_source(store, source_file, file_path, media_stat)
+                return source_file
+
+        # 按大小查找同inode的硬链接，开启复制匹配时再比对内容指纹
+        source_file = self.__get_source_index().find(
+            file_path, copy_match=self._copymatch
+        )
+        if source_file:
+            logger.debug(f"find hard link file path: {source_file}")
+            if store:
+                self.__remember_source(store, source_file, file_path, media_stat)
+        return source_file
+
+    @staticmethod
+    def __remember_source(store: AutoClearStore, source_file: str, media_file: str,
+                          media_stat: os.stat_result):
+        """
+        记录媒体文件的源文件，下次运行直接使用
+        """
+        source_stat = os.stat(source_file)
+        store.upsert_source_file(
+            path=source_file,
+            media_path=media_file,
+            media_dev=media_stat.st_dev,
+            media_inode=media_stat.st_ino,
+            dev=source_stat.st_dev,
+            inode=source_stat.st_ino,
+            size=source_stat.st_size,
+            mtime=source_stat.st_mtime_ns,
+        )
+
+    def __find_source_file(self, media_file: str) -> Optional[str]:
+        """
+        查找媒体文件的源文件，媒体文件已不存在时跳过，不中断本次运行
+        """
+        try:
+            return self.find_hard_link(file_path=media_file)
+        except ValueError:
+            logger.warning(f"媒体文件 {media_file} 不存在，跳过")
+            return None
+
+    def __is_source_of(self, source_file: str, media_file: str,
+                       media_stat: os.stat_result) -> bool:
+        """
+        检查已记录的源文件是否仍然有效，复制的源文件重新比对内容指纹（未变化时读取缓存）
+        """
+        try:
+            source_stat = os.stat(source_file)
+        except OSError:
+            return False
+        if (source_stat.st_dev, source_stat.st_ino) == (media_stat.st_dev, media_stat.st_ino):
+            return True
+        if not self._copymatch or source_stat.st_size != media_stat.st_size:
+            return False
+        cache = self.__get_fingerprint_cache()
+        media_print = cached_partial_hash(
+            cache, media_file, media_stat.st_size, media_stat.st_mtime_ns
+        )
+        return bool(media_print) and media_print == cached_partial_hash(
+            cache, source_file, source_stat.st_size, source_stat.st_mtime_ns
+        )
+
+    def __get_fingerprint_cache(self) -> Any:
+        """
+        文件指纹缓存，状态库不可用时使用内存缓存
+        """
+        cache = self.__get_store()
+        if cache is None:
+            if self._fingerprints is None:
+                self._fingerprints = FingerprintCache()
+            cache = self._fingerprints
+        return cache
+
+    def __get_hash_pool(self) -> HashPool:
+        """
+        计算完整哈希的进程池，插件运行期间复用，停止插件时关闭
+        """
+        with self._hash_pool_lock:
+            if self._hash_pool is None:
+                self._hash_pool = HashPool(workers=min(4, os.cpu_count() or 1))
+            return self._hash_pool
+
+    def __get_source_index(self) -> SourceIndex:
+        """
+        获取下载目录文件索引，未建立时遍历下载目录
+        """
+        if self._source_index is None:
+            source_index = SourceIndex(
+                cache=self.__get_fingerprint_cache(),
+                full_hash_pool=self.__get_hash_pool() if self._fullhash else None,
+            )
+            source_index.build(self.__get_download_roots(), walker=self.__get_walker())
+            logger.info(f"下载目录索引完成，共 {len(source_index)} 个文件")
+            self._source_index = source_index
+        return self._source_index
+
+    def __get_download_roots(self) -> List[str]:
+        """
+        下载目录，多个目录以逗号或换行分隔
+        """
+        return [
+            path.strip()
+            for path in re.split(r"[,\n]", self._download_path or "")
+            if path.strip()
+        ]
+
+    def __get_walker(self) -> ParallelWalker:
+        """
+        目录遍历器，排除规则以逗号或换行分隔
+        """
+        return ParallelWalker(
+            workers=int(self._walkworkers or 8),
+            exclude=[
+                pattern.strip()
+                for pattern in re.split(r"[,\n]", self._exclude or "")
+                if pattern.strip()
+            ],
+        )
 
     # 获取所有已看完源文件列表
-    def get_watched_source_file_list(self):
+    def get_watched_source_file_list(self, watched_media_file_list=None):
 
         # 下载文件列表
         watched_source_file_list = []
 
         # 获取媒体文件列表
-        watched_media_file_list = self.get_watched_media_file_list()
+        if watched_media_file_list is None:
+            watched_media_file_list = self.get_watched_media_file_list()
 
         for media_file in watched_media_file_list:
-            source_file = self.find_hard_link(file_path=media_file)
+            source_file = self.__find_source_file(media_file)
             if source_file:
                 watched_source_file_list.append(source_file)
+        incr("items.source_files", len(watched_source_file_list))
 
         return watched_source_file_list
 
@@ -576,94 +1529,658 @@ class AutoClear(_PluginBase):
         path = file_path
         parts = path.split("/")
 
-        logger.info(f"hard link file last path: {parts[-2]}")
+        logger.debug(f"hard link file last path: {parts[-2]}")
         return parts[-2]
 
     # 获取包含指定content_path的所有种子列表
-    def get_torrent(self, content_path):
+    def get_torrent(self, content_path, source_file: Optional[str] = None):
         """
         获取包含content_path的任务种子
+        :param source_file: 下载目录中的源文件，指定时按种子文件列表确认归属
         """
-        # 下载器对象
-        downloader = self._downloaders[0]
-        downloader_obj = self.__get_downloader(downloader)
-        downloader_config = self.__get_downloader_config(downloader)
-
         # 存放torrent.hash
-        torrent_lists = []
-        for torrent in downloader_obj.get_torrents()[0]:
-            if content_path in torrent.content_path:
-                logger.info(f"torrent: {torrent.hash} have content path {content_path}")
-                torrent_lists.append(torrent.hash)
-
-        logger.info(f"torrent list: {torrent_lists}")
+        torrent_lists = [
+            torrent.id for torrent in self.__find_torrents(content_path, source_file)
+        ]
+        logger.debug(f"torrent list: {torrent_lists}")
         return torrent_lists
 
+    def __find_torrents(
+        self, content_path: str, source_file: Optional[str] = None
+    ) -> List[TorrentRecord]:
+        """
+        在所有下载器中查找包含content_path的种子
+        """
+        results = []
+        for downloader in self._downloaders:
+            torrents = self.__get_snapshot(downloader) or []
+            with stage("filter"):
+                candidates = [
+                    torrent
+                    for torrent in torrents
+                    if content_path in torrent.content_path
+                ]
+            if source_file and candidates:
+                torrent_files = self.__get_torrent_files(downloader, candidates)
+                if torrent_files is not None:
+                    candidates = [
+                        torrent
+                        for torrent in candidates
+                        if any(
+                            source_file == name
+                            or source_file.endswith(os.sep + name)
+                            for name in torrent_files.get(torrent.id) or []
+                        )
+                    ]
+            for torrent in candidates:
+                logger.debug(
+                    f"torrent: {torrent.downloader}:{torrent.id} have content path {content_path}"
+                )
+            results.extend(candidates)
+        return results
+
     # 获取所有已看源文件的种子文件列表
-    def get_watched_torrent_list(self):
+    def get_watched_torrent_list(self, watched_media_file_list=None):
 
-        torrent_list = []
-        for file in self.get_watched_source_file_list():
-            file_last_path = self.get_last_path(file)
-            torrent_list += self.get_torrent(file_last_path)
+        return [
+            torrent.id
+            for torrent in self.__get_watched_torrents(watched_media_file_list)
+        ]
 
-        return torrent_list
+    def __get_watched_torrents(self, watched_media_file_list=None) -> List[TorrentRecord]:
+        """
+        获取所有已看源文件所属的种子记录
+        """
+        torrents = []
+        for file in self.get_watched_source_file_list(watched_media_file_list):
+            file_last_path = self.get_last_path(file)
+            torrents += self.__find_torrents(file_last_path, source_file=file)
+        return torrents
 
     # 给已看过种子添加待删除tag，tag为“wait_to_delete"
-    def add_delete_tag(self):
+    def add_delete_tag(self, watched_media_file_list=None):
+        """
+        给指定种子添加tag，开启辅种处理时所有下载器中同一分组的种子一并添加
+        """
+        torrents = self.__get_watched_torrents(watched_media_file_list)
+        torrent_hashes, torrents = self.__get_tag_targets(torrents)
+        # 每个下载器批量添加一次
+        for downloader, hashes in torrent_hashes.items():
+            self.__tag_torrents(downloader, hashes)
+        self.__record_tags(torrents)
+
+    async def __add_delete_tag_async(self, engine: AsyncEngine, watched_media_file_list: List[str]):
+        """
+        异步添加待删除tag：并发解析源文件、查找所属种子，各下载器并发添加
+        """
+        await self.__prefetch_async(engine)
+        await engine.fs(self.__get_source_index)
+        source_files = await engine.map(
+            lambda media_file: engine.fs(self.__find_source_file, media_file),
+            watched_media_file_list,
+        )
+        source_files = [source_file for source_file in source_files if source_file]
+        incr("items.source_files", len(source_files))
+        found = await engine.map(
+            lambda source_file: engine.fs(
+                self.__find_torrents, self.get_last_path(source_file), source_file
+            ),
+            source_files,
+        )
+        torrent_hashes, torrents = self.__get_tag_targets(
+            [torrent for torrents in found for torrent in torrents]
+        )
+        await engine.map(
+            lambda item: engine.io(item[0], self.__tag_torrents, *item),
+            list(torrent_hashes.items()),
+        )
+        self.__record_tags(torrents)
+
+    def __get_tag_targets(
+        self, torrents: List[TorrentRecord]
+    ) -> Tuple[Dict[str, List[str]], List[TorrentRecord]]:
+        """
+        按下载器汇总需添加tag的种子hash，开启辅种处理时扩展到同一分组
+        """
+        if self._samedata and torrents:
+            torrent_groups = self.__get_torrent_groups()
+            if torrent_groups:
+                torrents = torrent_groups.expand(torrents)
+        torrent_hashes: Dict[str, List[str]] = {}
+        for torrent in torrents:
+            torrent_hashes.setdefault(torrent.downloader, []).append(torrent.id)
+        return {
+            downloader: list(dict.fromkeys(hashes))
+            for downloader, hashes in torrent_hashes.items()
+        }, torrents
+
+    def __tag_torrents(self, downloader: str, hashes: List[str]):
         """
-        给指定种子添加tag
+        给一个下载器中的种子批量添加待删除tag
         """
-        # 下载器对象
-        downloader = self._downloaders[0]
         downloader_obj = self.__get_downloader(downloader)
-        downloader_config = self.__get_downloader_config(downloader)
+        with stage("tag"):
+            self.__call(downloader, downloader_obj.set_torrents_tag,
+                        false_is_error=True, tags="wait_to_delete", ids=hashes)
+        incr("items.tagged", len(hashes))
+        logger.info(f"add delete tag to: {downloader} {len(hashes)} torrents")
+        logger.debug(f"add delete tag to: {downloader} {hashes}")
+        self.__invalidate_mirror(downloader)
 
-        for torrent_hash in self.get_watched_torrent_list():
-            downloader_obj.set_torrents_tag(tags="wait_to_delete", ids=torrent_hash)
-            logger.info(f"add delete tag to: {torrent_hash}")
+    def __record_tags(self, torrents: List[TorrentRecord]):
+        store = self.__get_store()
+        if store:
+            store.add_actions("tag", torrents)
 
     # 返回已看完影视文件列表
     def get_watched_media_file_list(self):
 
+        return [item.path for item in self.get_watched_media_items()]
+
+    @staged("plex_discovery")
+    def get_watched_media_items(self) -> List[MediaItem]:
+        """
+        获取已看完的媒体文件，同时写入状态库
+        """
         mediaserver = self._mediaservers[0]
+        if not self.__is_plex(mediaserver):
+            watched_media_items = self.__get_jellyfin_watched(mediaserver)
+            return self.__save_media_items(watched_media_items)
 
-        plex = self.__get_mediaserver(mediaserver).get_plex()
+        plex = self.__get_plex(mediaserver)
         # 电影，电视节目
-        watched_media_file_list = []
+        watched_media_items = []
         for section in ["电视节目", "电影"]:
-            library = plex.library.section(section)
-            if library.type == "show":
-                for video in library.search(unwatched=False):
+            library = self.__get_library(mediaserver, plex, section)
+            if library.type == "show" and self._granularity != "show":
+                episodes = self.__search_library(mediaserver, library)
+                watched_media_items += self.__granular_items(mediaserver, episodes)
+            elif library.type == "show":
+                for video in self.__search_watched(mediaserver, library):
                     # 判断是否所有剧集都已看
                     if video.leafCount == video.viewedLeafCount:
-                        episode = video.episodes()
-                        for i in episode:
-                            for part in i.iterParts():
-                                logger.info(f"episode {part.file} watched")
-                                watched_media_file_list.append(part.file)
+                        episode = self.__call(mediaserver, video.episodes)
+                        watched_media_items += self.__episode_items(mediaserver, video.title, episode)
+
+            else:
+                for video in self.__search_watched(mediaserver, library):
+                    watched_media_items.append(self.__movie_item(mediaserver, video))
+
+        users = split_values(self._homeusers)
+        if users and watched_media_items:
+            keys = {item.rating_key for item in watched_media_items}
+            watched_media_items = self.__intersect_home_watched(
+                watched_media_items, users,
+                [self.__get_home_watched(mediaserver, plex, user, keys) for user in users],
+            )
+        return self.__save_media_items(watched_media_items)
+
+    async def __get_watched_media_items_async(self, engine: AsyncEngine) -> List[MediaItem]:
+        """
+        异步获取已看完的媒体文件，各媒体库及剧集的查询并发进行
+        """
+        mediaserver = self._mediaservers[0]
+        if not self.__is_plex(mediaserver):
+            watched_media_items = await engine.io(
+                mediaserver, self.__get_jellyfin_watched, mediaserver
+            )
+            return await engine.fs(self.__save_media_items, watched_media_items)
+        with stage("plex_discovery"):
+            plex = await engine.io(mediaserver, self.__get_plex, mediaserver)
+            libraries = await engine.map(
+                lambda section: engine.io(
+                    mediaserver, self.__get_library, mediaserver, plex, section
+                ),
+                ["电视节目", "电影"],
+            )
+            results = await engine.map(
+                lambda library: engine.io(
+                    mediaserver, self.__search_library, mediaserver, library
+                ),
+                libraries,
+            )
+            watched_media_items = []
+            for library, videos in zip(libraries, results):
+                if library.type == "show" and self._granularity != "show":
+                    watched_media_items += self.__granular_items(mediaserver, videos)
+                elif library.type == "show":
+                    # 判断是否所有剧集都已看
+                    shows = [
+                        video for video in videos
+                        if video.leafCount == video.viewedLeafCount
+                    ]
+                    episodes = await engine.map(
+                        lambda video: engine.io(
+                            mediaserver, self.__call, mediaserver, video.episodes
+                        ),
+                        shows,
+                    )
+                    for video, episode in zip(shows, episodes):
+                        watched_media_items += self.__episode_items(mediaserver, video.title, episode)
+                else:
+                    watched_media_items += [
+                        self.__movie_item(mediaserver, video) for video in videos
+                    ]
+            users = split_values(self._homeusers)
+            if users and watched_media_items:
+                # 各成员的观看状态并发查询
+                keys = {item.rating_key for item in watched_media_items}
+                home_watched = await engine.map(
+                    lambda user: engine.io(
+                        mediaserver, self.__get_home_watched, mediaserver, plex, user, keys
+                    ),
+                    users,
+                )
+                watched_media_items = self.__intersect_home_watched(
+                    watched_media_items, users, home_watched
+                )
+            watched_media_items = await engine.fs(self.__save_media_items, watched_media_items)
+        return watched_media_items
+
+    def __get_home_plex(self, mediaserver: str, plex: Any, user: str) -> Any:
+        """
+        切换到Plex Home成员的服务器连接，同一成员只切换一次
+        """
+        user_plex = self._home_servers.get(user)
+        if user_plex is None:
+            user_plex = self.__call(mediaserver, plex.switchUser, user)
+            self.__prepare_session(user_plex, mediaserver)
+            self._home_servers[user] = user_plex
+        return user_plex
+
+    def __get_home_watched(self, mediaserver: str, plex: Any, user: str,
+                           keys: Set[str]) -> Optional[Set[str]]:
+        """
+        返回成员已看完的ratingKey，只查询上次未看完的条目，查询失败返回None
+        """
+        watched = set((self.get_data("home_watched") or {}).get(user) or []) & keys
+        pending = sorted(keys - watched)
+        if not pending:
+            return watched
+        try:
+            user_plex = self.__get_home_plex(mediaserver, plex, user)
+            for i in range(0, len(pending), self._home_batch):
+                batch = ",".join(pending[i:i + self._home_batch])
+                items = self.__call(mediaserver, user_plex.fetchItems, f"/library/metadata/{batch}")
+                watched.update(
+                    str(item.ratingKey) for item in items or [] if getattr(item, "viewCount", 0)
+                )
+        except Exception as e:
+            logger.error(f"获取Plex Home成员 {user} 观看状态失败：{str(e)}")
+            return None
+        incr("items.home_checked", len(pending))
+        return watched
+
+    def __intersect_home_watched(self, watched_media_items: List[MediaItem], users: List[str],
+                                 home_watched: List[Optional[Set[str]]]) -> List[MediaItem]:
+        """
+        只保留所有成员均已看完的媒体，任一成员查询失败时本次不清理
+        """
+        if any(watched is None for watched in home_watched):
+            logger.warning("部分Plex Home成员观看状态获取失败，本次不清理")
+            return []
+        self.save_data("home_watched", {
+            user: sorted(watched) for user, watched in zip(users, home_watched)
+        })
+        keys = set.intersection(*home_watched)
+        results = [item for item in watched_media_items if item.rating_key in keys]
+        logger.info(
+            f"{len(users)} 个Plex Home成员均已看完 {len(results)}/{len(watched_media_items)} 个媒体文件"
+        )
+        return results
+
+    def __is_plex(self, mediaserver: str) -> bool:
+        return self.__get_mediaserver_config(mediaserver).type == "plex"
+
+    def __get_jellyfin_client(self, mediaserver: str) -> JellyfinClient:
+        client = self._jellyfin_clients.get(mediaserver)
+        if client is None:
+            client = JellyfinClient(
+                self.__get_mediaserver(mediaserver),
+                emby=self.__get_mediaserver_config(mediaserver).type == "emby",
+            )
+            self.__prepare_session(client, mediaserver)
+            self._jellyfin_clients[mediaserver] = client
+        return client
+
+    @staged("jellyfin_discovery")
+    def __get_jellyfin_watched(self, mediaserver: str) -> List[MediaItem]:
+        """
+        获取Jellyfin/Emby已看媒体：服务端按观看状态过滤并分页，只返回路径字段，不再逐部剧集查询
+        """
+        client = self.__get_jellyfin_client(mediaserver)
+        if not client:
+            logger.error(f"媒体服务器 {mediaserver} 缺少地址、API Key或用户信息")
+            return []
+        call = functools.partial(self.__call, mediaserver)
+        watched = list(client.items(call, "Movie"))
+        episodes = list(client.items(call, "Episode"))
+        if self._granularity == "show":
+            # 剧集或季的已看状态即其下所有剧集均已看
+            complete = {item.get("Id") for item in client.items(call, "Series", fields="")}
+            episodes = [episode for episode in episodes if episode.get("SeriesId") in complete]
+        elif self._granularity == "season":
+            complete = {item.get("Id") for item in client.items(call, "Season", fields="")}
+            episodes = [episode for episode in episodes if episode.get("SeasonId") in complete]
+        elif self._granularity == "keeplast":
+            episodes = self.__keep_last_episodes(
+                episodes, client.items(call, "Episode", played=False, fields="")
+            )
+        watched += episodes
+        return [
+            self.__jellyfin_item(mediaserver, item) for item in watched if item.get("Path")
+        ]
+
+    def __keep_last_episodes(self, played: List[dict], unplayed) -> List[dict]:
+        """
+        保留每部剧集第一个未看剧集之前的若干集已看剧集
+        """
+        keep_count = int(self._keepepisodes or 0)
+        if keep_count <= 0:
+            return played
+
+        def order(item: dict):
+            return item.get("ParentIndexNumber") or 0, item.get("IndexNumber") or 0
+
+        frontier = {}
+        for item in unplayed:
+            series = item.get("SeriesId")
+            if series not in frontier or order(item) < frontier[series]:
+                frontier[series] = order(item)
+        series_episodes: Dict[str, List[dict]] = {}
+        for item in played:
+            series_episodes.setdefault(item.get("SeriesId"), []).append(item)
+        keep = set()
+        for series, items in series_episodes.items():
+            if series not in frontier:
+                continue
+            before = sorted(
+                (item for item in items if order(item) < frontier[series]), key=order
+            )
+            keep.update(item.get("Id") for item in before[-keep_count:])
+        return [item for item in played if item.get("Id") not in keep]
+
+    @staticmethod
+    def __jellyfin_item(mediaserver: str, item: dict) -> MediaItem:
+        logger.debug(f"{item.get('Type')} {item.get('Path')} watched")
+        if item.get("Type") == "Episode":
+            title = (f"{item.get('SeriesName')} "
+                     f"s{item.get('ParentIndexNumber') or 0:02d}e{item.get('IndexNumber') or 0:02d}")
+            media_type = "episode"
+        else:
+            title = item.get("Name")
+            media_type = "movie"
+        return MediaItem(
+            server=mediaserver,
+            rating_key=str(item.get("Id")),
+            title=title,
+            type=media_type,
+            path=item.get("Path"),
+            last_viewed_at=jellyfin_timestamp((item.get("UserData") or {}).get("LastPlayedDate")),
+        )
+
+    def __get_plex(self, mediaserver: str) -> Any:
+        plex = self.__get_mediaserver(mediaserver).get_plex()
+        self.__prepare_session(plex, mediaserver)
+        return plex
+
+    def __get_library(self, mediaserver: str, plex: Any, section: str) -> Any:
+        return self.__call(mediaserver, lambda: plex.library.section(section))
 
+    def __search_watched(self, mediaserver: str, library: Any) -> list:
+        return self.__call(mediaserver, library.search, unwatched=False)
+
+    def __search_library(self, mediaserver: str, library: Any) -> list:
+        """
+        查询媒体库，按集清理时电视节目媒体库只进行一次剧集级查询，不再逐部剧集查询
+        """
+        if library.type != "show" or self._granularity == "show":
+            return self.__search_watched(mediaserver, library)
+        if self._granularity == "episode":
+            return self.__call(mediaserver, library.search, libtype="episode", unwatched=False)
+        # 整季及保留最近剧集需要未看剧集判断观看进度
+        return self.__call(mediaserver, library.search, libtype="episode")
+
+    def __granular_items(self, mediaserver: str, episodes: list) -> List[MediaItem]:
+        """
+        按清理粒度从剧集列表中选择可清理的已看剧集
+        """
+        shows: Dict[str, list] = {}
+        for episode in episodes:
+            shows.setdefault(str(episode.grandparentRatingKey), []).append(episode)
+        items = []
+        for show_episodes in shows.values():
+            show_episodes.sort(key=lambda i: (i.parentIndex or 0, i.index or 0))
+            watched = [bool(i.viewCount) for i in show_episodes]
+            if self._granularity == "season":
+                seasons: Dict[Any, bool] = {}
+                for i, viewed in zip(show_episodes, watched):
+                    seasons[i.parentIndex] = seasons.get(i.parentIndex, True) and viewed
+                selected = [i for i in show_episodes if seasons[i.parentIndex]]
+            elif self._granularity == "keeplast" and not all(watched):
+                # 保留第一个未看剧集之前的若干集已看剧集
+                frontier = watched.index(False)
+                keep = range(max(frontier - int(self._keepepisodes or 0), 0), frontier)
+                selected = [
+                    i for n, (i, viewed) in enumerate(zip(show_episodes, watched))
+                    if viewed and n not in keep
+                ]
             else:
-                for video in library.search(unwatched=False):
-                    logger.info(f"movie {video.locations[0]} watched")
-                    watched_media_file_list.append(video.locations[0])
+                selected = [i for i, viewed in zip(show_episodes, watched) if viewed]
+            for episode in selected:
+                items += self.__episode_items(mediaserver, episode.grandparentTitle, [episode])
+        return items
 
-        return watched_media_file_list
+    @staticmethod
+    def __episode_items(mediaserver: str, title: str, episode: list) -> List[MediaItem]:
+        items = []
+        for i in episode:
+            for part in i.iterParts():
+                logger.debug(f"episode {part.file} watched")
+                items.append(MediaItem(
+                    server=mediaserver,
+                    rating_key=str(i.ratingKey),
+                    title=f"{title} {i.seasonEpisode}",
+                    type="episode",
+                    path=part.file,
+                    size=part.size or 0,
+                    last_viewed_at=to_timestamp(i.lastViewedAt),
+                ))
+        return items
+
+    @staticmethod
+    def __movie_item(mediaserver: str, video: Any) -> MediaItem:
+        logger.debug(f"movie {video.locations[0]} watched")
+        return MediaItem(
+            server=mediaserver,
+            rating_key=str(video.ratingKey),
+            title=video.title,
+            type="movie",
+            path=video.locations[0],
+            size=video.media[0].parts[0].size if video.media else 0,
+            last_viewed_at=to_timestamp(video.lastViewedAt),
+        )
+
+    def __save_media_items(self, watched_media_items: List[MediaItem]) -> List[MediaItem]:
+        """
+        保存已看媒体，去掉已清理且文件不存在的媒体（媒体服务器尚未刷新）
+        """
+        store = self.__get_store()
+        if store and watched_media_items:
+            removed = store.get_removed_paths([item.path for item in watched_media_items])
+            if removed:
+                watched_media_items = [
+                    item for item in watched_media_items
+                    if item.path not in removed or os.path.exists(item.path)
+                ]
+            store.upsert_media_items(watched_media_items)
+        incr("items.media", len(watched_media_items))
+        return watched_media_items
+
+    def __get_disk_deficits(self, media_paths: Optional[List[str]] = None) -> Dict[int, int]:
+        """
+        检查下载目录及媒体库所在文件系统的剩余空间，返回需回收的字节数
+        """
+        paths = self.__get_download_roots()
+        if self._library_path:
+            paths += [path.strip() for path in self._library_path.split(",") if path.strip()]
+        if media_paths:
+            paths += list({os.path.dirname(path) for path in media_paths})
+        return disk_deficits(
+            paths,
+            low_water=float(self._lowwater or 0),
+            high_water=float(self._highwater or self._lowwater or 0),
+        )
+
+    def __select_by_pressure(self, watched_media_items: List[MediaItem],
+                             deficits: Dict[int, int]) -> List[MediaItem]:
+        """
+        按实际可回收空间从大到小选择已看媒体，回收至高水位即停止
+        """
+        delete_source = self._action == "deletefile"
+        candidates = []
+        for item in watched_media_items:
+            source_file = self.__find_source_file(item.path)
+            if not source_file:
+                continue
+            candidates.append(ClearCandidate(
+                item=item,
+                source_file=source_file,
+                reclaim=reclaimable_bytes(item.path, source_file, delete_source),
+            ))
+        selected = select_by_reclaim(candidates, deficits)
+        logger.info(
+            f"磁盘空间模式 共 {len(candidates)} 个已看文件，选择 {len(selected)} 个，"
+            f"预计回收 {StringUtils.str_filesize(sum(c.reclaim_bytes for c in selected))}"
+        )
+        return [candidate.item for candidate in selected]
 
     # 删除媒体库文件，将种子文件标记为待删除
     def all_clear(self):
+        with self.__run("all_clear") as metrics:
+            self.__all_clear(metrics)
 
-        # 删除媒体库文件
-        watched_media_file_list = self.get_watched_media_file_list()
-        for file in watched_media_file_list:
-            try:
-                os.unlink(file)
-                logger.info(f"file {file} deleted")
-            except Exception as e:
-                logger.error(e)
+    def __all_clear(self, metrics: RunMetrics):
+
+        # 本次运行重新获取种子快照及辅种分组，立即运行由用户触发，不因没有变化而跳过
+        self.__reset_run()
 
-        # 添加删除tag
-        self.add_delete_tag()
+        # 磁盘空间模式，剩余空间高于低水位时不处理
+        if self._pressure and not self.__get_disk_deficits():
+            logger.info("磁盘剩余空间充足，跳过本次清理")
+            metrics.finish("skipped")
+            return
+
+        if self.__use_async():
+            completed = self.__run_async(self.__clear_async)
+        else:
+            completed = self.__clear()
+        self.__reset_run()
+        if not completed:
+            metrics.finish("cancelled")
+            return
+
+    def __clear(self) -> bool:
+        """
+        查找已看媒体，添加删除tag，删除媒体库文件并处理种子
+        """
+        watched_media_items = self.get_watched_media_items()
+        if self._pressure:
+            deficits = self.__get_disk_deficits([item.path for item in watched_media_items])
+            watched_media_items = self.__select_by_pressure(watched_media_items, deficits)
+
+        removed_files = []
+        for batch in self.__clear_batches(watched_media_items):
+            watched_media_file_list = [item.path for item in batch]
+
+            # 添加删除tag，需在删除媒体库文件前通过硬链接查找源文件
+            self.add_delete_tag(watched_media_file_list)
+
+            # 删除媒体库文件
+            with stage("unlink"):
+                removed_files += [
+                    file for file in watched_media_file_list if self.__unlink(file)
+                ]
+        self.__record_unlinked(removed_files)
 
         # 暂停做种
-        self.delete_torrents()
+        return self.__delete_torrents()
+
+    async def __clear_async(self, engine: AsyncEngine) -> bool:
+        """
+        异步执行清理，与__clear步骤相同
+        """
+        watched_media_items = await self.__get_watched_media_items_async(engine)
+        if self._pressure:
+            deficits = await engine.fs(
+                self.__get_disk_deficits, [item.path for item in watched_media_items]
+            )
+            watched_media_items = await engine.fs(
+                self.__select_by_pressure, watched_media_items, deficits
+            )
+
+        removed_files = []
+        for batch in self.__clear_batches(watched_media_items):
+            watched_media_file_list = [item.path for item in batch]
+
+            # 添加删除tag，需在删除媒体库文件前通过硬链接查找源文件
+            await self.__add_delete_tag_async(engine, watched_media_file_list)
+
+            # 删除媒体库文件
+            with stage("unlink"):
+                results = await engine.map(
+                    lambda file: engine.fs(self.__unlink, file), watched_media_file_list
+                )
+            removed_files += [
+                file for file, removed in zip(watched_media_file_list, results) if removed
+            ]
+        self.__record_unlinked(removed_files)
+
+        # 暂停做种
+        return await self.__delete_torrents_async(engine)
+
+    def __clear_batches(self, watched_media_items: List[MediaItem]):
+        """
+        按优先级分批取出待清理媒体，达到本次运行的条目数、大小或接口调用次数限额即停止
+        """
+        queue = ClearQueue(
+            watched_media_items,
+            order=self._priority,
+            max_items=int(self._maxitems or 0),
+            max_bytes=int(float(self._maxgb or 0) * GB),
+        )
+        # 不限制接口调用次数时一次取出
+        batch_size = self._clear_batch if self._maxcalls else 0
+        metrics = current_metrics.get()
+        while not self._event.is_set():
+            if self._maxcalls and metrics and metrics.total("api_calls.") >= int(self._maxcalls):
+                logger.info(f"本次运行接口调用已达 {self._maxcalls} 次")
+                break
+            batch = queue.take(batch_size)
+            if batch:
+                yield batch
+            if not batch or queue.capped:
+                break
+        if len(queue):
+            incr("items.deferred", len(queue))
+            logger.info(
+                f"本次运行清理 {queue.taken} 个媒体文件（{StringUtils.str_filesize(queue.taken_bytes)}），"
+                f"剩余 {len(queue)} 个留待下次运行"
+            )
+
+    @staticmethod
+    def __unlink(file: str) -> bool:
+        try:
+            os.unlink(file)
+            logger.debug(f"file {file} deleted")
+            return True
+        except Exception as e:
+            logger.error(e)
+            return False
+
+    def __record_unlinked(self, removed_files: List[str]):
+        incr("items.unlinked", len(removed_files))
+        logger.info(f"共删除 {len(removed_files)} 个媒体库文件")
+        store = self.__get_store()
+        if store and removed_files:
+            store.mark_media_removed(removed_files)
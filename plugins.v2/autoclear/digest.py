@@ -0,0 +1,76 @@
+import heapq
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.utils.string import StringUtils
+
+from .torrent import TorrentRecord
+
+
+class NotificationDigest:
+    """
+    汇总一次运行中所有下载器的处理结果，按站点及操作统计数量和大小，只列出最大的若干个种子
+    """
+
+    def __init__(self, top: int = 20, max_sites: int = 20):
+        """
+        :param top: 列出的种子数
+        :param max_sites: 列出的站点数，其余合并为一行
+        """
+        self._top = max(top, 0)
+        self._max_sites = max(max_sites, 1)
+        self._lock = threading.Lock()
+        # (操作, 站点) -> [数量, 大小]
+        self._totals: Dict[Tuple[str, str], List[int]] = {}
+        # 最大的种子：(大小, 序号, 操作, 名称, 站点)
+        self._items: List[Tuple[int, int, str, str, str]] = []
+        self._count = 0
+        self._bytes = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, action: str, torrents: Iterable[TorrentRecord]):
+        with self._lock:
+            for torrent in torrents:
+                size = torrent.size or 0
+                total = self._totals.setdefault((action, torrent.site or "未知站点"), [0, 0])
+                total[0] += 1
+                total[1] += size
+                self._count += 1
+                self._bytes += size
+                if not self._top:
+                    continue
+                item = (size, self._count, action, torrent.name, torrent.site)
+                if len(self._items) < self._top:
+                    heapq.heappush(self._items, item)
+                elif item > self._items[0]:
+                    heapq.heapreplace(self._items, item)
+
+    def render(self) -> Optional[str]:
+        """
+        生成通知内容，没有处理任何种子时返回None
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            lines = [f"共处理 {self._count} 个种子，{StringUtils.str_filesize(self._bytes)}"]
+            totals = sorted(self._totals.items(), key=lambda kv: (-kv[1][1], kv[0]))
+            for (action, site), (count, size) in totals[:self._max_sites]:
+                lines.append(f"{action} {site}：{count} 个，{StringUtils.str_filesize(size)}")
+            rest = totals[self._max_sites:]
+            if rest:
+                lines.append(
+                    f"其它 {len(rest)} 项：{sum(v[0] for _, v in rest)} 个，"
+                    f"{StringUtils.str_filesize(sum(v[1] for _, v in rest))}"
+                )
+            items = sorted(self._items, reverse=True)
+            if items:
+                lines.append("")
+                for size, _, action, name, site in items:
+                    lines.append(
+                        f"{action}：{name} 来自站点：{site} 大小：{StringUtils.str_filesize(size)}"
+                    )
+                if self._count > len(items):
+                    lines.append(f"……等 {self._count} 个种子")
+            return "\n".join(lines)
@@ -0,0 +1,124 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from app.log import logger
+
+T = TypeVar("T")
+
+
+class RunCancelled(Exception):
+    """
+    插件停止，本次运行取消
+    """
+
+
+class AsyncEngine:
+    """
+    异步执行引擎：服务请求及文件操作在线程池中执行，按服务限制并发，互相重叠
+    客户端库均为同步实现，引擎负责调度，不改变单个调用的行为
+    """
+
+    def __init__(self, cancel_event: threading.Event, concurrency: int = 2,
+                 fs_workers: int = 4, poll_interval: float = 0.2):
+        """
+        :param cancel_event: 设置后取消本次运行
+        :param concurrency: 每个服务同时进行的请求数
+        :param fs_workers: 同时进行的文件操作数
+        """
+        self._cancel_event = cancel_event
+        self._concurrency = max(concurrency, 1)
+        self._fs_workers = max(fs_workers, 1)
+        self._poll_interval = poll_interval
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+
+    def run(self, main: Callable[["AsyncEngine"], Awaitable[T]]) -> Optional[T]:
+        """
+        在新的事件循环中运行，供APScheduler任务等同步代码调用，取消时返回None
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.__main(main))
+        # 当前线程已有事件循环时在新线程中运行
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(context.run, asyncio.run, self.__main(main)).result()
+
+    async def __main(self, main: Callable[["AsyncEngine"], Awaitable[T]]) -> Optional[T]:
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._fs_workers + self._concurrency * 4,
+            thread_name_prefix="autoclear",
+        )
+        self._limits = {}
+        task = asyncio.ensure_future(main(self))
+        watcher = asyncio.ensure_future(self.__watch(task))
+        try:
+            return await task
+        except (asyncio.CancelledError, RunCancelled):
+            logger.info("自动删种服务停止，本次运行已取消")
+            return None
+        finally:
+            watcher.cancel()
+            # 已提交的调用执行完再返回，避免运行结束后仍在修改下载器
+            self._executor.shutdown(wait=True)
+
+    async def __watch(self, task: asyncio.Future):
+        while not task.done():
+            if self._cancel_event.is_set():
+                task.cancel()
+                return
+            await asyncio.sleep(self._poll_interval)
+
+    def check(self):
+        """
+        插件停止时中断当前协程
+        """
+        if self._cancel_event.is_set():
+            raise RunCancelled()
+
+    def __limit(self, key: str, size: int) -> asyncio.Semaphore:
+        semaphore = self._limits.get(key)
+        if semaphore is None:
+            semaphore = self._limits[key] = asyncio.Semaphore(size)
+        return semaphore
+
+    async def __offload(self, func: Callable, *args, **kwargs) -> Any:
+        # 线程池不会自动传递上下文，运行统计依赖上下文变量
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def io(self, service: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        调用服务，同一服务同时进行的请求数受限
+        """
+        self.check()
+        async with self.__limit(f"service:{service}", self._concurrency):
+            self.check()
+            return await self.__offload(func, *args, **kwargs)
+
+    async def fs(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        文件操作及其它阻塞操作
+        """
+        self.check()
+        async with self.__limit("fs", self._fs_workers):
+            self.check()
+            return await self.__offload(func, *args, **kwargs)
+
+    async def map(self, func: Callable[[Any], Awaitable[T]], items: Iterable[Any]) -> List[T]:
+        """
+        并发处理，结果按输入顺序返回，任一项出错时取消其余项
+        """
+        tasks = [asyncio.ensure_future(func(item)) for item in items]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
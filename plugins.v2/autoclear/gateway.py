@@ -0,0 +1,145 @@
+import random
+import socket
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import Timeout as RequestsTimeout
+
+from app.log import logger
+
+from .metrics import incr
+
+# 按异常类名识别各客户端库的连接及超时错误
+_TRANSIENT_NAMES = ("Timeout", "ConnectError", "ConnectionError", "5XX", "InternalServerError")
+
+
+def is_transient(e: Exception) -> bool:
+    """
+    是否为可重试的临时错误：连接失败、超时、429及5xx
+    """
+    if isinstance(e, (ConnectionError, TimeoutError, socket.timeout,
+                      RequestsConnectionError, RequestsTimeout)):
+        return True
+    response = getattr(e, "response", None)
+    status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    if isinstance(status, int) and (status == 429 or status >= 500):
+        return True
+    return any(name in type(e).__name__ for name in _TRANSIENT_NAMES)
+
+
+def configure_session(session: Any, pool_size: int):
+    """
+    为requests会话挂载保持连接的连接池，重试由网关处理
+    """
+    if not hasattr(session, "mount") or getattr(session, "_autoclear_pool", 0) >= pool_size:
+        return
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session._autoclear_pool = pool_size
+
+
+class ServiceGateway:
+    """
+    单个服务的调用入口：并发限制，幂等调用按指数退避加抖动重试
+    """
+
+    def __init__(self, name: str, concurrency: int = 2, attempts: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 8.0,
+                 cancel_event: Optional[threading.Event] = None,
+                 on_failure: Optional[Callable[[], None]] = None):
+        """
+        :param concurrency: 同时进行的请求数
+        :param attempts: 幂等调用的最多尝试次数
+        :param backoff: 首次重试前等待秒数，之后每次翻倍
+        :param max_backoff: 最长等待秒数
+        :param cancel_event: 设置后不再重试
+        :param on_failure: 临时错误重试后仍失败时调用，用于重连服务
+        """
+        self.name = name
+        self.concurrency = max(concurrency, 1)
+        self._semaphore = threading.BoundedSemaphore(self.concurrency)
+        self._attempts = max(attempts, 1)
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._cancel_event = cancel_event
+        self._on_failure = on_failure
+
+    def call(self, func: Callable, *args, idempotent: bool = True,
+             false_is_error: bool = False, **kwargs) -> Any:
+        """
+        调用服务，非幂等调用失败时不重试
+        :param false_is_error: 返回False时视为失败，MoviePilot模块方法出错时只记录日志并返回False
+        """
+        attempts = self._attempts if idempotent else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                with self._semaphore:
+                    result = func(*args, **kwargs)
+                if not false_is_error or result is not False or attempt >= attempts:
+                    return result
+                error = None
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                if attempt >= attempts:
+                    self.__failed()
+                    raise
+                error = e
+            # 完全抖动：在[0, 退避上限]内随机等待，避免多个请求同时重试
+            delay = random.uniform(
+                0, min(self._max_backoff, self._backoff * 2 ** (attempt - 1))
+            )
+            incr(f"retries.{self.name}")
+            logger.warning(
+                f"{self.name} 调用 {getattr(func, '__name__', func)} 失败：{error or '返回失败'}，"
+                f"{delay:.1f}秒后第{attempt}次重试"
+            )
+            if self._cancel_event is None:
+                time.sleep(delay)
+            elif self._cancel_event.wait(delay):
+                if error:
+                    raise error
+                return False
+
+    def __failed(self):
+        if self._on_failure:
+            try:
+                self._on_failure()
+            except Exception as e:
+                logger.error(f"{self.name} 失败处理出错：{str(e)}")
+
+    def wrap(self, client: Any) -> Any:
+        """
+        包装客户端，方法调用均视为幂等的查询经由网关
+        """
+        if client is None or isinstance(client, GatewayProxy):
+            return client
+        return GatewayProxy(client, self)
+
+
+class GatewayProxy:
+    """
+    客户端代理，方法调用经由网关，其它属性直接返回
+    """
+
+    def __init__(self, client: Any, gateway: ServiceGateway):
+        self._client = client
+        self._gateway = gateway
+
+    def __getattr__(self, name: str) -> Any:
+        value = getattr(self._client, name)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            return self._gateway.call(value, *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+    def __bool__(self) -> bool:
+        return bool(self._client)
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+
+# 查询已看条目时只返回的字段，UserData随EnableUserData返回
+ITEM_FIELDS = "Path"
+
+
+def to_timestamp(value: Optional[str]) -> int:
+    """
+    Jellyfin/Emby时间（ISO 8601，UTC，小数位数不定）转换为时间戳
+    """
+    if not value:
+        return 0
+    try:
+        return int(datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+                   .replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return 0
+
+
+class JellyfinClient:
+    """
+    Jellyfin/Emby Items接口，按StartIndex/Limit分页查询，每页一次请求
+    """
+
+    def __init__(self, instance: Any, emby: bool = False, page_size: int = 200,
+                 timeout: int = 30):
+        """
+        :param instance: MoviePilot Jellyfin/Emby模块实例，使用其服务器地址、API Key及管理员用户
+        :param emby: Emby接口地址带emby前缀
+        """
+        host = getattr(instance, "_host", None) or ""
+        if host and not host.endswith("/"):
+            host += "/"
+        self._base = f"{host}emby/" if emby else host
+        self._apikey = getattr(instance, "_apikey", None)
+        self._user = getattr(instance, "user", None)
+        self._page_size = max(page_size, 1)
+        self._timeout = timeout
+        self._session = requests.Session()
+
+    def __bool__(self) -> bool:
+        return bool(self._base and self._apikey and self._user)
+
+    def fetch(self, params: Dict[str, Any]) -> dict:
+        """
+        查询一页条目
+        """
+        response = self._session.get(
+            f"{self._base}Users/{self._user}/Items",
+            params={"api_key": self._apikey, **params},
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json() or {}
+
+    def items(self, call, item_types: str, played: Optional[bool] = True,
+              fields: str = ITEM_FIELDS) -> Iterator[dict]:
+        """
+        分页遍历条目，返回不足一页时结束
+        :param call: 执行单次请求，用于经由服务网关重试
+        :param item_types: 条目类型，如 Movie、Episode、Series、Season
+        :param played: 按观看状态在服务端过滤，None为不过滤
+        """
+        params = {
+            "Recursive": "true",
+            "IncludeItemTypes": item_types,
+            "Fields": fields,
+            "EnableImages": "false",
+            "EnableUserData": "true",
+            "EnableTotalRecordCount": "false",
+            "Limit": self._page_size,
+        }
+        if played is not None:
+            params["IsPlayed"] = "true" if played else "false"
+        start = 0
+        while True:
+            page = call(self.fetch, {**params, "StartIndex": start}).get("Items") or []
+            yield from page
+            if len(page) < self._page_size:
+                return
+            start += len(page)
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Any, Optional
+
+
+def to_timestamp(value: Any) -> int:
+    """
+    媒体服务器时间转换为时间戳
+    """
+    if not value:
+        return 0
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+class MediaItem:
+    """
+    媒体服务器中已看的媒体文件
+    """
+    __slots__ = (
+        "server",
+        "rating_key",
+        "title",
+        "type",
+        "path",
+        "size",
+        "last_viewed_at",
+    )
+
+    def __init__(self, server: str, rating_key: str, title: str, type: str,
+                 path: str, size: int = 0, last_viewed_at: Optional[int] = 0):
+        self.server = server
+        self.rating_key = rating_key
+        self.title = title
+        self.type = type
+        self.path = path
+        self.size = size
+        self.last_viewed_at = last_viewed_at or 0
+
+    def __repr__(self):
+        return f"MediaItem({self.server}:{self.rating_key} {self.path})"
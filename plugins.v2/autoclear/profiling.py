@@ -0,0 +1,119 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List, Optional
+
+from app.log import logger
+
+# 性能分析文件扩展名
+PROFILE_SUFFIXES = (".prof", ".txt")
+
+
+class RunProfiler:
+    """
+    单次运行的性能分析：cProfile耗时统计及tracemalloc内存分配统计
+    """
+
+    def __init__(self, profile_dir: Path, name: str, top: int = 30, keep: int = 10):
+        """
+        :param profile_dir: 分析结果保存目录
+        :param name: 运行名称，作为文件名前缀
+        :param top: 报告中保留的函数及分配位置数量
+        :param keep: 保留最近几次的分析结果
+        """
+        self._profile_dir = profile_dir
+        self._name = name
+        self._top = top
+        self._keep = keep
+        self._profiler: Optional[cProfile.Profile] = None
+        self._own_tracing = False
+
+    def __enter__(self):
+        self._own_tracing = not tracemalloc.is_tracing()
+        if self._own_tracing:
+            tracemalloc.start()
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._own_tracing:
+            tracemalloc.stop()
+        try:
+            self.__save(snapshot, current, peak)
+        except Exception as e:
+            logger.error(f"保存性能分析结果失败：{str(e)}")
+        return False
+
+    def __save(self, snapshot: tracemalloc.Snapshot, current: int, peak: int):
+        self._profile_dir.mkdir(parents=True, exist_ok=True)
+        prefix = f"{self._name}-{time.strftime('%Y%m%d-%H%M%S')}"
+        stats_file = self._profile_dir / f"{prefix}.prof"
+        self._profiler.dump_stats(str(stats_file))
+
+        report = io.StringIO()
+        report.write(f"# {self._name} 内存：当前 {current} 字节，峰值 {peak} 字节\n\n")
+        report.write(f"# 内存分配位置 Top {self._top}\n")
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        for stat in snapshot.statistics("lineno")[:self._top]:
+            report.write(f"{stat}\n")
+        report.write(f"\n# 累计耗时 Top {self._top}\n")
+        stats = pstats.Stats(self._profiler, stream=report)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self._top)
+        (self._profile_dir / f"{prefix}.txt").write_text(report.getvalue(), encoding="utf-8")
+        logger.info(f"性能分析结果已保存：{stats_file}")
+        prune_profiles(self._profile_dir, self._keep)
+
+
+def list_profiles(profile_dir: Path) -> List[dict]:
+    """
+    列出已保存的分析结果，最新的在前
+    """
+    if not profile_dir.exists():
+        return []
+    files = [
+        path for path in profile_dir.iterdir()
+        if path.is_file() and path.suffix in PROFILE_SUFFIXES
+    ]
+    files.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+    return [
+        {
+            "name": path.name,
+            "size": path.stat().st_size,
+            "modified": int(path.stat().st_mtime),
+        }
+        for path in files
+    ]
+
+
+def get_profile(profile_dir: Path, name: str) -> Optional[Path]:
+    """
+    按文件名获取分析结果，仅允许访问分析目录下的文件
+    """
+    if not name or Path(name).name != name or not name.endswith(PROFILE_SUFFIXES):
+        return None
+    path = profile_dir / name
+    return path if path.is_file() else None
+
+
+def prune_profiles(profile_dir: Path, keep: int):
+    """
+    仅保留最近几次的分析结果
+    """
+    prefixes = []
+    for item in list_profiles(profile_dir):
+        prefix = Path(item["name"]).stem
+        if prefix not in prefixes:
+            prefixes.append(prefix)
+    for prefix in prefixes[keep:]:
+        for suffix in PROFILE_SUFFIXES:
+            (profile_dir / f"{prefix}{suffix}").unlink(missing_ok=True)
@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+from .torrent import TorrentAdapter, TorrentRecord
+
+# 影响清理结果的种子字段，包括删种规则检查的状态、Tracker及添加、完成时间，速度等频繁变化的字段不计入结构版本
+STRUCTURAL_FIELDS = {
+    "name", "size", "tags", "category", "save_path", "content_path",
+    "state", "tracker", "added_on", "completion_on",
+}
+# 镜像保存的种子字段，即转换为种子记录时读取的字段，速度、剩余时间等其它字段丢弃
+MIRROR_FIELDS = STRUCTURAL_FIELDS | {"hash", "ratio", "uploaded"}
+# 仅非结构字段（分享率、上传量）变化时，两次持久化的最短间隔，单位：秒
+SAVE_INTERVAL = 600
+
+
+class QbTorrentMirror:
+    """
+    qBittorrent种子表本地镜像，通过sync/maindata?rid=增量同步
+    """
+
+    def __init__(self, downloader: str, state_file: Optional[Path] = None):
+        self.downloader = downloader
+        self._state_file = state_file
+        self._lock = threading.Lock()
+        self._rid = 0
+        # 结构版本，种子增删或关键字段变化时递增
+        self._version = 0
+        # 种子原始数据 hash -> 字段
+        self._torrents: Dict[str, dict] = {}
+        # 已转换的种子记录 hash -> TorrentRecord
+        self._records: Dict[str, TorrentRecord] = {}
+        # 最近同步时间
+        self._synced_at = 0.0
+        self._saved_at = 0.0
+        self._stale = True
+        self.__load()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def is_fresh(self, max_age: float) -> bool:
+        """
+        镜像未过期且距上次同步小于max_age秒，读取时无需请求qBittorrent
+        """
+        return not self._stale and time.time() - self._synced_at < max_age
+
+    def invalidate(self):
+        """
+        标记镜像过期，下次读取前必须同步（如本插件修改了种子标签、删除了种子）
+        """
+        self._stale = True
+
+    def sync(self, qbc: Any, max_age: float = 0) -> bool:
+        """
+        向qBittorrent拉取自上次rid以来的增量数据并合并
+        :param qbc: qbittorrentapi客户端
+        :param max_age: 镜像未过期且距上次同步小于该秒数时不再请求
+        """
+        if not qbc:
+            return False
+        with self._lock:
+            if max_age and self.is_fresh(max_age):
+                return True
+            try:
+                maindata = qbc.sync_maindata(rid=self._rid)
+            except Exception as e:
+                logger.error(f"下载器 {self.downloader} 增量同步失败：{str(e)}")
+                return False
+            changed, structural = self.__merge(maindata)
+            self._synced_at = time.time()
+            self._stale = False
+        # 每次同步都可能有分享率等字段变化，仅在结构变化时立即保存，其余按间隔保存
+        if structural or (changed and time.time() - self._saved_at >= SAVE_INTERVAL):
+            self.__save()
+        return True
+
+    def records(self, adapter: TorrentAdapter) -> List[TorrentRecord]:
+        """
+        返回镜像中的种子记录，仅转换发生变化的种子
+        """
+        with self._lock:
+            for torrent_hash, torrent in self._torrents.items():
+                if torrent_hash not in self._records:
+                    record = adapter.convert(torrent)
+                    if record:
+                        self._records[torrent_hash] = record
+            return list(self._records.values())
+
+    def __merge(self, maindata: Any) -> Tuple[bool, bool]:
+        """
+        合并增量数据，返回是否发生变化及是否为结构变化
+        """
+        if maindata.get("full_update"):
+            logger.info(f"下载器 {self.downloader} 全量同步种子列表")
+            self._torrents = {}
+            self._records = {}
+        changed = structural = bool(maindata.get("full_update"))
+        for torrent_hash, delta in (maindata.get("torrents") or {}).items():
+            delta = {key: value for key, value in delta.items() if key in MIRROR_FIELDS}
+            torrent = self._torrents.get(torrent_hash)
+            if torrent is None:
+                torrent = self._torrents[torrent_hash] = {"hash": torrent_hash}
+                structural = True
+            elif not delta:
+                continue
+            elif not STRUCTURAL_FIELDS.isdisjoint(delta):
+                structural = True
+            torrent.update(delta)
+            self._records.pop(torrent_hash, None)
+            changed = True
+        for torrent_hash in maindata.get("torrents_removed") or []:
+            self._torrents.pop(torrent_hash, None)
+            self._records.pop(torrent_hash, None)
+            changed = structural = True
+        if structural:
+            self._version += 1
+        self._rid = maindata.get("rid") or 0
+        return changed, structural
+
+    def __load(self):
+        """
+        从插件数据目录恢复镜像
+        """
+        if not self._state_file or not self._state_file.exists():
+            return
+        try:
+            state = json.loads(self._state_file.read_text(encoding="utf-8"))
+            self._rid = state.get("rid") or 0
+            self._version = state.get("version") or 0
+            # 旧版本保存的全部字段只保留需要的字段
+            self._torrents = {
+                torrent_hash: {key: value for key, value in torrent.items() if key in MIRROR_FIELDS}
+                for torrent_hash, torrent in (state.get("torrents") or {}).items()
+            }
+        except Exception as e:
+            logger.warning(f"下载器 {self.downloader} 种子镜像恢复失败：{str(e)}")
+            self._rid = 0
+            self._version = 0
+            self._torrents = {}
+
+    def __save(self):
+        """
+        持久化rid及种子表
+        """
+        if not self._state_file:
+            return
+        with self._lock:
+            state = json.dumps({"rid": self._rid, "version": self._version,
+                                "torrents": self._torrents},
+                               ensure_ascii=False, separators=(",", ":"))
+            self._saved_at = time.time()
+        try:
+            tmp_file = self._state_file.with_suffix(".tmp")
+            tmp_file.write_text(state, encoding="utf-8")
+            tmp_file.replace(self._state_file)
+        except Exception as e:
+            logger.warning(f"下载器 {self.downloader} 种子镜像保存失败：{str(e)}")
@@ -0,0 +1,108 @@
+import re
+import time
+from typing import Any, Dict, Optional
+
+from .query import split_values
+from .torrent import TorrentRecord
+
+GB = 1024 * 1024 * 1024
+
+# 规则配置项，与插件配置同名
+RULE_KEYS = (
+    "size",
+    "ratio",
+    "time",
+    "upspeed",
+    "pathkeywords",
+    "trackerkeywords",
+    "errorkeywords",
+    "torrentstates",
+    "torrentcategorys",
+)
+
+
+class TorrentRules:
+    """
+    种子筛选规则，数值及正则表达式在创建时解析，配置有误时抛出ValueError
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        :param config: 规则配置，键见RULE_KEYS，空值表示不限制
+        """
+        sizes = str(config.get("size") or "").split("-") if config.get("size") else []
+        # 大小 单位：GB
+        self.has_size = bool(sizes)
+        self.min_size = int(float(sizes[0]) * GB) if sizes else 0
+        self.max_size = int(float(sizes[-1]) * GB) if sizes else 0
+        # 分享率
+        self.ratio = self.__float(config.get("ratio"))
+        # 做种时间 单位：小时
+        self.seeding_hours = self.__float(config.get("time"))
+        # 平均上传速度 单位：KB/s
+        self.upspeed = self.__float(config.get("upspeed"))
+        self.path_pattern = self.__compile(config.get("pathkeywords"))
+        self.tracker_pattern = self.__compile(config.get("trackerkeywords"))
+        self.error_pattern = self.__compile(config.get("errorkeywords"))
+        # 状态及分类与下载器端查询（TorrentQuery）相同，按逗号或换行拆分后精确匹配
+        self.states = split_values(config.get("torrentstates"))
+        self.categories = split_values(config.get("torrentcategorys"))
+
+    @property
+    def is_dynamic(self) -> bool:
+        """
+        是否包含随时间及上传变化的规则（分享率、做种时间、上传速度），下载器变化标识无法反映
+        """
+        return self.ratio is not None or self.seeding_hours is not None or self.upspeed is not None
+
+    @staticmethod
+    def __float(value: Any) -> Optional[float]:
+        if not value:
+            return None
+        return float(value)
+
+    @staticmethod
+    def __compile(pattern: Optional[str]):
+        if not pattern:
+            return None
+        try:
+            return re.compile(pattern, re.I)
+        except re.error as e:
+            raise ValueError(f"正则表达式 {pattern} 有误：{str(e)}")
+
+    def match(self, torrent: TorrentRecord, now: Optional[int] = None) -> bool:
+        """
+        检查种子是否符合全部规则
+        """
+        # 做种时间
+        seeding_time = torrent.seeding_time(now or int(time.time()))
+        if self.ratio is not None and torrent.ratio <= self.ratio:
+            return False
+        if self.seeding_hours is not None and seeding_time <= self.seeding_hours * 3600:
+            return False
+        if self.has_size and (
+            torrent.size >= self.max_size or torrent.size <= self.min_size
+        ):
+            return False
+        # 平均上传速度
+        upload_avs = torrent.uploaded / seeding_time if seeding_time else 0
+        if self.upspeed is not None and upload_avs >= self.upspeed * 1024:
+            return False
+        if self.path_pattern and not self.path_pattern.search(torrent.save_path):
+            return False
+        if self.tracker_pattern and not any(
+            self.tracker_pattern.search(tracker) for tracker in torrent.trackers
+        ):
+            return False
+        if self.states and torrent.state not in self.states:
+            return False
+        if self.categories and torrent.category not in self.categories:
+            return False
+        # 错误信息，仅Transmission提供
+        if (
+            self.error_pattern
+            and torrent.error is not None
+            and not self.error_pattern.search(torrent.error)
+        ):
+            return False
+        return True
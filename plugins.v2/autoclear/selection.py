@@ -0,0 +1,174 @@
+import heapq
+import os
+import shutil
+from typing import Dict, Iterable, List, Optional
+
+from .media import MediaItem
+
+GB = 1024 * 1024 * 1024
+
+
+class ClearQueue:
+    """
+    待清理媒体优先队列：默认最早观看的优先，每次运行按条目数及字节数限额取出
+    """
+
+    def __init__(self, items: Iterable[MediaItem], order: str = "viewed",
+                 max_items: int = 0, max_bytes: int = 0):
+        """
+        :param order: viewed 按最近观看时间从早到晚，size 按文件大小从大到小，观看时间未知的排在最后
+        :param max_items: 本次运行最多取出的条目数，0为不限
+        :param max_bytes: 本次运行最多取出的字节数，0为不限，第一个条目不受限制
+        """
+        self._heap = []
+        for i, item in enumerate(items):
+            if order == "size":
+                key = -self.__size(item)
+            else:
+                key = item.last_viewed_at or float("inf")
+            self._heap.append((key, i, item))
+        heapq.heapify(self._heap)
+        self._max_items = max_items
+        self._max_bytes = max_bytes
+        self.taken = 0
+        self.taken_bytes = 0
+        self._bytes_full = False
+
+    def __len__(self):
+        return len(self._heap)
+
+    @staticmethod
+    def __size(item: MediaItem) -> int:
+        if item.size:
+            return item.size
+        try:
+            return os.stat(item.path).st_size
+        except OSError:
+            return 0
+
+    @property
+    def capped(self) -> bool:
+        """
+        是否已达到本次运行的限额
+        """
+        return bool(self._heap) and (
+            bool(self._max_items and self.taken >= self._max_items)
+            or self._bytes_full
+        )
+
+    def take(self, count: int = 0) -> List[MediaItem]:
+        """
+        按优先级取出条目，不超过count（0为不限）及本次运行限额
+        """
+        items = []
+        while self._heap and (not count or len(items) < count):
+            if self.capped:
+                break
+            size = self.__size(self._heap[0][2])
+            if self._max_bytes and self.taken and self.taken_bytes + size > self._max_bytes:
+                # 超出字节限额，不跳过去取更小的条目，保持优先顺序
+                self._bytes_full = True
+                break
+            items.append(heapq.heappop(self._heap)[2])
+            self.taken += 1
+            self.taken_bytes += size
+        return items
+
+
+class ClearCandidate:
+    """
+    待清理的媒体文件及其可回收空间
+    """
+    __slots__ = ("item", "source_file", "reclaim")
+
+    def __init__(self, item: MediaItem, source_file: Optional[str],
+                 reclaim: Dict[int, int]):
+        self.item = item
+        self.source_file = source_file
+        # 设备号 -> 可回收字节数
+        self.reclaim = reclaim
+
+    @property
+    def reclaim_bytes(self) -> int:
+        return sum(self.reclaim.values())
+
+
+def reclaimable_bytes(media_path: str, source_file: Optional[str],
+                      delete_source: bool) -> Dict[int, int]:
+    """
+    计算删除媒体文件（及源文件）后实际可回收的空间，按设备号统计
+    文件仍有其它硬链接时不会释放空间
+    :param delete_source: 是否同时删除下载目录中的源文件
+    """
+    reclaim: Dict[int, int] = {}
+    paths = [media_path]
+    if delete_source and source_file:
+        paths.append(source_file)
+    # inode -> (大小, 硬链接数, 本次删除的链接数)
+    inodes: Dict[tuple, list] = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        key = (stat.st_dev, stat.st_ino)
+        if key in inodes:
+            inodes[key][2] += 1
+        else:
+            inodes[key] = [stat.st_size, stat.st_nlink, 1]
+    for (dev, _), (size, nlink, removed) in inodes.items():
+        if nlink <= removed:
+            reclaim[dev] = reclaim.get(dev, 0) + size
+    return reclaim
+
+
+def disk_deficits(paths: Iterable[str], low_water: float,
+                  high_water: float) -> Dict[int, int]:
+    """
+    检查路径所在文件系统的剩余空间
+    :param low_water: 剩余空间低于该值（GB）时触发清理
+    :param high_water: 清理至剩余空间达到该值（GB）为止
+    :return: 设备号 -> 需回收字节数，仅包含低于低水位的文件系统
+    """
+    deficits: Dict[int, int] = {}
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        dev = os.stat(path).st_dev
+        if dev in deficits:
+            continue
+        free = shutil.disk_usage(path).free
+        if free < low_water * GB:
+            deficits[dev] = int(high_water * GB) - free
+    return deficits
+
+
+def select_by_reclaim(candidates: Iterable[ClearCandidate],
+                      deficits: Dict[int, int]) -> List[ClearCandidate]:
+    """
+    按可回收空间从大到小选择待清理项，所有文件系统达到高水位即停止
+    """
+    deficits = {dev: need for dev, need in deficits.items() if need > 0}
+    heap = []
+    for i, candidate in enumerate(candidates):
+        gain = sum(size for dev, size in candidate.reclaim.items() if dev in deficits)
+        if gain > 0:
+            heap.append((-gain, i, candidate))
+    heapq.heapify(heap)
+    selected = []
+    while heap and deficits:
+        _, i, candidate = heapq.heappop(heap)
+        # 其它文件系统可能已满足，重新计算当前收益
+        gain = sum(size for dev, size in candidate.reclaim.items() if dev in deficits)
+        if gain <= 0:
+            continue
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, i, candidate))
+            continue
+        selected.append(candidate)
+        for dev, size in candidate.reclaim.items():
+            if dev in deficits:
+                deficits[dev] -= size
+                if deficits[dev] <= 0:
+                    deficits.pop(dev)
+    return selected
@@ -0,0 +1,76 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+# 转换为种子记录所需字段
+RECORD_FIELDS = [
+    "id",
+    "hashString",
+    "name",
+    "totalSize",
+    "downloadDir",
+    "uploadRatio",
+    "uploadedEver",
+    "addedDate",
+    "doneDate",
+    "labels",
+    "status",
+    "trackers",
+    "errorString",
+]
+
+# 文件列表所需字段，仅在解析文件路径时按需获取
+FILE_FIELDS = [
+    "id",
+    "hashString",
+    "downloadDir",
+    "files",
+]
+
+
+def get_torrents(trc: Any, fields: List[str], ids: Optional[list] = None,
+                 tags: Optional[List[str]] = None) -> Tuple[List[Any], bool]:
+    """
+    按字段查询Transmission种子，避免拉取peers、pieces等无关数据
+    :param trc: transmission_rpc客户端
+    :param fields: 需要返回的字段
+    :param ids: 种子ID或hash
+    :param tags: 需同时包含的标签
+    :return: 种子列表、是否发生错误
+    """
+    if not trc:
+        return [], True
+    try:
+        torrents = trc.get_torrents(ids=ids, arguments=fields)
+    except Exception as e:
+        logger.error(f"获取Transmission种子列表出错：{str(e)}")
+        return [], True
+    if tags:
+        tags = {str(tag).strip() for tag in tags if str(tag).strip()}
+        torrents = [
+            torrent for torrent in torrents
+            if tags.issubset(set(torrent.fields.get("labels") or []))
+        ]
+    return torrents, False
+
+
+def get_torrent_files(trc: Any, ids: List[str]) -> Optional[Dict[str, List[Tuple[str, int]]]]:
+    """
+    批量查询Transmission种子文件
+    :return: hash -> [(文件路径, 大小)]，出错时返回None
+    """
+    if not ids:
+        return {}
+    torrents, error_flag = get_torrents(trc, fields=FILE_FIELDS, ids=ids)
+    if error_flag:
+        return None
+    torrent_files = {}
+    for torrent in torrents:
+        fields = torrent.fields
+        download_dir = fields.get("downloadDir") or ""
+        torrent_files[fields.get("hashString")] = [
+            (os.path.join(download_dir, file.get("name")), file.get("length") or 0)
+            for file in fields.get("files") or []
+        ]
+    return torrent_files
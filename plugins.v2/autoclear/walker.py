@@ -0,0 +1,144 @@
+import fnmatch
+import os
+import random
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from app.log import logger
+
+# (根目录, 文件路径, 文件信息)
+WalkEntry = Tuple[str, str, os.stat_result]
+
+
+def outer_roots(roots: Iterable[str]) -> List[str]:
+    """
+    规范化根目录并去重，去掉位于其它根目录之下的目录，避免重复遍历
+    """
+    result: List[str] = []
+    normalized = {os.path.normpath(root) for root in roots if root}
+    for root in sorted(normalized, key=lambda path: path.split(os.sep)):
+        # 按路径层级排序后，子目录紧随其上层目录
+        if result and (root == result[-1]
+                       or root.startswith(result[-1].rstrip(os.sep) + os.sep)):
+            continue
+        result.append(root)
+    return result
+
+
+class ParallelWalker:
+    """
+    多线程目录遍历，每个线程有自己的目录队列，空闲时从其它线程的队列窃取
+    网络文件系统上每次stat都是一次往返，遍历耗时取决于延迟而非CPU，可随线程数提升
+    """
+
+    def __init__(self, workers: int = 8, exclude: Optional[Iterable[str]] = None):
+        """
+        :param workers: 线程数
+        :param exclude: 排除的路径通配符，匹配完整路径或文件（目录）名
+        """
+        self._workers = max(workers, 1)
+        self._exclude = [pattern for pattern in (exclude or []) if pattern]
+        self._queues: List[Deque[Tuple[str, str]]] = []
+        self._pending = 0
+        self._cond = threading.Condition()
+
+    def excluded(self, path: str, name: str) -> bool:
+        return any(
+            fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(path, pattern)
+            for pattern in self._exclude
+        )
+
+    def walk(self, roots: Iterable[str]) -> List[WalkEntry]:
+        """
+        遍历目录，返回所有文件，不跟随符号链接
+        """
+        roots = outer_roots(root for root in roots if os.path.isdir(root))
+        if not roots:
+            return []
+        self._queues = [deque() for _ in range(self._workers)]
+        self._pending = len(roots)
+        for i, root in enumerate(roots):
+            self._queues[i % self._workers].append((root, root))
+        results: List[List[WalkEntry]] = [[] for _ in range(self._workers)]
+        threads = [
+            threading.Thread(target=self.__work, args=(i, results[i]),
+                             name=f"autoclear-walk-{i}", daemon=True)
+            for i in range(self._workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [entry for entries in results for entry in entries]
+
+    def walk_by_root(self, roots: Iterable[str]) -> Dict[str, List[Tuple[str, os.stat_result]]]:
+        """
+        遍历目录，按根目录分组返回文件，嵌套的根目录从上层目录的结果中筛选
+        """
+        roots = {os.path.normpath(root) for root in roots if root}
+        listing: Dict[str, List[Tuple[str, os.stat_result]]] = {}
+        for root, path, stat in self.walk(roots):
+            listing.setdefault(root, []).append((path, stat))
+        for root in roots.difference(listing):
+            outer = next((parent for parent in listing
+                          if root.startswith(parent.rstrip(os.sep) + os.sep)), None)
+            if outer is not None:
+                prefix = root.rstrip(os.sep) + os.sep
+                listing[root] = [(path, stat) for path, stat in listing[outer]
+                                 if path.startswith(prefix)]
+        return listing
+
+    def __take(self, i: int) -> Optional[Tuple[str, str]]:
+        # 优先处理自己最近加入的目录（深度优先，局部性好），否则从其它队列头部窃取
+        try:
+            return self._queues[i].pop()
+        except IndexError:
+            pass
+        others = list(range(len(self._queues)))
+        random.shuffle(others)
+        for j in others:
+            if j == i:
+                continue
+            try:
+                return self._queues[j].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def __work(self, i: int, results: List[WalkEntry]):
+        while True:
+            item = self.__take(i)
+            if item is None:
+                with self._cond:
+                    if self._pending == 0:
+                        self._cond.notify_all()
+                        return
+                    self._cond.wait(0.05)
+                continue
+            root, directory = item
+            subdirs = 0
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if self._exclude and self.excluded(entry.path, entry.name):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                # 先计入待处理数再加入队列，其它线程窃取后完成时计数不会先减到0
+                                with self._cond:
+                                    self._pending += 1
+                                self._queues[i].append((root, entry.path))
+                                subdirs += 1
+                            elif entry.is_file(follow_symlinks=False):
+                                # DirEntry缓存stat结果，之后不再访问文件系统
+                                results.append((root, entry.path, entry.stat(follow_symlinks=False)))
+                        except OSError:
+                            # 如果文件在遍历过程中被删除或无法访问，忽略它
+                            continue
+            except OSError as e:
+                logger.debug(f"目录 {directory} 遍历失败：{str(e)}")
+            with self._cond:
+                self._pending -= 1
+                if subdirs or self._pending == 0:
+                    self._cond.notify_all()
@@ -0,0 +1,55 @@
+import hashlib
+import os
+from typing import Any, Dict, Iterable, Optional
+
+from app.log import logger
+
+from .qbsync import QbTorrentMirror
+
+# Transmission变化标识查询的字段
+TOKEN_FIELDS = ["id", "hashString", "labels", "status", "errorString"]
+
+
+def qb_token(mirror: QbTorrentMirror, qbc: Any) -> Optional[int]:
+    """
+    qBittorrent变化标识：镜像结构版本，仅种子增删及删种规则检查的字段变化时递增
+    """
+    if not mirror.sync(qbc):
+        return None
+    return mirror.version
+
+
+def tr_token(trc: Any) -> Optional[str]:
+    """
+    Transmission变化标识：种子数量及标签、状态、错误信息摘要，仅查询这几个字段
+    活动时间随上传不断变化，不计入
+    """
+    if not trc:
+        return None
+    try:
+        torrents = trc.get_torrents(arguments=TOKEN_FIELDS)
+    except Exception as e:
+        logger.warning(f"获取Transmission变化标识失败：{str(e)}")
+        return None
+    digest = hashlib.sha1()
+    for fields in sorted(
+        (torrent.fields for torrent in torrents), key=lambda f: f.get("hashString") or ""
+    ):
+        digest.update(
+            f"{fields.get('hashString')}|{','.join(fields.get('labels') or [])}"
+            f"|{fields.get('status')}|{fields.get('errorString') or ''}\n".encode()
+        )
+    return f"{len(torrents)}:{digest.hexdigest()}"
+
+
+def path_token(paths: Iterable[str]) -> Dict[str, int]:
+    """
+    目录变化标识：目录修改时间
+    """
+    tokens = {}
+    for path in paths:
+        try:
+            tokens[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            tokens[path] = 0
+    return tokens
@@ -0,0 +1,219 @@
+import hashlib
+import mmap
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.log import logger
+
+from .walker import ParallelWalker
+
+# 部分内容指纹每段读取大小
+CHUNK_SIZE = 1024 * 1024
+# 全量哈希读取块大小
+READ_SIZE = 8 * 1024 * 1024
+
+
+def partial_hash(path: str, size: int) -> str:
+    """
+    计算文件头、中、尾三段内容的指纹，小文件直接计算全部内容
+    """
+    digest = hashlib.sha1(str(size).encode())
+    if size <= 0:
+        return digest.hexdigest()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if size <= CHUNK_SIZE * 3:
+            digest.update(mm[:])
+        else:
+            middle = (size - CHUNK_SIZE) // 2
+            for offset in (0, middle, size - CHUNK_SIZE):
+                digest.update(mm[offset:offset + CHUNK_SIZE])
+    return digest.hexdigest()
+
+
+def full_hash(path: str) -> str:
+    """
+    计算文件完整内容哈希，在进程池中执行
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cached_partial_hash(cache: Any, path: str, size: int, mtime: int) -> Optional[str]:
+    """
+    读取或计算文件的部分内容指纹，文件无法读取时返回None
+    """
+    fingerprint = cache.get_fingerprint(path, size, mtime)
+    if fingerprint:
+        return fingerprint
+    try:
+        fingerprint = partial_hash(path, size)
+    except (OSError, ValueError) as e:
+        logger.debug(f"文件 {path} 指纹计算失败：{str(e)}")
+        return None
+    cache.put_fingerprint(path, size, mtime, partial=fingerprint)
+    return fingerprint
+
+
+class HashPool:
+    """
+    计算完整哈希的进程池，插件运行期间复用
+    MoviePilot进程中有多个线程，子进程使用spawn启动，避免fork继承其它线程持有的锁
+    """
+
+    def __init__(self, workers: int):
+        self._workers = max(workers, 1)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def map(self, paths: List[str]) -> List[str]:
+        """
+        计算多个文件的完整哈希，进程池损坏时在当前进程计算，下次使用时重新创建进程池
+        """
+        try:
+            return list(self.__get_executor().map(full_hash, paths))
+        except BrokenProcessPool as e:
+            logger.warning(f"完整哈希进程池异常，改为在当前进程计算：{str(e)}")
+            self.shutdown()
+            return [full_hash(path) for path in paths]
+
+    def __get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class FingerprintCache:
+    """
+    内存文件指纹缓存，以(路径, 大小, 修改时间)为键，状态库不可用时使用
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 路径 -> [大小, 修改时间, 部分指纹, 完整哈希]
+        self._items: Dict[str, list] = {}
+
+    def get_fingerprint(self, path: str, size: int, mtime: int,
+                        full: bool = False) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(path)
+        if not item or item[0] != size or item[1] != mtime:
+            return None
+        return item[3] if full else item[2]
+
+    def put_fingerprint(self, path: str, size: int, mtime: int,
+                        partial: Optional[str] = None, full: Optional[str] = None):
+        with self._lock:
+            item = self._items.get(path)
+            if not item or item[0] != size or item[1] != mtime:
+                item = self._items[path] = [size, mtime, None, None]
+            if partial:
+                item[2] = partial
+            if full:
+                item[3] = full
+
+
+class SourceIndex:
+    """
+    下载目录文件索引，按文件大小分组，用于查找硬链接或复制的源文件
+    """
+
+    def __init__(self, cache: Any, full_hash_pool: Optional[HashPool] = None):
+        """
+        :param cache: 指纹缓存，提供get_fingerprint/put_fingerprint，通常为插件状态库
+        :param full_hash_pool: 计算完整哈希的进程池，由调用方创建及关闭，None为不校验完整哈希
+        """
+        self._cache = cache
+        self._full_hash_pool = full_hash_pool
+        # 大小 -> [(路径, 设备号, inode, 修改时间)]
+        self._by_size: Dict[int, List[Tuple[str, int, int, int]]] = {}
+
+    def add(self, path: str, stat: os.stat_result):
+        self._by_size.setdefault(stat.st_size, []).append(
+            (path, stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+        )
+
+    def build(self, roots: Iterable[str], walker: Optional[ParallelWalker] = None):
+        """
+        遍历下载目录建立索引
+        :param walker: 目录遍历器，默认单线程遍历
+        """
+        walker = walker or ParallelWalker(workers=1)
+        for _, path, stat in walker.walk(roots):
+            self.add(path, stat)
+
+    def __len__(self):
+        return sum(len(items) for items in self._by_size.values())
+
+    def find(self, file_path: str, copy_match: bool = False) -> Optional[str]:
+        """
+        查找媒体库文件对应的源文件，先匹配硬链接，再按内容指纹匹配复制的文件
+        """
+        stat = os.stat(file_path)
+        candidates = self._by_size.get(stat.st_size)
+        if not candidates:
+            return None
+        # 相同设备号及inode即为硬链接
+        for path, dev, ino, _ in candidates:
+            if dev == stat.st_dev and ino == stat.st_ino:
+                return path
+        if not copy_match or not stat.st_size:
+            return None
+        # 按部分内容指纹匹配
+        media_print = self.__partial(file_path, stat.st_size, stat.st_mtime_ns)
+        if not media_print:
+            return None
+        matched = [
+            (path, mtime)
+            for path, _, _, mtime in candidates
+            if self.__partial(path, stat.st_size, mtime) == media_print
+        ]
+        if not matched or not self._full_hash_pool:
+            return matched[0][0] if matched else None
+        # 按完整哈希确认
+        return self.__match_full(file_path, stat, matched)
+
+    def __partial(self, path: str, size: int, mtime: int) -> Optional[str]:
+        return cached_partial_hash(self._cache, path, size, mtime)
+
+    def __match_full(self, file_path: str, stat: os.stat_result,
+                     matched: List[Tuple[str, int]]) -> Optional[str]:
+        files = [(file_path, stat.st_mtime_ns)] + matched
+        hashes = {}
+        pending = []
+        for path, mtime in files:
+            fingerprint = self._cache.get_fingerprint(path, stat.st_size, mtime, full=True)
+            if fingerprint:
+                hashes[path] = fingerprint
+            else:
+                pending.append((path, mtime))
+        if pending:
+            try:
+                results = self._full_hash_pool.map([path for path, _ in pending])
+                for (path, mtime), fingerprint in zip(pending, results):
+                    hashes[path] = fingerprint
+                    self._cache.put_fingerprint(path, stat.st_size, mtime, full=fingerprint)
+            except OSError as e:
+                logger.error(f"文件完整哈希计算失败：{str(e)}")
+                return None
+        media_hash = hashes.get(file_path)
+        for path, _ in matched:
+            if hashes.get(path) == media_hash:
+                return path
+        return None
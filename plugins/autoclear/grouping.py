@@ -0,0 +1,160 @@
+import functools
+import os
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from .torrent import TorrentRecord
+
+
+class UnionFind:
+    """
+    并查集，路径压缩及按大小合并
+    """
+
+    def __init__(self, size: int):
+        self._parent = list(range(size))
+        self._size = [1] * size
+
+    def find(self, x: int) -> int:
+        root = x
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[x] != root:
+            self._parent[x], x = root, self._parent[x]
+        return root
+
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self._size[root_a] < self._size[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._size[root_a] += self._size[root_b]
+
+
+# (相对路径, 大小) 标识的最小文件大小，nfo、sample等小文件可能在无关种子间重名同大小
+MIN_FILE_KEY_SIZE = 64 * 1024 * 1024
+
+
+def is_shared_content(torrent: TorrentRecord, shared_roots: Iterable[str] = ()) -> bool:
+    """
+    内容位置是否为共用目录：qBittorrent不创建子文件夹的多文件种子content_path等于save_path，
+    或内容位置为下载根目录，此时目录下的其它文件属于其它种子
+    """
+    content_path = os.path.normpath(torrent.content_path)
+    if torrent.save_path and content_path == os.path.normpath(torrent.save_path):
+        return True
+    return content_path in shared_roots
+
+
+def torrent_file_keys(torrent: TorrentRecord,
+                      listing: Optional[Dict[str, List[Tuple[str, os.stat_result]]]] = None,
+                      shared_roots: Iterable[str] = (),
+                      min_file_size: int = MIN_FILE_KEY_SIZE) -> Iterator[Hashable]:
+    """
+    生成种子的文件标识：内容位置、(设备号, inode) 及 (相对路径, 大小)，同名同大小的种子也视为同一数据
+    :param listing: 预先遍历的内容目录 -> [(文件路径, 文件信息)]，未包含的目录在此遍历
+    :param shared_roots: 下载根目录（已规范化），内容位置为这些目录时不按目录内文件分组
+    :param min_file_size: 小于该大小的文件不生成 (相对路径, 大小) 标识
+    """
+    yield "name", torrent.name, torrent.size
+    content_path = torrent.content_path
+    if not content_path or is_shared_content(torrent, shared_roots):
+        # 共用目录无法确定属于该种子的文件，只按名称及大小分组
+        return
+    yield "path", os.path.normpath(content_path)
+    base_path = torrent.save_path or os.path.dirname(content_path)
+    listed = listing.get(os.path.normpath(content_path)) if listing else None
+    if listed is not None:
+        for path, stat in listed:
+            yield from _stat_keys(path, stat, base_path, min_file_size)
+        return
+    if os.path.isfile(content_path):
+        files = [content_path]
+    elif os.path.isdir(content_path):
+        files = (
+            os.path.join(root, name)
+            for root, _, names in os.walk(content_path)
+            for name in names
+        )
+    else:
+        return
+    for path in files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        yield from _stat_keys(path, stat, base_path, min_file_size)
+
+
+def _stat_keys(path: str, stat: os.stat_result, base_path: str,
+               min_file_size: int) -> Iterator[Hashable]:
+    yield "inode", stat.st_dev, stat.st_ino
+    if stat.st_size >= min_file_size:
+        yield "file", os.path.relpath(path, base_path), stat.st_size
+
+
+def listed_file_keys(listing: Dict[str, List[Tuple[str, os.stat_result]]],
+                     shared_roots: Iterable[str] = ()):
+    """
+    使用预先遍历结果的文件标识函数
+    """
+    return functools.partial(torrent_file_keys, listing=listing,
+                             shared_roots=frozenset(shared_roots))
+
+
+class TorrentGroups:
+    """
+    按共享文件将种子划分为连通分量，同一分量内的种子共用数据（辅种）
+    """
+
+    def __init__(self, torrents: Iterable[TorrentRecord],
+                 file_keys=torrent_file_keys):
+        self._torrents: List[TorrentRecord] = list(torrents)
+        self._index: Dict[str, int] = {}
+        self._groups: Dict[int, List[int]] = {}
+        self.__build(file_keys)
+
+    def __build(self, file_keys):
+        union_find = UnionFind(len(self._torrents))
+        # 文件标识 -> 首个出现的种子序号
+        owners: Dict[Hashable, int] = {}
+        for i, torrent in enumerate(self._torrents):
+            self._index[self.__key(torrent)] = i
+            for key in file_keys(torrent):
+                owner = owners.setdefault(key, i)
+                if owner != i:
+                    union_find.union(owner, i)
+        for i in range(len(self._torrents)):
+            self._groups.setdefault(union_find.find(i), []).append(i)
+        self._root = {i: root for root, members in self._groups.items() for i in members}
+
+    @staticmethod
+    def __key(torrent: TorrentRecord) -> str:
+        return f"{torrent.downloader}:{torrent.id}"
+
+    def __len__(self):
+        return len(self._groups)
+
+    def group_of(self, torrent: TorrentRecord) -> List[TorrentRecord]:
+        """
+        返回种子所在分组的全部种子
+        """
+        i = self._index.get(self.__key(torrent))
+        if i is None:
+            return [torrent]
+        return [self._torrents[j] for j in self._groups[self._root[i]]]
+
+    def expand(self, torrents: Iterable[TorrentRecord]) -> List[TorrentRecord]:
+        """
+        将种子扩展为其所在分组的全部种子，保持顺序并去重
+        """
+        seen = set()
+        results = []
+        for torrent in torrents:
+            for member in self.group_of(torrent):
+                key = self.__key(member)
+                if key not in seen:
+                    seen.add(key)
+                    results.append(member)
+        return results
@@ -0,0 +1,151 @@
+import contextvars
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List, Optional
+
+# 当前运行的统计，线程池及协程中通过上下文传递
+current_metrics: contextvars.ContextVar[Optional["RunMetrics"]] = contextvars.ContextVar(
+    "autoclear_metrics", default=None
+)
+
+
+class RunMetrics:
+    """
+    单次运行统计：各阶段耗时、接口调用次数、传输字节数及处理数量
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self.finished_at = 0.0
+        self.status = "running"
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._begin = time.perf_counter()
+        self.duration = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        统计阶段耗时，同一阶段多次进入时累加
+        """
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - begin
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def incr(self, key: str, value: int = 1):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def total(self, prefix: str) -> int:
+        """
+        汇总以prefix开头的计数，如 api_calls.
+        """
+        with self._lock:
+            return sum(value for key, value in self.counters.items() if key.startswith(prefix))
+
+    def finish(self, status: str):
+        self.status = status
+        self.finished_at = time.time()
+        self.duration = time.perf_counter() - self._begin
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "status": self.status,
+            "started_at": int(self.started_at),
+            "finished_at": int(self.finished_at),
+            "duration": round(self.duration, 3),
+            "stages": {key: round(value, 3) for key, value in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+
+@contextmanager
+def stage(name: str):
+    """
+    统计当前运行的阶段耗时，未在运行中时不做任何事
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.stage(name):
+        yield
+
+
+def staged(name: str):
+    """
+    统计函数耗时的装饰器
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def incr(key: str, value: int = 1):
+    """
+    累加当前运行的计数
+    """
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.incr(key, value)
+
+
+def session_hook(service: str):
+    """
+    requests响应钩子，统计本插件运行中发出的请求次数及响应字节数
+    """
+
+    def hook(response: Any, *args, **kwargs):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.incr(f"api_calls.{service}")
+            metrics.incr(f"bytes.{service}", len(response.content or b""))
+        return response
+
+    return hook
+
+
+def install_session_hook(session: Any, service: str):
+    """
+    给服务使用的requests会话安装统计钩子，重复调用不会重复安装
+    """
+    hooks = getattr(session, "hooks", None)
+    if not isinstance(hooks, dict):
+        return
+    installed = getattr(session, "_autoclear_hooked", None)
+    if installed == service:
+        return
+    hooks.setdefault("response", []).append(session_hook(service))
+    session._autoclear_hooked = service
+
+
+class MetricsHistory:
+    """
+    保留最近N次运行统计
+    """
+
+    def __init__(self, runs: Optional[List[dict]] = None, size: int = 20):
+        self._runs: Deque[dict] = deque(runs or [], maxlen=size)
+
+    def append(self, metrics: RunMetrics):
+        self._runs.append(metrics.to_dict())
+
+    def to_list(self) -> List[dict]:
+        return list(self._runs)
@@ -0,0 +1,134 @@
+import itertools
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.log import logger
+
+from .torrent import TorrentRecord
+
+# qBittorrent种子状态 -> 包含该状态的最窄status_filter
+_QB_STATE_FILTERS = {
+    "uploading": "completed",
+    "stalledUP": "completed",
+    "queuedUP": "completed",
+    "forcedUP": "completed",
+    "checkingUP": "completed",
+    "pausedUP": "completed",
+    "stoppedUP": "completed",
+    "downloading": "downloading",
+    "metaDL": "downloading",
+    "forcedMetaDL": "downloading",
+    "stalledDL": "downloading",
+    "queuedDL": "downloading",
+    "forcedDL": "downloading",
+    "checkingDL": "downloading",
+    "pausedDL": "downloading",
+    "stoppedDL": "downloading",
+    "error": "errored",
+    "missingFiles": "errored",
+}
+
+
+def split_values(value: Any) -> List[str]:
+    """
+    拆分以逗号或换行分隔的配置项
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = re.split(r"[,\n]", value)
+    return list(dict.fromkeys(str(item).strip() for item in value if str(item).strip()))
+
+
+class TorrentQuery:
+    """
+    种子查询条件，尽量转换为下载器端过滤，返回结果再在本地精确过滤
+    各条件之间为“且”，标签需全部包含，分类、状态满足其一即可
+    """
+
+    def __init__(self, tags: Optional[Iterable[str]] = None,
+                 categories: Optional[Iterable[str]] = None,
+                 states: Optional[Iterable[str]] = None,
+                 max_requests: int = 8):
+        """
+        :param max_requests: 分类及状态组合拆分的最多请求数，超出时放宽为本地过滤
+        """
+        self.tags = split_values(tags)
+        self.categories = split_values(categories)
+        self.states = split_values(states)
+        self._max_requests = max(max_requests, 1)
+
+    def __bool__(self) -> bool:
+        return bool(self.tags or self.categories or self.states)
+
+    def match(self, torrent: TorrentRecord) -> bool:
+        """
+        本地检查种子是否符合全部条件
+        """
+        if self.tags and not set(self.tags).issubset(torrent.tags):
+            return False
+        if self.categories and torrent.category not in self.categories:
+            return False
+        if self.states and torrent.state not in self.states:
+            return False
+        return True
+
+    def filter(self, torrents: Iterable[TorrentRecord]) -> List[TorrentRecord]:
+        return [torrent for torrent in torrents if self.match(torrent)]
+
+    def qb_requests(self) -> List[Dict[str, Any]]:
+        """
+        转换为qBittorrent torrents_info的请求参数
+        服务端每次只能按一个标签、分类及状态过滤：标签取第一个，多个分类或状态拆分为多个请求
+        """
+        base: Dict[str, Any] = {}
+        if self.tags:
+            base["tag"] = self.tags[0]
+        categories: List[Optional[str]] = list(self.categories) or [None]
+        status_filters = self.__qb_status_filters()
+        # 组合过多时先放弃状态过滤，再放弃分类过滤
+        if len(categories) * len(status_filters) > self._max_requests:
+            status_filters = [None]
+        if len(categories) > self._max_requests:
+            categories = [None]
+        requests = []
+        for category, status_filter in itertools.product(categories, status_filters):
+            request = dict(base)
+            if category is not None:
+                request["category"] = category
+            if status_filter is not None:
+                request["status_filter"] = status_filter
+            requests.append(request)
+        return requests
+
+    def qb_pushable(self) -> bool:
+        """
+        是否有可在qBittorrent端过滤的条件，否则服务端过滤没有意义
+        """
+        return all(self.qb_requests())
+
+    def __qb_status_filters(self) -> List[Optional[str]]:
+        if not self.states:
+            return [None]
+        status_filters = [_QB_STATE_FILTERS.get(state) for state in self.states]
+        if None in status_filters:
+            # 存在无法对应的状态时不在服务端按状态过滤
+            return [None]
+        return list(dict.fromkeys(status_filters))
+
+
+def qb_query(qbc: Any, query: TorrentQuery) -> Optional[List[dict]]:
+    """
+    按查询条件向qBittorrent发起一个或多个过滤请求，按hash合并结果，出错时返回None
+    """
+    if not qbc:
+        return None
+    torrents: Dict[str, dict] = {}
+    try:
+        for request in query.qb_requests():
+            for torrent in qbc.torrents_info(**request) or []:
+                torrents[torrent.get("hash")] = torrent
+    except Exception as e:
+        logger.error(f"按条件查询qBittorrent种子出错：{str(e)}")
+        return None
+    return list(torrents.values())
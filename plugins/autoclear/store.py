@@ -0,0 +1,337 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Tuple
+
+from .media import MediaItem
+from .torrent import TorrentRecord
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_items (
+    path TEXT PRIMARY KEY,
+    server TEXT,
+    rating_key TEXT,
+    title TEXT,
+    type TEXT,
+    size INTEGER,
+    last_viewed_at INTEGER,
+    seen_at INTEGER,
+    removed_at INTEGER
+);
+
+-- 下载目录源文件，复制匹配时也缓存媒体库文件的内容指纹
+CREATE TABLE IF NOT EXISTS source_files (
+    path TEXT PRIMARY KEY,
+    media_path TEXT,
+    media_dev INTEGER,
+    media_inode INTEGER,
+    dev INTEGER,
+    inode INTEGER,
+    size INTEGER,
+    mtime INTEGER,
+    partial_hash TEXT,
+    full_hash TEXT,
+    updated_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_source_files_media_path ON source_files (media_path);
+CREATE INDEX IF NOT EXISTS idx_source_files_inode ON source_files (dev, inode);
+
+CREATE TABLE IF NOT EXISTS torrents (
+    downloader TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    name TEXT,
+    size INTEGER,
+    save_path TEXT,
+    content_path TEXT,
+    ratio REAL,
+    added_on INTEGER,
+    completed_on INTEGER,
+    uploaded INTEGER,
+    site TEXT,
+    trackers TEXT,
+    tags TEXT,
+    state TEXT,
+    category TEXT,
+    error TEXT,
+    snapshot_at INTEGER,
+    PRIMARY KEY (downloader, hash)
+);
+
+CREATE TABLE IF NOT EXISTS actions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    downloader TEXT,
+    hash TEXT,
+    name TEXT,
+    site TEXT,
+    size INTEGER,
+    action TEXT,
+    at INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_actions_at ON actions (at);
+"""
+
+# 列表类字段在数据库中的分隔符
+_SEPARATOR = "\n"
+
+
+class AutoClearStore:
+    """
+    插件状态库，保存已看媒体、源文件、种子快照及处理记录
+    """
+
+    def __init__(self, db_file: Path):
+        self._db_file = db_file
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        # 所有线程的连接，停止插件时统一关闭
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        with self._write_lock, self.__conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def __conn(self) -> sqlite3.Connection:
+        """
+        每个线程使用独立连接，WAL模式下读写互不阻塞
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 连接仍只在创建线程中使用，关闭时可能在其它线程
+            conn = sqlite3.connect(str(self._db_file), timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self):
+        """
+        关闭所有线程的连接
+        """
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def prune(self, retention_days: float):
+        """
+        清除过期记录：处理记录、已清理或长期未出现的已看媒体、长期未更新的源文件及种子快照
+        """
+        cutoff = int(time.time() - retention_days * 86400)
+        with self._write_lock, self.__conn() as conn:
+            conn.execute("DELETE FROM actions WHERE at<?", (cutoff,))
+            conn.execute(
+                "DELETE FROM media_items WHERE removed_at<? OR seen_at<?", (cutoff, cutoff)
+            )
+            conn.execute("DELETE FROM source_files WHERE updated_at<?", (cutoff,))
+            # 已移除的下载器不再更新快照
+            conn.execute("DELETE FROM torrents WHERE snapshot_at<?", (cutoff,))
+
+    # 已看媒体
+    def upsert_media_items(self, items: Iterable[MediaItem]):
+        now = int(time.time())
+        rows = [
+            (item.path, item.server, item.rating_key, item.title, item.type,
+             item.size, item.last_viewed_at, now)
+            for item in items
+        ]
+        with self._write_lock, self.__conn() as conn:
+            conn.executemany(
+                "INSERT INTO media_items "
+                "(path, server, rating_key, title, type, size, last_viewed_at, seen_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET "
+                "server=excluded.server, rating_key=excluded.rating_key, "
+                "title=excluded.title, type=excluded.type, size=excluded.size, "
+                "last_viewed_at=excluded.last_viewed_at, seen_at=excluded.seen_at, "
+                "removed_at=NULL",
+                rows,
+            )
+
+    def mark_media_removed(self, paths: Iterable[str]):
+        now = int(time.time())
+        with self._write_lock, self.__conn() as conn:
+            conn.executemany(
+                "UPDATE media_items SET removed_at=? WHERE path=?",
+                [(now, path) for path in paths],
+            )
+
+    def get_removed_paths(self, paths: Iterable[str]) -> Set[str]:
+        """
+        返回其中已清理的媒体文件路径
+        """
+        paths = list(paths)
+        removed = set()
+        conn = self.__conn()
+        # 分批查询，避免超出SQLite参数数量限制
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            rows = conn.execute(
+                f"SELECT path FROM media_items WHERE removed_at IS NOT NULL "
+                f"AND path IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            removed.update(row["path"] for row in rows)
+        return removed
+
+    # 源文件
+    def get_source_file(self, media_path: str, media_dev: int,
+                        media_inode: int) -> Optional[str]:
+        """
+        查询媒体文件上次解析到的源文件，媒体文件inode变化时失效
+        """
+        row = self.__conn().execute(
+            "SELECT path FROM source_files "
+            "WHERE media_path=? AND media_dev=? AND media_inode=?",
+            (media_path, media_dev, media_inode),
+        ).fetchone()
+        return row["path"] if row else None
+
+    def find_source_by_inode(self, dev: int, inode: int, exclude: str) -> Optional[str]:
+        """
+        按设备号及inode查询已记录的源文件，媒体文件改名后仍可找到其硬链接源文件
+        :param exclude: 媒体文件自身路径
+        """
+        row = self.__conn().execute(
+            "SELECT path FROM source_files WHERE dev=? AND inode=? AND path<>? LIMIT 1",
+            (dev, inode, exclude),
+        ).fetchone()
+        return row["path"] if row else None
+
+    def upsert_source_file(self, path: str, media_path: str, media_dev: int,
+                           media_inode: int, dev: int, inode: int, size: int,
+                           mtime: int):
+        with self._write_lock, self.__conn() as conn:
+            conn.execute(
+                "INSERT INTO source_files "
+                "(path, media_path, media_dev, media_inode, dev, inode, size, mtime, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET "
+                "media_path=excluded.media_path, media_dev=excluded.media_dev, "
+                "media_inode=excluded.media_inode, dev=excluded.dev, "
+                "inode=excluded.inode, size=excluded.size, mtime=excluded.mtime, "
+                "partial_hash=CASE WHEN source_files.size=excluded.size "
+                "AND source_files.mtime=excluded.mtime THEN source_files.partial_hash END, "
+                "full_hash=CASE WHEN source_files.size=excluded.size "
+                "AND source_files.mtime=excluded.mtime THEN source_files.full_hash END, "
+                "updated_at=excluded.updated_at",
+                (path, media_path, media_dev, media_inode, dev, inode, size,
+                 mtime, int(time.time())),
+            )
+
+    def get_fingerprint(self, path: str, size: int, mtime: int,
+                        full: bool = False) -> Optional[str]:
+        row = self.__conn().execute(
+            "SELECT partial_hash, full_hash FROM source_files "
+            "WHERE path=? AND size=? AND mtime=?",
+            (path, size, mtime),
+        ).fetchone()
+        if not row:
+            return None
+        return row["full_hash"] if full else row["partial_hash"]
+
+    def put_fingerprint(self, path: str, size: int, mtime: int,
+                        partial: Optional[str] = None, full: Optional[str] = None):
+        now = int(time.time())
+        with self._write_lock, self.__conn() as conn:
+            row = conn.execute(
+                "SELECT size, mtime FROM source_files WHERE path=?", (path,)
+            ).fetchone()
+            if not row:
+                conn.execute(
+                    "INSERT INTO source_files "
+                    "(path, size, mtime, partial_hash, full_hash, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, size, mtime, partial, full, now),
+                )
+            elif row["size"] == size and row["mtime"] == mtime:
+                conn.execute(
+                    "UPDATE source_files SET partial_hash=COALESCE(?, partial_hash), "
+                    "full_hash=COALESCE(?, full_hash), updated_at=? WHERE path=?",
+                    (partial, full, now, path),
+                )
+            else:
+                # 文件已变化，旧指纹失效
+                conn.execute(
+                    "UPDATE source_files SET size=?, mtime=?, partial_hash=?, "
+                    "full_hash=?, updated_at=? WHERE path=?",
+                    (size, mtime, partial, full, now, path),
+                )
+
+    # 种子快照
+    def replace_torrents(self, downloader: str, torrents: Iterable[TorrentRecord]):
+        """
+        以本次快照替换下载器的全部种子
+        """
+        now = int(time.time())
+        rows = [
+            (downloader, t.id, t.name, t.size, t.save_path, t.content_path,
+             t.ratio, t.added_on, t.completed_on, t.uploaded, t.site,
+             _SEPARATOR.join(t.trackers), _SEPARATOR.join(t.tags), t.state,
+             t.category, t.error, now)
+            for t in torrents
+        ]
+        with self._write_lock, self.__conn() as conn:
+            conn.execute("DELETE FROM torrents WHERE downloader=?", (downloader,))
+            conn.executemany(
+                "INSERT INTO torrents VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def get_torrents(self, downloaders: Optional[Iterable[str]] = None
+                     ) -> Tuple[List[TorrentRecord], int]:
+        """
+        读取种子快照
+        :param downloaders: 只读取这些下载器的快照，如当前配置的下载器
+        :return: 种子记录、最早的快照时间
+        """
+        if downloaders is not None:
+            downloaders = list(downloaders)
+            rows = self.__conn().execute(
+                f"SELECT * FROM torrents WHERE downloader IN ({','.join('?' * len(downloaders))})",
+                downloaders,
+            ).fetchall()
+        else:
+            rows = self.__conn().execute("SELECT * FROM torrents").fetchall()
+        torrents = [
+            TorrentRecord(
+                downloader=row["downloader"], id=row["hash"], name=row["name"],
+                size=row["size"], save_path=row["save_path"],
+                content_path=row["content_path"], ratio=row["ratio"],
+                added_on=row["added_on"], completed_on=row["completed_on"],
+                uploaded=row["uploaded"], site=row["site"],
+                trackers=tuple(filter(None, (row["trackers"] or "").split(_SEPARATOR))),
+                tags=tuple(filter(None, (row["tags"] or "").split(_SEPARATOR))),
+                state=row["state"], category=row["category"], error=row["error"],
+            )
+            for row in rows
+        ]
+        snapshot_at = min((row["snapshot_at"] for row in rows), default=0)
+        return torrents, snapshot_at
+
+    def torrents_version(self) -> Tuple[int, int]:
+        """
+        种子快照版本：种子数及最近快照时间，用于判断内存中的快照是否需要重新读取
+        """
+        row = self.__conn().execute(
+            "SELECT COUNT(*), MAX(snapshot_at) FROM torrents"
+        ).fetchone()
+        return row[0] or 0, row[1] or 0
+
+    # 处理记录
+    def add_actions(self, action: str, torrents: Iterable[TorrentRecord]):
+        now = int(time.time())
+        with self._write_lock, self.__conn() as conn:
+            conn.executemany(
+                "INSERT INTO actions (downloader, hash, name, site, size, action, at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(t.downloader, t.id, t.name, t.site, t.size, action, now)
+                 for t in torrents],
+            )
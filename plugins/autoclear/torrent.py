@@ -0,0 +1,175 @@
+import os
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Tuple
+
+from app.utils.string import StringUtils
+
+
+@lru_cache(maxsize=4096)
+def get_site(tracker: str) -> str:
+    """
+    根据Tracker地址获取站点域名，同一Tracker只解析一次
+    """
+    if not tracker:
+        return ""
+    return StringUtils.get_url_sld(tracker) or ""
+
+
+# Transmission状态码
+_TR_STATUS = {
+    0: "stopped",
+    1: "check pending",
+    2: "checking",
+    3: "download pending",
+    4: "downloading",
+    5: "seed pending",
+    6: "seeding",
+}
+
+
+def _epoch(value: Any) -> int:
+    """
+    时间转换为时间戳
+    """
+    if not value:
+        return 0
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+class TorrentRecord:
+    """
+    下载器无关的紧凑种子记录
+    """
+    __slots__ = (
+        "downloader",
+        "id",
+        "name",
+        "size",
+        "save_path",
+        "content_path",
+        "ratio",
+        "added_on",
+        "completed_on",
+        "uploaded",
+        "site",
+        "trackers",
+        "tags",
+        "state",
+        "category",
+        "error",
+    )
+
+    def __init__(self, downloader: str, id: str, name: str, size: int,
+                 save_path: str, content_path: str, ratio: float,
+                 added_on: int, completed_on: int, uploaded: int, site: str,
+                 trackers: Tuple[str, ...], tags: Tuple[str, ...], state: str,
+                 category: str = "", error: Optional[str] = None):
+        self.downloader = downloader
+        self.id = id
+        self.name = name
+        self.size = size
+        self.save_path = save_path
+        self.content_path = content_path
+        self.ratio = ratio
+        self.added_on = added_on
+        self.completed_on = completed_on
+        self.uploaded = uploaded
+        self.site = site
+        self.trackers = trackers
+        self.tags = tags
+        self.state = state
+        self.category = category
+        self.error = error
+
+    def seeding_time(self, now: int) -> int:
+        """
+        做种时间，单位：秒
+        """
+        date_done = self.completed_on or self.added_on
+        return now - date_done if date_done else 0
+
+    def __repr__(self):
+        return f"TorrentRecord({self.downloader}:{self.id} {self.name})"
+
+
+class TorrentAdapter:
+    """
+    下载器种子适配器，将qBittorrent/Transmission种子对象转换为TorrentRecord
+    """
+
+    def __init__(self, downloader: str, downloader_type: str):
+        self.downloader = downloader
+        self.downloader_type = downloader_type
+
+    def convert(self, torrent: Any) -> Optional[TorrentRecord]:
+        """
+        转换单个种子
+        """
+        if not torrent:
+            return None
+        if self.downloader_type == "qbittorrent":
+            return self.__from_qb(torrent)
+        if self.downloader_type == "transmission":
+            return self.__from_tr(torrent)
+        return None
+
+    def convert_all(self, torrents: Iterable[Any]) -> List[TorrentRecord]:
+        """
+        批量转换种子
+        """
+        records = []
+        for torrent in torrents or []:
+            record = self.convert(torrent)
+            if record:
+                records.append(record)
+        return records
+
+    def __from_qb(self, torrent: Any) -> TorrentRecord:
+        tracker = torrent.get("tracker") or ""
+        tags = torrent.get("tags") or ""
+        return TorrentRecord(
+            downloader=self.downloader,
+            id=torrent.get("hash"),
+            name=torrent.get("name"),
+            size=torrent.get("size") or 0,
+            save_path=torrent.get("save_path") or "",
+            content_path=torrent.get("content_path") or "",
+            ratio=torrent.get("ratio") or 0,
+            added_on=_epoch(torrent.get("added_on")),
+            completed_on=max(_epoch(torrent.get("completion_on")), 0),
+            uploaded=torrent.get("uploaded") or 0,
+            site=get_site(tracker),
+            trackers=(tracker,) if tracker else (),
+            tags=tuple(tag.strip() for tag in tags.split(",") if tag.strip()),
+            state=torrent.get("state") or "",
+            category=torrent.get("category") or "",
+        )
+
+    def __from_tr(self, torrent: Any) -> TorrentRecord:
+        # 按需查询时仅包含部分字段，直接读取原始字段
+        fields = torrent.fields
+        download_dir = fields.get("downloadDir") or ""
+        trackers = tuple(
+            tracker.get("announce", "") for tracker in fields.get("trackers") or []
+        )
+        status = fields.get("status")
+        return TorrentRecord(
+            downloader=self.downloader,
+            id=fields.get("hashString"),
+            name=fields.get("name"),
+            size=fields.get("totalSize") or 0,
+            save_path=download_dir,
+            content_path=os.path.join(download_dir, fields.get("name") or ""),
+            ratio=fields.get("uploadRatio") or 0,
+            added_on=_epoch(fields.get("addedDate")),
+            completed_on=_epoch(fields.get("doneDate")),
+            uploaded=fields.get("uploadedEver") or 0,
+            site=get_site(trackers[0]) if trackers else "",
+            trackers=trackers,
+            tags=tuple(fields.get("labels") or ()),
+            state=_TR_STATUS.get(status, str(status or "")),
+            error=fields.get("errorString") or "",
+        )